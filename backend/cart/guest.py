@@ -0,0 +1,146 @@
+# cart/guest.py
+"""
+Giỏ hàng của khách chưa đăng nhập.
+
+Giỏ được lưu trong Redis (cart:guest:<token>, xem cart/store.py) với TTL GUEST_CART_TTL, token nằm
+trong cookie đã ký (GUEST_CART_COOKIE_NAME). ID của item là variant_id, giống giỏ Redis của user.
+Khi đăng nhập (user.views.LoginView) giỏ khách được gộp vào giỏ của user bằng một lần ghi.
+
+Các hàm có cùng tên / tham số với CartService, thay user bằng token (None: khách chưa có giỏ).
+"""
+import logging
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from cart.models import CartItem
+from cart.services import CartContents, CartService
+from cart.store import RedisCartStore
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+COOKIE_SALT = 'cart.guest'
+
+
+class GuestCartService:
+
+    # --- Cookie ---
+
+    @staticmethod
+    def cookie_name() -> str:
+        return getattr(settings, 'GUEST_CART_COOKIE_NAME', 'guest_cart')
+
+    @staticmethod
+    def get_token(request) -> Optional[str]:
+        """Token giỏ khách từ cookie đã ký; None nếu không có hoặc chữ ký không hợp lệ / hết hạn."""
+        return request.get_signed_cookie(
+            GuestCartService.cookie_name(), default=None, salt=COOKIE_SALT, max_age=RedisCartStore.guest_ttl(),
+        )
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(24)
+
+    @staticmethod
+    def set_cookie(request, response, token: str) -> None:
+        # Gia hạn cookie cùng với TTL của giỏ trong Redis
+        response.set_signed_cookie(
+            GuestCartService.cookie_name(), token, salt=COOKIE_SALT,
+            max_age=RedisCartStore.guest_ttl(), httponly=True, secure=request.is_secure(), samesite='Lax',
+        )
+
+    @staticmethod
+    def delete_cookie(response) -> None:
+        response.delete_cookie(GuestCartService.cookie_name(), samesite='Lax')
+
+    # --- Thao tác trên giỏ ---
+
+    @staticmethod
+    def load_cart(token: Optional[str]) -> CartContents:
+        if token is None:
+            return CartContents([], [], {})
+        return CartService.load_cart(token)
+
+    @staticmethod
+    def add_or_update_item(token: str, variant_id: int, quantity: int) -> Tuple[Optional[CartItem], bool, str]:
+        if not isinstance(quantity, int) or quantity < 0:
+            return None, False, "Quantity must be a non-negative integer."
+        return CartService._add_or_update_redis_item(token, int(variant_id), quantity)
+
+    @staticmethod
+    def remove_item(token: Optional[str], cart_item_id: int) -> bool:
+        return bool(token) and bool(RedisCartStore.set_guest_quantities(token, {cart_item_id: 0}))
+
+    @staticmethod
+    def clear_cart(token: Optional[str]) -> int:
+        if token is None:
+            return 0
+        count = len(RedisCartStore.get_guest_entries(token))
+        RedisCartStore.delete_guest(token)
+        return count
+
+    @staticmethod
+    def get_cart_item_by_id(token: Optional[str], cart_item_id: int) -> Optional[CartItem]:
+        if token is None:
+            return None
+        entry = RedisCartStore.get_guest_entries(token).get(int(cart_item_id))
+        return CartService._redis_item(token, int(cart_item_id), entry) if entry else None
+
+    @staticmethod
+    def delete_cart_items(token: Optional[str], cart_item_ids: List[int]) -> int:
+        if not isinstance(cart_item_ids, list) or not all(isinstance(item, int) for item in cart_item_ids):
+            raise ValueError("cart_item_ids must be a list of integers.")
+        if token is None:
+            return 0
+        return RedisCartStore.set_guest_quantities(token, dict.fromkeys(cart_item_ids, 0))
+
+    @staticmethod
+    def update_cart_item_variant(token: Optional[str], cart_item_id: int, new_variant_id: int) -> Tuple[bool, str]:
+        if token is None:
+            return False, "Cart item not found."
+        return CartService._update_redis_item_variant(token, int(cart_item_id), int(new_variant_id))
+
+    @staticmethod
+    def apply_bulk(token: str, operations: Dict[int, int], mode: str = 'set') -> Dict[int, str]:
+        return CartService.apply_bulk(token, operations, mode)
+
+    # --- Gộp khi đăng nhập ---
+
+    @staticmethod
+    def merge_into_user(token: str, user: User) -> int:
+        """
+        Gộp giỏ khách vào giỏ của user rồi xóa giỏ khách. Trả về số biến thể được thêm / cập nhật.
+        Trùng biến thể: lấy số lượng lớn hơn. Tồn kho được kiểm tra một lần cho cả giỏ; phần của giỏ khách
+        vượt tồn kho bị cắt, biến thể không còn bán hoặc hết hàng bị bỏ qua.
+        """
+        entries = RedisCartStore.get_guest_entries(token)
+        if not entries:
+            return 0
+
+        variant_info = RedisCartStore.get_variant_info(entries)
+        if RedisCartStore.enabled():
+            current = {pk: entry['quantity'] for pk, entry in RedisCartStore.get_entries(user.pk).items()}
+        else:
+            current = dict(
+                CartItem.objects.filter(user=user, variant_id__in=list(entries)).values_list('variant_id', 'quantity')
+            )
+
+        merged = {}
+        for variant_id, entry in entries.items():
+            info = variant_info.get(variant_id)
+            if info is None or not info['available'] or info['stock'] <= 0:
+                continue
+            quantity = max(min(entry['quantity'], info['stock']), current.get(variant_id, 0))
+            if quantity != current.get(variant_id):
+                merged[variant_id] = quantity
+
+        # Một lần ghi cho cả giỏ: một script Redis hoặc một câu upsert
+        if RedisCartStore.enabled():
+            RedisCartStore.set_quantities(user.pk, merged)
+        else:
+            CartItem.upsert_quantities(user.pk, merged)
+        RedisCartStore.delete_guest(token)
+        logger.info(f"Merged guest cart into cart of user {user.pk}: {len(merged)} of {len(entries)} items changed.")
+        return len(merged)
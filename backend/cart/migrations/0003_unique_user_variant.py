@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def merge_duplicate_items(apps, schema_editor):
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.filter(variant__isnull=False)
+        .values('user_id', 'variant_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'), quantity=Max('quantity'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        # Giữ item cũ nhất với số lượng lớn nhất trong các bản trùng
+        CartItem.objects.filter(pk=row['keep_id']).update(quantity=row['quantity'])
+        CartItem.objects.filter(user_id=row['user_id'], variant_id=row['variant_id']).exclude(pk=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_initial'),
+        ('product', '0008_product_effective_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'variant'), name='uniq_cart_item_user_variant'),
+        ),
+    ]
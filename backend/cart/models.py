@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import connection, models
+from django.utils import timezone
 from product.models import Product, ProductVariant
 # Create your models here.
 
@@ -11,6 +12,25 @@ class CartItem(models.Model):
     def __str__(self):
         return f"CartItem(user={self.user}, variant={self.variant}, quantity={self.quantity})"    
     
+    @classmethod
+    def upsert_quantities(cls, user_id, quantities):
+        """
+        Đặt số lượng cho nhiều biến thể trong giỏ của user bằng một câu INSERT ... ON DUPLICATE KEY UPDATE
+        (dựa trên ràng buộc unique (user, variant)). quantities: {variant_id: quantity > 0}.
+        """
+        if not quantities:
+            return
+        now = timezone.now()
+        rows = [
+            cls(user_id=user_id, variant_id=variant_id, quantity=quantity, updated_at=now)
+            for variant_id, quantity in quantities.items()
+        ]
+        # MySQL không nhận unique_fields
+        unique_fields = ['user', 'variant'] if connection.features.supports_update_conflicts_with_target else None
+        cls.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=unique_fields, update_fields=['quantity', 'updated_at'],
+        )
+
     def change_quantity(self, quantity):
         """
         Change the quantity of the cart item.
@@ -29,5 +49,9 @@ class CartItem(models.Model):
     
     class Meta:
         db_table = 'cart_item'
+        constraints = [
+            # Mỗi user chỉ có một item cho mỗi biến thể (flush giỏ Redis upsert theo cặp này)
+            models.UniqueConstraint(fields=['user', 'variant'], name='uniq_cart_item_user_variant'),
+        ]
 
 
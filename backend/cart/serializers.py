@@ -1,11 +1,13 @@
 # cart_app/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from cart.models import CartItem
 from typing import Optional
 # Import ProductVariantSerializer from your product app
 # Adjust the import path as needed
-from product.serializers import ProductVariantSerializer # Keep this for variant_details
-from product.models import ProductVariant # Keep this for queryset/validation
+from product.serializers import ProductSerializer, ProductVariantSerializer, VariantMatrixSerializer # Keep this for variant_details
+from product.models import Product, ProductVariant # Keep this for queryset/validation
+from cart.services import CartContents
 
 class CartItemSerializer(serializers.ModelSerializer):
     """
@@ -17,7 +19,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     # Write-only field to accept variant ID during creation/update
     variant = serializers.PrimaryKeyRelatedField(
-        queryset=ProductVariant.objects.filter(is_active=True, product__is_published=True), # Only allow active/published variants
+        queryset=ProductVariant.objects.select_related('product').filter(is_active=True, product__is_published=True), # Only allow active/published variants
         write_only=True,
         required=True, # Must provide a variant
         help_text="ID of the Product Variant to add to the cart."
@@ -26,7 +28,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     # Calculated field for item total price (read-only)
     item_total_price = serializers.SerializerMethodField()
 
-    # Field to return all available variants of the product
+    # Variant matrix of the product (sizes, colors, grid) used to switch variants in the cart
     available_variants = serializers.SerializerMethodField()
 
     class Meta:
@@ -59,30 +61,19 @@ class CartItemSerializer(serializers.ModelSerializer):
         """
         if obj.variant and obj.variant.product:
             product = obj.variant.product
-            try:
-                # Determine the effective price from the Product model
-                # Convert IntegerFields to Decimal for calculation
-                effective_price = 0
-                if product.sale_price > 0:
-                    effective_price = product.sale_price
-                else:
-                    effective_price = product.price
-
-                return obj.quantity * effective_price
-            except (TypeError, ValueError) as e:
-                # Handle cases where price fields might not be valid numbers (unlikely with IntegerField, but good practice)
-                raise serializers.ValidationError(f"Error calculating total price: {str(e)}")
+            # Product.effective_price: sale_price nếu đang giảm giá, ngược lại là price (cột do database tính)
+            return obj.quantity * product.effective_price
         return None # Return None if variant or product is missing
 
     def get_available_variants(self, obj: CartItem):
         """
-        Returns all variants of the product related to this cart item.
+        Returns the variant matrix of the product related to this cart item.
+        The product itself is already in variant_details, so it is not repeated here.
         """
         if obj.variant and obj.variant.product:
-            variants = obj.variant.product.variants.select_related('size', 'color')
-            # Pass context to ensure absolute URLs for image_url
-            return ProductVariantSerializer(variants, many=True, context=self.context).data
-        return []
+            # Pass context to ensure absolute URLs for image
+            return VariantMatrixSerializer(obj.variant.product, context={**self.context, 'include_product': False}).data
+        return None
 
     def validate_variant(self, value: ProductVariant):
         """
@@ -92,4 +83,73 @@ class CartItemSerializer(serializers.ModelSerializer):
              raise serializers.ValidationError("Selected product variant is not available for purchase.")
         return value
 
-    # Stock validation is still best handled in the service layer.
\ No newline at end of file
+    # Stock validation is still best handled in the service layer.
+
+
+class CartBulkOperationSerializer(serializers.Serializer):
+    variant = serializers.IntegerField(help_text="ID of the Product Variant.")
+    quantity = serializers.IntegerField(min_value=0, help_text="Final quantity (mode 'set', 0 to remove) or quantity to add (mode 'add').")
+
+
+class CartBulkSerializer(serializers.Serializer):
+    """Đầu vào của POST /cart/bulk/: danh sách thao tác, mỗi biến thể tối đa một lần."""
+    items = CartBulkOperationSerializer(many=True, allow_empty=False)
+    mode = serializers.ChoiceField(choices=['set', 'add'], default='set')
+
+    def validate_items(self, value):
+        max_items = getattr(settings, 'CART_BULK_MAX_ITEMS', 100)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} items per request.")
+        variant_ids = [item['variant'] for item in value]
+        if len(variant_ids) != len(set(variant_ids)):
+            raise serializers.ValidationError("Each variant may appear only once.")
+        return value
+
+
+# --- Read model cho GET /cart/ (dữ liệu nạp sẵn bởi CartService.load_cart) ---
+
+class CartVariantSerializer(ProductVariantSerializer):
+    """Biến thể trong giỏ hàng: chỉ tham chiếu product bằng ID, thông tin sản phẩm nằm trong 'products'."""
+
+    class Meta(ProductVariantSerializer.Meta):
+        fields = [field for field in ProductVariantSerializer.Meta.fields if field != 'product_details']
+        validators = []
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    """Item trong giỏ hàng (chỉ đọc), không lồng sản phẩm."""
+    variant_details = CartVariantSerializer(source='variant', read_only=True)
+    item_total_price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'variant_details', 'quantity', 'item_total_price', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+    def get_item_total_price(self, obj: CartItem) -> int:
+        return obj.quantity * obj.variant.product.effective_price
+
+
+class CartProductSerializer(ProductSerializer):
+    """Sản phẩm trong giỏ hàng, kèm ma trận biến thể dựng từ context['variants_by_product']."""
+    available_variants = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['available_variants']
+
+    def get_available_variants(self, obj: Product):
+        return VariantMatrixSerializer(obj, context={**self.context, 'include_product': False}).data
+
+
+class CartSerializer(serializers.BaseSerializer):
+    """
+    Giỏ hàng (chỉ đọc): {'items': [...], 'products': [...]}.
+    Mỗi sản phẩm xuất hiện một lần; item tham chiếu qua variant_details.product.
+    """
+
+    def to_representation(self, cart: CartContents):
+        context = {**self.context, 'variants_by_product': cart.variants_by_product}
+        return {
+            'items': CartLineSerializer(cart.items, many=True, context=context).data,
+            'products': CartProductSerializer(cart.products, many=True, context=context).data,
+        }
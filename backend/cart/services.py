@@ -1,27 +1,122 @@
 import logging
-from typing import List, Optional, Tuple
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 from django.contrib.auth import get_user_model
 from django.db import transaction, models
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 
 from cart.models import CartItem
+from cart.store import RedisCartStore
 # Adjust import paths as needed
-from product.models import ProductVariant
+from product.models import Product, ProductVariant
 from user.models import User
 logger = logging.getLogger(__name__)
 
+
+class CartContents(NamedTuple):
+    """Giỏ hàng đã nạp sẵn: các item, mỗi sản phẩm một lần, và mọi biến thể của các sản phẩm đó."""
+    items: List[CartItem]
+    products: List[Product]
+    variants_by_product: Dict[int, List[ProductVariant]]
+
+
 class CartService:
-    """Encapsulates business logic for cart operations."""
+    """
+    Encapsulates business logic for cart operations.
+    CART_BACKEND = 'redis': giỏ được đọc / ghi trong Redis (cart/store.py), ID của item là variant_id;
+    các hàm dùng cho checkout (list_cart_items, get_cart_items_by_ids) flush giỏ rồi đọc database
+    (flush=False khi người gọi đã flush trước transaction của mình, xem OrderService.create_order_from_cart).
+    """
 
     @staticmethod
-    def list_cart_items(user: User) -> models.QuerySet[CartItem]:
+    def flush_for_checkout(user: User) -> None:
+        """CART_BACKEND = 'redis': ghi giỏ của user xuống cart_item (gọi ngoài transaction của đơn hàng)."""
+        if RedisCartStore.enabled() and not RedisCartStore.flush_user(user.pk, blocking=True):
+            raise RuntimeError("Cart is being updated, please try again.")
+
+    # --- Giỏ trong Redis: owner là User (CART_BACKEND = 'redis') hoặc token giỏ khách (str, xem cart/guest.py) ---
+
+    @staticmethod
+    def _entries(owner: Union[User, str]) -> Dict[int, dict]:
+        if isinstance(owner, str):
+            return RedisCartStore.get_guest_entries(owner)
+        return RedisCartStore.get_entries(owner.pk)
+
+    @staticmethod
+    def _set_quantities(owner: Union[User, str], quantities: Dict[int, int]) -> int:
+        if isinstance(owner, str):
+            return RedisCartStore.set_guest_quantities(owner, quantities)
+        return RedisCartStore.set_quantities(owner.pk, quantities)
+
+    @staticmethod
+    def _owner_label(owner: Union[User, str]) -> str:
+        return f"guest cart {owner[:8]}" if isinstance(owner, str) else f"user {owner.pk}"
+
+    @staticmethod
+    def _redis_item(owner: Union[User, str], variant_id: int, entry: dict, variant: Optional[ProductVariant] = None) -> CartItem:
+        """CartItem tạm (không lưu) dựng từ entry trong Redis; id là variant_id."""
+        item = CartItem(
+            id=variant_id,
+            user=owner if isinstance(owner, User) else None,
+            quantity=entry['quantity'],
+            created_at=datetime.fromisoformat(entry['created_at']),
+            updated_at=datetime.fromisoformat(entry['updated_at']),
+        )
+        if variant is not None:
+            item.variant = variant
+        else:
+            item.variant_id = variant_id
+        return item
+
+    @staticmethod
+    def list_cart_items(user: User, flush: bool = True) -> models.QuerySet[CartItem]:
         """Retrieves all cart items for a given user, optimizing related lookups."""
+        if flush:
+            CartService.flush_for_checkout(user)
         return CartItem.objects.filter(user=user).select_related(
             'variant__product', 'variant__size', 'variant__color'
         ).order_by('created_at')
 
     @staticmethod
-    @transaction.atomic
+    def load_cart(user: Union[User, str]) -> CartContents:
+        """
+        Nạp giỏ hàng cho GET /cart/ (user hoặc token giỏ khách) với số truy vấn cố định (không phụ thuộc số item):
+        1. item + biến thể + sản phẩm (giá, tồn kho đã denormalize) + supplier + size + color
+        2. mọi biến thể của các sản phẩm có trong giỏ (để đổi size / màu), kèm size + color
+        """
+        if isinstance(user, str) or RedisCartStore.enabled():
+            entries = CartService._entries(user)
+            variants = ProductVariant.objects.select_related(
+                'product__supplier', 'size', 'color'
+            ).in_bulk(list(entries)) if entries else {}
+            # Biến thể đã bị xóa thì bỏ qua (flush sẽ xóa item khỏi database)
+            items = sorted(
+                (CartService._redis_item(user, pk, entry, variants[pk]) for pk, entry in entries.items() if pk in variants),
+                key=lambda item: item.created_at,
+            )
+        else:
+            items = list(
+                CartItem.objects.filter(user=user, variant__isnull=False).select_related(
+                    'variant__product__supplier', 'variant__size', 'variant__color'
+                ).order_by('created_at')
+            )
+
+        products = {}
+        for item in items:
+            products.setdefault(item.variant.product_id, item.variant.product)
+
+        variants_by_product = {product_id: [] for product_id in products}
+        if products:
+            siblings = ProductVariant.objects.filter(product_id__in=list(products)).select_related(
+                'size', 'color'
+            ).order_by('product_id', 'color_id', 'size_id', 'pk')
+            for variant in siblings:
+                variants_by_product[variant.product_id].append(variant)
+
+        return CartContents(items, list(products.values()), variants_by_product)
+
+    @staticmethod
     def add_or_update_item(user: User, variant_id: int, quantity: int) -> Tuple[Optional[CartItem], bool, str]:
         """
         Adds a new item or updates the quantity of an existing item in the user's cart.
@@ -41,6 +136,13 @@ class CartService:
         if not isinstance(quantity, int) or quantity < 0:
             return None, False, "Quantity must be a non-negative integer."
 
+        if RedisCartStore.enabled():
+            return CartService._add_or_update_redis_item(user, int(variant_id), quantity)
+        return CartService._add_or_update_database_item(user, variant_id, quantity)
+
+    @staticmethod
+    @transaction.atomic
+    def _add_or_update_database_item(user: User, variant_id: int, quantity: int) -> Tuple[Optional[CartItem], bool, str]:
         try:
             # 1. Validate Variant (checks active status and published status of product)
             variant = ProductVariant.objects.select_related('product').get(
@@ -80,11 +182,47 @@ class CartService:
         logger.info(f"Variant {variant_id} qty {quantity} {action} cart for user {user.pk}")
         return cart_item, True, f"Item {action} cart."
 
+    @staticmethod
+    def _add_or_update_redis_item(owner: Union[User, str], variant_id: int, quantity: int) -> Tuple[Optional[CartItem], bool, str]:
+        """add_or_update_item cho giỏ Redis: kiểm tra với tồn kho đã cache, không truy vấn / transaction MySQL."""
+        label = CartService._owner_label(owner)
+        info = RedisCartStore.get_variant_info([variant_id]).get(variant_id)
+        if info is None or not info['available']:
+            logger.warning(f"{label} tried to add non-existent/inactive variant {variant_id}")
+            return None, False, "Product variant not found or is not available."
+
+        if quantity == 0:
+            if CartService._set_quantities(owner, {variant_id: 0}):
+                logger.info(f"Removed variant {variant_id} from cart for {label}")
+                return None, True, "Item removed from cart."
+            return None, False, "Item not found in cart to remove."
+
+        if quantity > info['stock']:
+            logger.warning(f"{label} tried to add variant {variant_id} qty {quantity}, stock is {info['stock']}")
+            return None, False, f"Requested quantity ({quantity}) exceeds available stock ({info['stock']})."
+
+        created = variant_id not in CartService._entries(owner)
+        CartService._set_quantities(owner, {variant_id: quantity})
+        entry = CartService._entries(owner).get(variant_id)
+        if entry is None:
+            # Bị xóa bởi request khác ngay sau khi ghi
+            return None, False, "Item not found in cart."
+
+        action = "added to" if created else "updated in"
+        logger.info(f"Variant {variant_id} qty {quantity} {action} cart for {label}")
+        return CartService._redis_item(owner, variant_id, entry), True, f"Item {action} cart."
+
 
     @staticmethod
     @transaction.atomic
     def remove_item(user: User, cart_item_id: int) -> bool:
         """Removes a specific item from the user's cart."""
+        if RedisCartStore.enabled():
+            if RedisCartStore.set_quantities(user.pk, {cart_item_id: 0}):
+                logger.info(f"Removed cart item {cart_item_id} for user {user.pk}")
+                return True
+            logger.warning(f"User {user.pk} tried to remove non-existent/unowned cart item {cart_item_id}")
+            return False
         deleted_count, _ = CartItem.objects.filter(user=user, pk=cart_item_id).delete()
         if deleted_count > 0:
             logger.info(f"Removed cart item {cart_item_id} for user {user.pk}")
@@ -97,7 +235,13 @@ class CartService:
     @transaction.atomic
     def clear_cart(user: User) -> int:
         """Removes all items from the user's cart."""
-        deleted_count, _ = CartItem.objects.filter(user=user).delete()
+        if RedisCartStore.enabled():
+            variant_ids = list(RedisCartStore.get_entries(user.pk))
+            # Checkout gọi trong transaction tạo đơn: chỉ xóa khỏi giỏ khi đơn đã được lưu
+            transaction.on_commit(lambda: RedisCartStore.set_quantities(user.pk, dict.fromkeys(variant_ids, 0)))
+            deleted_count = len(variant_ids)
+        else:
+            deleted_count, _ = CartItem.objects.filter(user=user).delete()
         if deleted_count > 0:
              logger.info(f"Cleared {deleted_count} items from cart for user {user.pk}")
         return deleted_count
@@ -105,6 +249,9 @@ class CartService:
     @staticmethod
     def get_cart_item_by_id(user: User, cart_item_id: int) -> Optional[CartItem]:
         """Retrieves a specific cart item owned by the user."""
+        if RedisCartStore.enabled():
+            entry = RedisCartStore.get_entries(user.pk).get(int(cart_item_id))
+            return CartService._redis_item(user, int(cart_item_id), entry) if entry else None
         try:
             # Ensure necessary relations for the serializer are fetched
             return CartItem.objects.select_related(
@@ -114,10 +261,14 @@ class CartService:
             return None
 
     @staticmethod
-    @transaction.atomic
-    def get_cart_items_by_ids(user: User, cart_item_ids: List[int]) -> List[CartItem]:
+    def get_cart_items_by_ids(user: User, cart_item_ids: List[int], flush: bool = True) -> List[CartItem]:
         """Retrieves multiple cart items owned by the user."""
-        return list(CartItem.objects.filter(user=user, pk__in=cart_item_ids))
+        items = CartItem.objects.filter(user=user).select_related('variant__product', 'variant__size', 'variant__color')
+        if RedisCartStore.enabled():
+            if flush:
+                CartService.flush_for_checkout(user)
+            return list(items.filter(variant_id__in=cart_item_ids))
+        return list(items.filter(pk__in=cart_item_ids))
     
     @staticmethod
     @transaction.atomic
@@ -135,6 +286,14 @@ class CartService:
         if not isinstance(cart_item_ids, list) or not all(isinstance(item, int) for item in cart_item_ids):
             raise ValueError("cart_item_ids must be a list of integers.")
 
+        if RedisCartStore.enabled():
+            entries = RedisCartStore.get_entries(user.pk)
+            variant_ids = [pk for pk in cart_item_ids if pk in entries]
+            # Checkout gọi trong transaction tạo đơn: chỉ xóa khỏi giỏ khi đơn đã được lưu
+            transaction.on_commit(lambda: RedisCartStore.set_quantities(user.pk, dict.fromkeys(variant_ids, 0)))
+            logger.info(f"Deleted {len(variant_ids)} cart items for user {user.pk}")
+            return len(variant_ids)
+
         # Query the cart items by IDs
         cart_items_queryset = CartItem.objects.filter(user=user, pk__in=cart_item_ids)
 
@@ -143,6 +302,67 @@ class CartService:
         logger.info(f"Deleted {deleted_count} cart items for user {user.pk}")
         return deleted_count
     
+    @staticmethod
+    def apply_bulk(user: Union[User, str], operations: Dict[int, int], mode: str = 'set') -> Dict[int, str]:
+        """
+        Áp dụng nhiều thao tác {variant_id: quantity} lên giỏ (user hoặc token giỏ khách) cùng lúc.
+        mode 'set': quantity là số lượng cuối (0 = xóa); 'add': cộng thêm vào số lượng đang có.
+
+        Tất cả hoặc không: kiểm tra mọi biến thể và tồn kho trước (một truy vấn), có lỗi thì không ghi gì.
+        Trả về {variant_id: lỗi}, rỗng nếu thành công.
+        Database: một câu upsert (bulk_create update_conflicts) + một câu delete trong một transaction.
+        Redis: một lần gọi script.
+        """
+        if mode not in ('set', 'add'):
+            raise ValueError("mode must be 'set' or 'add'.")
+        if not operations:
+            return {}
+
+        redis_cart = isinstance(user, str) or RedisCartStore.enabled()
+        with nullcontext() if redis_cart else transaction.atomic():
+            if redis_cart:
+                variant_info = RedisCartStore.get_variant_info(operations)
+                current = {pk: entry['quantity'] for pk, entry in CartService._entries(user).items() if pk in operations}
+            else:
+                variant_info = {
+                    pk: {'product_id': product_id, 'stock': stock, 'available': is_active and is_published}
+                    for pk, product_id, stock, is_active, is_published in ProductVariant.objects.filter(
+                        pk__in=list(operations)
+                    ).values_list('pk', 'product_id', 'stock', 'is_active', 'product__is_published')
+                }
+                current = dict(
+                    CartItem.objects.select_for_update().filter(
+                        user=user, variant_id__in=list(operations)
+                    ).values_list('variant_id', 'quantity')
+                )
+
+            errors = {}
+            quantities = {}
+            for variant_id, quantity in operations.items():
+                if mode == 'add':
+                    quantity += current.get(variant_id, 0)
+                info = variant_info.get(variant_id)
+                if quantity > 0 and (info is None or not info['available']):
+                    errors[variant_id] = "Product variant not found or is not available."
+                elif quantity > 0 and quantity > info['stock']:
+                    errors[variant_id] = f"Requested quantity ({quantity}) exceeds available stock ({info['stock']})."
+                elif quantity != current.get(variant_id, 0):
+                    quantities[variant_id] = quantity
+            if errors:
+                logger.warning(f"Bulk cart update rejected for {CartService._owner_label(user)}: {errors}")
+                return errors
+
+            if redis_cart:
+                CartService._set_quantities(user, quantities)
+            else:
+                CartItem.upsert_quantities(user.pk, {pk: quantity for pk, quantity in quantities.items() if quantity > 0})
+                removed = [pk for pk, quantity in quantities.items() if quantity == 0]
+                if removed:
+                    CartItem.objects.filter(user=user, variant_id__in=removed).delete()
+
+        logger.info(f"Bulk cart update for {CartService._owner_label(user)}: {len(quantities)} of {len(operations)} items changed.")
+        return {}
+
     @staticmethod
     @transaction.atomic
     def update_cart_item_variant(user: User, cart_item_id: int, new_variant_id: int) -> Tuple[bool, str]:
@@ -158,7 +378,11 @@ class CartService:
             Tuple (success (bool), message (str)):
             - bool: True if the update was successful, False otherwise.
             - str: A message indicating the result or error.
+        If the cart already holds the new variant, the two items are merged (quantity capped at stock).
         """
+        if RedisCartStore.enabled():
+            return CartService._update_redis_item_variant(user, int(cart_item_id), int(new_variant_id))
+
         try:
             # Fetch the cart item
             cart_item = CartItem.objects.select_related('variant').get(user=user, pk=cart_item_id)
@@ -187,8 +411,44 @@ class CartService:
         if cart_item.quantity > new_variant.stock:
             return False, f"Requested quantity exceeds available stock for the new variant ({new_variant.stock})."
 
+        if cart_item.variant_id == new_variant.pk:
+            return True, "Cart item updated successfully."
+
+        # Mỗi user chỉ có một item cho mỗi biến thể: gộp vào item đã có
+        existing_item = CartItem.objects.select_for_update().filter(user=user, variant=new_variant).first()
+        if existing_item is not None:
+            existing_item.quantity = min(existing_item.quantity + cart_item.quantity, new_variant.stock)
+            existing_item.save(update_fields=['quantity', 'updated_at'])
+            cart_item.delete()
+            return True, "Cart item merged with the existing item for the selected variant."
+
         # Update the cart item with the new variant and adjusted quantity
         cart_item.variant = new_variant
         cart_item.save()
 
+        return True, "Cart item updated successfully."
+
+    @staticmethod
+    def _update_redis_item_variant(owner: Union[User, str], variant_id: int, new_variant_id: int) -> Tuple[bool, str]:
+        """update_cart_item_variant cho giỏ Redis (cart_item_id là variant_id hiện tại)."""
+        entries = CartService._entries(owner)
+        if variant_id not in entries:
+            return False, "Cart item not found."
+
+        info = RedisCartStore.get_variant_info([new_variant_id]).get(new_variant_id)
+        if info is None or not info['available']:
+            return False, "New product variant not found or is not available."
+        if info['stock'] <= 0:
+            return False, "The selected variant is out of stock."
+        if new_variant_id == variant_id:
+            return True, "Cart item updated successfully."
+
+        quantity = entries[variant_id]['quantity']
+        merged = new_variant_id in entries
+        if merged:
+            quantity += entries[new_variant_id]['quantity']
+        CartService._set_quantities(owner, {variant_id: 0, new_variant_id: min(quantity, info['stock'])})
+
+        if merged:
+            return True, "Cart item merged with the existing item for the selected variant."
         return True, "Cart item updated successfully."
\ No newline at end of file
@@ -0,0 +1,294 @@
+# cart/store.py
+"""
+Giỏ hàng lưu trong Redis (settings.CART_BACKEND = 'redis').
+
+Mỗi giỏ là một hash cart:<user_id> với field = variant_id, value = JSON {quantity, created_at, updated_at}
+(field '_loaded' đánh dấu giỏ đã được nạp từ database, kể cả khi rỗng). Đọc / ghi giỏ chỉ chạm Redis;
+số lượng được kiểm tra với tồn kho biến thể đã cache (CART_VARIANT_CACHE_TIMEOUT giây).
+
+Ghi trễ (write-behind): mỗi lần ghi đưa user vào set cart:dirty, task flush_carts ghi trạng thái
+đầy đủ của giỏ xuống bảng cart_item theo lô. Flush ghi đè trạng thái (upsert theo (user, variant),
+xóa biến thể không còn trong giỏ) nên chạy lại bao nhiêu lần cũng cho cùng kết quả.
+Checkout gọi flush_user (chờ lock) rồi đọc database: đó là bản chụp nhất quán của giỏ.
+
+Ở chế độ này ID của cart item là variant_id (mỗi user chỉ có một item cho mỗi biến thể).
+
+Giỏ của khách chưa đăng nhập (cart:guest:<token>, xem cart/guest.py) luôn nằm trong Redis với
+TTL GUEST_CART_TTL, không bao giờ được flush; khi đăng nhập nó được gộp vào giỏ của user.
+"""
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from cart.models import CartItem
+from product.models import ProductVariant
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'cart:dirty'
+LOADED_FIELD = '_loaded'
+
+# Đặt số lượng cho nhiều biến thể (0 = xóa). Trả về -1 nếu giỏ của user chưa được nạp vào Redis,
+# ngược lại là số biến thể thực sự thay đổi.
+# KEYS: giỏ, set dirty (không có với giỏ khách). ARGV: user_id, ttl, now, rồi từng cặp variant_id, quantity
+MUTATE_SCRIPT = """
+if KEYS[2] and redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local changed = 0
+for i = 4, #ARGV, 2 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    local quantity = tonumber(ARGV[i + 1])
+    if quantity <= 0 then
+        if current then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+            changed = changed + 1
+        end
+    else
+        local created_at = ARGV[3]
+        if current then created_at = cjson.decode(current)['created_at'] end
+        redis.call('HSET', KEYS[1], ARGV[i], cjson.encode({quantity = quantity, created_at = created_at, updated_at = ARGV[3]}))
+        changed = changed + 1
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if changed > 0 and KEYS[2] then redis.call('SADD', KEYS[2], ARGV[1]) end
+return changed
+"""
+
+# Nạp giỏ từ database, chỉ khi Redis chưa có (không ghi đè thay đổi chưa flush)
+# KEYS: giỏ. ARGV: ttl, rồi từng cặp variant_id, JSON
+HYDRATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], '_loaded', '1')
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class RedisCartStore:
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'CART_BACKEND', 'database') == 'redis'
+
+    @staticmethod
+    def _client():
+        return get_redis_connection('default')
+
+    @staticmethod
+    def _cart_key(user_id: int) -> str:
+        return f'cart:{user_id}'
+
+    @staticmethod
+    def _ttl() -> int:
+        return settings.CART_REDIS_TTL
+
+    # --- Tồn kho biến thể (cache ngắn hạn) ---
+
+    @staticmethod
+    def _variant_key(variant_id: int) -> str:
+        return f'cart:variant:{variant_id}'
+
+    @staticmethod
+    def get_variant_info(variant_ids: Iterable[int]) -> Dict[int, dict]:
+        """
+        {variant_id: {product_id, stock, available}} từ cache, biến thể thiếu được nạp bằng một truy vấn.
+        Biến thể không tồn tại không có trong kết quả.
+        """
+        variant_ids = {int(pk) for pk in variant_ids}
+        keys = {RedisCartStore._variant_key(pk): pk for pk in variant_ids}
+        info = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+        missing = variant_ids - set(info)
+        if missing:
+            rows = ProductVariant.objects.filter(pk__in=missing).values_list(
+                'pk', 'product_id', 'stock', 'is_active', 'product__is_published'
+            )
+            loaded = {
+                pk: {'product_id': product_id, 'stock': stock, 'available': is_active and is_published}
+                for pk, product_id, stock, is_active, is_published in rows
+            }
+            cache.set_many(
+                {RedisCartStore._variant_key(pk): value for pk, value in loaded.items()},
+                timeout=getattr(settings, 'CART_VARIANT_CACHE_TIMEOUT', 30),
+            )
+            info.update(loaded)
+        return info
+
+    # --- Đọc / ghi giỏ ---
+
+    @staticmethod
+    def _hydrate(user_id: int) -> None:
+        rows = CartItem.objects.filter(user_id=user_id, variant__isnull=False).values_list(
+            'variant_id', 'quantity', 'created_at', 'updated_at'
+        )
+        args = [RedisCartStore._ttl()]
+        for variant_id, quantity, created_at, updated_at in rows:
+            args += [variant_id, json.dumps({
+                'quantity': quantity, 'created_at': created_at.isoformat(), 'updated_at': updated_at.isoformat(),
+            })]
+        RedisCartStore._client().eval(HYDRATE_SCRIPT, 1, RedisCartStore._cart_key(user_id), *args)
+
+    @staticmethod
+    def _parse(raw: dict) -> Dict[int, dict]:
+        entries = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field == LOADED_FIELD:
+                continue
+            entries[int(field)] = json.loads(value)
+        return entries
+
+    @staticmethod
+    def _mutate_args(user_id, ttl: int, quantities: Dict[int, int]) -> list:
+        args = [user_id, ttl, timezone.now().isoformat()]
+        for variant_id, quantity in quantities.items():
+            args += [int(variant_id), int(quantity)]
+        return args
+
+    @staticmethod
+    def get_entries(user_id: int) -> Dict[int, dict]:
+        """{variant_id: {quantity, created_at, updated_at}} của giỏ, nạp từ database nếu Redis chưa có."""
+        client = RedisCartStore._client()
+        raw = client.hgetall(RedisCartStore._cart_key(user_id))
+        if not raw:
+            RedisCartStore._hydrate(user_id)
+            raw = client.hgetall(RedisCartStore._cart_key(user_id))
+        return RedisCartStore._parse(raw)
+
+    @staticmethod
+    def set_quantities(user_id: int, quantities: Dict[int, int]) -> int:
+        """Đặt số lượng cho các biến thể (0 = xóa khỏi giỏ). Trả về số biến thể thực sự thay đổi."""
+        if not quantities:
+            return 0
+        args = RedisCartStore._mutate_args(user_id, RedisCartStore._ttl(), quantities)
+        keys = (RedisCartStore._cart_key(user_id), DIRTY_KEY)
+        client = RedisCartStore._client()
+        changed = client.eval(MUTATE_SCRIPT, 2, *keys, *args)
+        if changed == -1:
+            RedisCartStore._hydrate(user_id)
+            changed = client.eval(MUTATE_SCRIPT, 2, *keys, *args)
+        if changed:
+            RedisCartStore._schedule_flush()
+        return max(changed, 0)
+
+    # --- Giỏ của khách (chỉ trong Redis) ---
+
+    @staticmethod
+    def _guest_key(token: str) -> str:
+        return f'cart:guest:{token}'
+
+    @staticmethod
+    def guest_ttl() -> int:
+        return getattr(settings, 'GUEST_CART_TTL', 7 * 24 * 3600)
+
+    @staticmethod
+    def get_guest_entries(token: str) -> Dict[int, dict]:
+        return RedisCartStore._parse(RedisCartStore._client().hgetall(RedisCartStore._guest_key(token)))
+
+    @staticmethod
+    def set_guest_quantities(token: str, quantities: Dict[int, int]) -> int:
+        """Như set_quantities cho giỏ khách; mỗi lần ghi gia hạn TTL của giỏ."""
+        if not quantities:
+            return 0
+        args = RedisCartStore._mutate_args('', RedisCartStore.guest_ttl(), quantities)
+        return RedisCartStore._client().eval(MUTATE_SCRIPT, 1, RedisCartStore._guest_key(token), *args)
+
+    @staticmethod
+    def delete_guest(token: str) -> None:
+        RedisCartStore._client().delete(RedisCartStore._guest_key(token))
+
+    # --- Ghi xuống database ---
+
+    @staticmethod
+    def _schedule_flush() -> None:
+        # Import tại chỗ: cart.tasks import module này
+        from cart.tasks import flush_carts
+
+        delay = getattr(settings, 'CART_FLUSH_DELAY', 5)
+        # Gộp các lần ghi trong khoảng delay vào một lần chạy task
+        if not cache.add('cart:flush:scheduled', 1, timeout=delay):
+            return
+        try:
+            flush_carts.apply_async(countdown=delay)
+        except Exception as e:
+            cache.delete('cart:flush:scheduled')
+            # Task định kỳ flush_carts sẽ ghi khi broker hoạt động lại
+            logger.error(f"Error enqueueing cart flush task: {e}", exc_info=True)
+
+    @staticmethod
+    def _write(user_id: int, entries: Dict[int, dict]) -> None:
+        """Đưa bảng cart_item của user về đúng trạng thái entries (idempotent)."""
+        existing_variant_ids = set(
+            ProductVariant.objects.filter(pk__in=list(entries)).values_list('pk', flat=True)
+        ) if entries else set()
+        with transaction.atomic():
+            CartItem.objects.filter(user_id=user_id).exclude(variant_id__in=existing_variant_ids).delete()
+            CartItem.upsert_quantities(
+                user_id, {variant_id: entries[variant_id]['quantity'] for variant_id in existing_variant_ids}
+            )
+
+    @staticmethod
+    def flush_user(user_id: int, blocking: bool = False) -> bool:
+        """
+        Ghi giỏ của user xuống database. Trả về False nếu một tiến trình khác đang flush giỏ này
+        (blocking=True: chờ tối đa CART_FLUSH_LOCK_WAIT giây trước khi bỏ cuộc).
+        """
+        client = RedisCartStore._client()
+        lock = client.lock(
+            f'cart:{user_id}:flush', timeout=30,
+            blocking_timeout=getattr(settings, 'CART_FLUSH_LOCK_WAIT', 5) if blocking else 0,
+        )
+        if not lock.acquire():
+            return False
+        try:
+            # Bỏ đánh dấu trước khi đọc: thay đổi xảy ra sau lúc đọc sẽ đánh dấu lại
+            client.srem(DIRTY_KEY, user_id)
+            if not client.exists(RedisCartStore._cart_key(user_id)):
+                # Giỏ chưa được nạp vào Redis (hoặc đã hết hạn sau khi flush): database là bản mới nhất
+                return True
+            try:
+                RedisCartStore._write(user_id, RedisCartStore.get_entries(user_id))
+            except Exception:
+                client.sadd(DIRTY_KEY, user_id)
+                raise
+            if transaction.get_connection().in_atomic_block:
+                # Transaction bên ngoài có thể rollback các dòng vừa ghi: giữ đánh dấu để flush_carts ghi lại
+                # (ghi lại cùng nội dung là vô hại)
+                client.sadd(DIRTY_KEY, user_id)
+            return True
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                logger.warning(f"Cart flush lock for user {user_id} expired before release.")
+
+    @staticmethod
+    def flush_dirty(batch_size: Optional[int] = None) -> int:
+        """Flush một lô giỏ đã thay đổi. Trả về số giỏ đã ghi; giỏ đang bị flush nơi khác được đưa lại vào hàng đợi."""
+        batch_size = batch_size or getattr(settings, 'CART_FLUSH_BATCH_SIZE', 200)
+        client = RedisCartStore._client()
+        user_ids: List[int] = [int(pk) for pk in client.spop(DIRTY_KEY, batch_size) or []]
+        flushed = 0
+        for user_id in user_ids:
+            try:
+                if RedisCartStore.flush_user(user_id):
+                    flushed += 1
+                else:
+                    client.sadd(DIRTY_KEY, user_id)
+            except Exception as e:
+                # flush_user đã đánh dấu lại user, lần chạy sau sẽ thử lại
+                logger.error(f"Error flushing cart for user {user_id}: {e}", exc_info=True)
+        return flushed
+
+    @staticmethod
+    def pending_count() -> int:
+        return RedisCartStore._client().scard(DIRTY_KEY)
@@ -0,0 +1,22 @@
+import logging
+
+from celery import shared_task
+
+from .store import RedisCartStore
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_carts():
+    """
+    Ghi các giỏ hàng Redis đã thay đổi xuống bảng cart_item (xem cart/store.py).
+    Còn giỏ chờ ghi thì tự gửi lần chạy tiếp theo; task định kỳ là lưới an toàn khi broker mất task.
+    """
+    if not RedisCartStore.enabled():
+        return 0
+    flushed = RedisCartStore.flush_dirty()
+    if RedisCartStore.pending_count():
+        RedisCartStore._schedule_flush()
+    logger.debug(f"Flushed {flushed} carts to database.")
+    return flushed
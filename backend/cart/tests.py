@@ -1,3 +1,275 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.signing import get_cookie_signer
+from django.db import DatabaseError, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from cart.guest import COOKIE_SALT, GuestCartService
+from cart.models import CartItem
+from cart.services import CartService
+from cart.store import DIRTY_KEY, RedisCartStore
+from product.models import Product, ProductVariant, Supplier
+from user.models import User
+
+
+def _redis_available() -> bool:
+    try:
+        return bool(get_redis_connection('default').ping())
+    except Exception:
+        return False
+
+
+@skipUnless(_redis_available(), "Redis is not available.")
+@mock.patch('cart.tasks.flush_carts.apply_async')
+@override_settings(CART_BACKEND='redis')
+class RedisCartFlushTests(TransactionTestCase):
+    # TransactionTestCase: flush_user xử lý khác khi chạy trong một transaction
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='cart@example.com', password='secret')
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        product = Product.objects.create(name='Cart Product', slug='cart-product', supplier=supplier, price=100, is_published=True)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku=f'CART-{index}', stock=10) for index in range(3)
+        ])
+        self.first, self.second, self.third = ProductVariant.objects.filter(product=product).order_by('pk')
+
+        self.redis = get_redis_connection('default')
+        self._cleanup()
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        self.redis.delete(RedisCartStore._cart_key(self.user.pk))
+        self.redis.srem(DIRTY_KEY, self.user.pk)
+
+    def _rows(self) -> dict:
+        return dict(CartItem.objects.filter(user=self.user).values_list('variant_id', 'quantity'))
+
+    def _is_dirty(self) -> bool:
+        return bool(self.redis.sismember(DIRTY_KEY, self.user.pk))
+
+    def test_flush_writes_cart_state_idempotently(self, apply_async):
+        CartItem.objects.create(user=self.user, variant=self.first, quantity=1)
+        # Lần ghi đầu nạp giỏ từ database vào Redis
+        RedisCartStore.set_quantities(self.user.pk, {self.first.pk: 3, self.second.pk: 2})
+        self.assertEqual(self._rows(), {self.first.pk: 1})
+        self.assertTrue(self._is_dirty())
+
+        self.assertTrue(RedisCartStore.flush_user(self.user.pk))
+        self.assertEqual(self._rows(), {self.first.pk: 3, self.second.pk: 2})
+        self.assertFalse(self._is_dirty())
+
+        # Flush lại cùng trạng thái không đổi gì (kể cả id của các dòng)
+        ids = set(CartItem.objects.filter(user=self.user).values_list('pk', flat=True))
+        self.assertTrue(RedisCartStore.flush_user(self.user.pk))
+        self.assertEqual(self._rows(), {self.first.pk: 3, self.second.pk: 2})
+        self.assertEqual(set(CartItem.objects.filter(user=self.user).values_list('pk', flat=True)), ids)
+
+        # Biến thể bị xóa khỏi giỏ Redis bị xóa khỏi cart_item
+        RedisCartStore.set_quantities(self.user.pk, {self.second.pk: 0, self.third.pk: 4})
+        self.assertEqual(RedisCartStore.flush_dirty(), 1)
+        self.assertEqual(self._rows(), {self.first.pk: 3, self.third.pk: 4})
+
+    def test_flush_inside_rolled_back_transaction_is_retried(self, apply_async):
+        RedisCartStore.set_quantities(self.user.pk, {self.first.pk: 2})
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertTrue(RedisCartStore.flush_user(self.user.pk))
+                self.assertEqual(self._rows(), {self.first.pk: 2})
+                raise RuntimeError("Order failed.")
+
+        # Dòng đã ghi bị rollback nhưng user vẫn được đánh dấu, flush_carts ghi lại
+        self.assertEqual(self._rows(), {})
+        self.assertTrue(self._is_dirty())
+        self.assertEqual(RedisCartStore.flush_dirty(), 1)
+        self.assertEqual(self._rows(), {self.first.pk: 2})
+        self.assertFalse(self._is_dirty())
+
+    def test_checkout_reads_flush_only_when_asked(self, apply_async):
+        RedisCartStore.set_quantities(self.user.pk, {self.first.pk: 2, self.second.pk: 1})
+
+        # Đường tạo đơn flush trước transaction rồi đọc với flush=False
+        with transaction.atomic():
+            self.assertEqual(CartService.get_cart_items_by_ids(self.user, [self.first.pk], flush=False), [])
+            self.assertEqual(list(CartService.list_cart_items(self.user, flush=False)), [])
+        self.assertTrue(self._is_dirty())
+
+        items = CartService.get_cart_items_by_ids(self.user, [self.first.pk])
+        self.assertEqual([(item.variant_id, item.quantity) for item in items], [(self.first.pk, 2)])
+        self.assertEqual(len(CartService.list_cart_items(self.user)), 2)
+        self.assertFalse(self._is_dirty())
+
+
+@skipUnless(_redis_available(), "Redis is not available.")
+@mock.patch('cart.tasks.flush_carts.apply_async')
+class GuestCartMergeTests(TestCase):
+    TOKEN = 'guest-cart-test-token'
+    PASSWORD = 'secret'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='guest@example.com', password=cls.PASSWORD)
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        product = Product.objects.create(name='Guest Product', slug='guest-product', supplier=supplier, price=100, is_published=True)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku='GUEST-1', stock=10),
+            ProductVariant(product=product, sku='GUEST-2', stock=3),
+            ProductVariant(product=product, sku='GUEST-3', stock=10),
+            ProductVariant(product=product, sku='GUEST-4', stock=10, is_active=False),
+            ProductVariant(product=product, sku='GUEST-5', stock=0),
+        ])
+        cls.variants = list(ProductVariant.objects.filter(product=product).order_by('pk'))
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self._cleanup()
+        self.addCleanup(self._cleanup)
+        self.first, self.second, self.third, self.inactive, self.sold_out = self.variants
+        # Giỏ khách: trùng biến thể với giỏ user, vượt tồn kho, biến thể không bán / hết hàng
+        RedisCartStore.set_guest_quantities(self.TOKEN, {
+            self.first.pk: 2, self.second.pk: 8, self.third.pk: 4, self.inactive.pk: 1, self.sold_out.pk: 1,
+        })
+
+    def _cleanup(self):
+        self.redis.delete(RedisCartStore._guest_key(self.TOKEN), RedisCartStore._cart_key(self.user.pk))
+        self.redis.srem(DIRTY_KEY, self.user.pk)
+        cache.delete_many([RedisCartStore._variant_key(variant.pk) for variant in self.variants])
+
+    def _rows(self) -> dict:
+        return dict(CartItem.objects.filter(user=self.user).values_list('variant_id', 'quantity'))
+
+    def _login(self, password=PASSWORD):
+        client = APIClient()
+        cookie_name = GuestCartService.cookie_name()
+        client.cookies[cookie_name] = get_cookie_signer(salt=cookie_name + COOKIE_SALT).sign(self.TOKEN)
+        return client.post('/api/v1/auth/login/', {'email': self.user.email, 'password': password}, format='json')
+
+    def _cookie_deleted(self, response) -> bool:
+        cookie = response.cookies.get(GuestCartService.cookie_name())
+        return cookie is not None and cookie['max-age'] == 0
+
+    def test_merge_keeps_larger_quantity_and_clamps_to_stock(self, apply_async):
+        CartItem.objects.bulk_create([
+            CartItem(user=self.user, variant=self.first, quantity=5),
+            CartItem(user=self.user, variant=self.third, quantity=1),
+        ])
+
+        # first giữ 5 (lớn hơn 2); second bị cắt còn 3; third lên 4
+        self.assertEqual(GuestCartService.merge_into_user(self.TOKEN, self.user), 2)
+        self.assertEqual(self._rows(), {self.first.pk: 5, self.second.pk: 3, self.third.pk: 4})
+        self.assertEqual(RedisCartStore.get_guest_entries(self.TOKEN), {})
+
+    @override_settings(CART_BACKEND='redis')
+    def test_merge_into_redis_cart(self, apply_async):
+        RedisCartStore.set_quantities(self.user.pk, {self.first.pk: 1, self.second.pk: 3, self.third.pk: 6})
+
+        self.assertEqual(GuestCartService.merge_into_user(self.TOKEN, self.user), 1)
+        entries = RedisCartStore.get_entries(self.user.pk)
+        self.assertEqual(
+            {pk: entry['quantity'] for pk, entry in entries.items()}, {self.first.pk: 2, self.second.pk: 3, self.third.pk: 6},
+        )
+
+    def test_login_merges_and_deletes_cookie(self, apply_async):
+        response = self._login()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self._cookie_deleted(response))
+        self.assertEqual(self._rows(), {self.first.pk: 2, self.second.pk: 3, self.third.pk: 4})
+
+    def test_failed_login_keeps_guest_cart(self, apply_async):
+        response = self._login(password='wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertIsNone(response.cookies.get(GuestCartService.cookie_name()))
+        self.assertEqual(len(RedisCartStore.get_guest_entries(self.TOKEN)), 5)
+        self.assertEqual(self._rows(), {})
+
+    def test_merge_error_does_not_block_login_or_drop_cookie(self, apply_async):
+        with mock.patch.object(GuestCartService, 'merge_into_user', side_effect=RuntimeError("Redis down.")):
+            response = self._login()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self._cookie_deleted(response))
+        self.assertEqual(len(RedisCartStore.get_guest_entries(self.TOKEN)), 5)
+
+
+@skipUnless(_redis_available(), "Redis is not available.")
+@mock.patch('cart.tasks.flush_carts.apply_async')
+class CartBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='bulk@example.com', password='secret')
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        product = Product.objects.create(name='Bulk Product', slug='bulk-product', supplier=supplier, price=100, is_published=True)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku='BULK-1', stock=10),
+            ProductVariant(product=product, sku='BULK-2', stock=10),
+            ProductVariant(product=product, sku='BULK-3', stock=2),
+        ])
+        cls.variants = list(ProductVariant.objects.filter(product=product).order_by('pk'))
+
+    def setUp(self):
+        self.first, self.second, self.limited = self.variants
+        self.redis = get_redis_connection('default')
+        self._cleanup()
+        self.addCleanup(self._cleanup)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _cleanup(self):
+        self.redis.delete(RedisCartStore._cart_key(self.user.pk))
+        self.redis.srem(DIRTY_KEY, self.user.pk)
+        cache.delete_many([RedisCartStore._variant_key(variant.pk) for variant in self.variants])
+
+    def _cart(self) -> dict:
+        if RedisCartStore.enabled():
+            return {pk: entry['quantity'] for pk, entry in RedisCartStore.get_entries(self.user.pk).items()}
+        return dict(CartItem.objects.filter(user=self.user).values_list('variant_id', 'quantity'))
+
+    def _post(self, items, mode='set'):
+        return self.client.post(
+            '/api/v1/cart/bulk/',
+            {'items': [{'variant': variant.pk, 'quantity': quantity} for variant, quantity in items], 'mode': mode},
+            format='json',
+        )
+
+    def _assert_bad_line_changes_nothing(self):
+        CartService.apply_bulk(self.user, {self.first.pk: 1, self.limited.pk: 1})
+
+        # Dòng cuối vượt tồn kho: cả lô bị từ chối, kể cả thao tác thêm / xóa hợp lệ
+        response = self._post([(self.second, 3), (self.first, 0), (self.limited, 2)], mode='add')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([detail['variant'] for detail in response.data['details']], [self.limited.pk])
+        self.assertEqual(self._cart(), {self.first.pk: 1, self.limited.pk: 1})
+
+        response = self._post([(self.second, 3), (self.first, 0), (self.limited, 2)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._cart(), {self.second.pk: 3, self.limited.pk: 2})
+
+    def test_database_bad_line_changes_nothing(self, apply_async):
+        self._assert_bad_line_changes_nothing()
+
+    @override_settings(CART_BACKEND='redis')
+    def test_redis_bad_line_changes_nothing(self, apply_async):
+        self._assert_bad_line_changes_nothing()
+
+    def test_database_write_error_rolls_back_upsert(self, apply_async):
+        CartService.apply_bulk(self.user, {self.first.pk: 1})
+
+        # Câu delete lỗi sau khi upsert đã chạy: transaction bỏ cả upsert
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError("Lock wait timeout.")):
+            with self.assertRaises(DatabaseError):
+                CartService.apply_bulk(self.user, {self.second.pk: 2, self.first.pk: 0})
+        self.assertEqual(self._cart(), {self.first.pk: 1})
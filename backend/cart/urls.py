@@ -9,6 +9,8 @@ urlpatterns = [
     # Example URL: /api/cart/
     path('cart/', views.CartView.as_view(), name='cart-view'),
     path('cart/bulk-delete/', views.BulkDeleteCartItemsView.as_view(), name='bulk-delete-cart'),
+    # Nhiều thao tác {variant, quantity} trong một request, trả về giỏ mới
+    path('cart/bulk/', views.CartBulkView.as_view(), name='cart-bulk'),
     # --- Cart Item Detail Endpoint ---
     # Handles PUT/PATCH (Update Quantity), DELETE (Remove Item) for a specific item
     # Example URL: /api/cart/{cart_item_pk}/
@@ -8,27 +8,50 @@ from django.core.exceptions import ValidationError # Import if service might rai
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from .guest import GuestCartService
 from .services import CartService
-from .serializers import CartItemSerializer # The updated serializer
+from .serializers import CartBulkSerializer, CartItemSerializer, CartSerializer # The updated serializer
 # Adjust import if error schema is defined elsewhere
 # from product_app.views import "Internal server erroe"
 
 logger = logging.getLogger(__name__)
 
+
+def get_cart_owner(request):
+    """
+    (service, owner) của giỏ hàng trong request: (CartService, user) khi đã đăng nhập,
+    ngược lại (GuestCartService, token trong cookie, None nếu khách chưa có giỏ).
+    """
+    if request.user.is_authenticated:
+        return CartService, request.user
+    return GuestCartService, GuestCartService.get_token(request)
+
+
 class CartView(APIView):
     """
-    API endpoint for managing the user's shopping cart.
+    API endpoint for managing the shopping cart of the user, or of the guest (signed cookie) when not logged in.
     GET: List all items in the cart.
     POST: Add or update an item in the cart.
     DELETE: Clear all items from the cart.
     """
-    permission_classes = [permissions.IsAuthenticated] # Must be logged in
+    permission_classes = [permissions.AllowAny] # Khách dùng giỏ trong Redis (cart/guest.py)
 
     @swagger_auto_schema(
         operation_summary="View Cart",
-        operation_description="Retrieves all items currently in the authenticated user's cart.",
+        operation_description=(
+            "Retrieves all items currently in the authenticated user's cart. "
+            "Each product appears once in 'products' (with its variant matrix in 'available_variants'); "
+            "items reference it by variant_details.product. "
+            "Guests (not logged in) get the cart identified by the guest cart cookie; it is merged on login."
+        ),
         responses={
-            200: openapi.Response('List of cart items.', CartItemSerializer(many=True)), # List of cart items
+            200: openapi.Response('Cart items and the products they reference.', openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'items': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT), description='Cart items (CartLineSerializer).'),
+                    'products': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT), description='Products in the cart (CartProductSerializer).'),
+                },
+            )),
             401: openapi.Response('Unauthorized'),
             500: openapi.Response('Internal server error'), # General error response
         },
@@ -37,8 +60,10 @@ class CartView(APIView):
     )
     def get(self, request, format=None):
         try:
-            cart_items = CartService.list_cart_items(request.user)
-            serializer = CartItemSerializer(cart_items, many=True, context={'request': request})
+            service, owner = get_cart_owner(request)
+            # Số truy vấn cố định, không phụ thuộc số item trong giỏ
+            cart = service.load_cart(owner)
+            serializer = CartSerializer(cart, context={'request': request})
             return Response(serializer.data)
         except Exception as e:
             logger.error(f"Error listing cart items for user {request.user.pk}: {e}", exc_info=True)
@@ -75,21 +100,23 @@ class CartView(APIView):
             quantity = serializer.validated_data['quantity']
 
             try:
+                service, owner = get_cart_owner(request)
+                if service is GuestCartService and owner is None:
+                    owner = GuestCartService.new_token()
                 # Service handles stock check and add/update/remove logic
-                cart_item, success, message = CartService.add_or_update_item(
-                    user=request.user,
-                    variant_id=variant_id,
-                    quantity=quantity
-                )
+                cart_item, success, message = service.add_or_update_item(owner, variant_id, quantity)
 
                 if success:
                     if cart_item: # Added or updated
                          # Serialize the result (serializer calculates price)
                          response_serializer = CartItemSerializer(cart_item, context={'request': request})
                          # Return 200 OK for simplicity for both add/update success
-                         return Response(response_serializer.data, status=status.HTTP_200_OK)
+                         response = Response(response_serializer.data, status=status.HTTP_200_OK)
                     else: # Removed (quantity was 0)
-                         return Response(status=status.HTTP_204_NO_CONTENT)
+                         response = Response(status=status.HTTP_204_NO_CONTENT)
+                    if service is GuestCartService:
+                        GuestCartService.set_cookie(request, response, owner)
+                    return response
                 else:
                     # Service failure (stock, variant not found etc.)
                     return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
@@ -117,7 +144,8 @@ class CartView(APIView):
     )
     def delete(self, request, format=None):
         try:
-            deleted_count = CartService.clear_cart(request.user)
+            service, owner = get_cart_owner(request)
+            deleted_count = service.clear_cart(owner)
             logger.info(f"User {request.user.pk} cleared cart, removed {deleted_count} items.")
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
@@ -125,17 +153,71 @@ class CartView(APIView):
             return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class CartBulkView(APIView):
+    """
+    API endpoint for applying many cart changes at once (e.g. "reorder", "add outfit").
+    POST: Set (or add to) the quantity of several variants, then return the new cart.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Bulk Update Cart",
+        operation_description=(
+            "Applies a list of {variant, quantity} operations in one request. "
+            "mode 'set' (default): quantity is the final quantity, 0 removes the item; mode 'add': quantity is added to the current one. "
+            "All operations are validated first (availability and stock); if any fails nothing is applied. "
+            "Returns the new cart in the same format as GET /cart/."
+        ),
+        request_body=CartBulkSerializer,
+        responses={
+            200: openapi.Response('The updated cart (same format as GET /cart/).'),
+            400: openapi.Response('Bad Request - Invalid input, or some items are unavailable / exceed stock (per-variant errors in "details").'),
+            500: openapi.Response('Internal server error - Service failure.'),
+        },
+        security=[{'Bearer': []}],
+        tags=['Cart']
+    )
+    def post(self, request, format=None):
+        serializer = CartBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = {item['variant']: item['quantity'] for item in serializer.validated_data['items']}
+
+        try:
+            service, owner = get_cart_owner(request)
+            if service is GuestCartService and owner is None:
+                owner = GuestCartService.new_token()
+            errors = service.apply_bulk(owner, operations, serializer.validated_data['mode'])
+            if errors:
+                return Response(
+                    {
+                        "error": "Some items could not be applied; the cart was not changed.",
+                        "details": [{"variant": variant_id, "error": message} for variant_id, message in errors.items()],
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            response = Response(CartSerializer(service.load_cart(owner), context={'request': request}).data)
+            if service is GuestCartService:
+                GuestCartService.set_cookie(request, response, owner)
+            return response
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Unexpected error applying bulk cart update for user {request.user.pk}: {e}", exc_info=True)
+            return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class CartItemDetailView(APIView):
     """
-    API endpoint for managing a specific item within the user's cart.
+    API endpoint for managing a specific item within the user's (or guest's) cart.
     PUT/PATCH: Update the quantity of the item.
     DELETE: Remove the item from the cart.
     """
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.AllowAny]
 
-    def _get_object(self, pk, user):
-        """Helper to get a specific cart item owned by the user."""
-        cart_item = CartService.get_cart_item_by_id(user=user, cart_item_id=pk)
+    def _get_object(self, pk, service, owner):
+        """Helper to get a specific cart item owned by the user (or guest)."""
+        cart_item = service.get_cart_item_by_id(owner, pk)
         if cart_item is None:
             raise Http404("Cart item not found.")
         return cart_item
@@ -163,7 +245,8 @@ class CartItemDetailView(APIView):
     )
     def put(self, request, pk, format=None):
         try:
-            cart_item_to_update = self._get_object(pk, request.user)
+            service, owner = get_cart_owner(request)
+            cart_item_to_update = self._get_object(pk, service, owner)
 
             # Validate input quantity manually
             quantity = request.data.get('quantity')
@@ -178,11 +261,7 @@ class CartItemDetailView(APIView):
                 return Response({"error": "Invalid quantity value."}, status=status.HTTP_400_BAD_REQUEST)
 
             # Use the same service logic as POST for consistency
-            updated_item, success, message = CartService.add_or_update_item(
-                user=request.user,
-                variant_id=cart_item_to_update.variant_id,
-                quantity=quantity
-            )
+            updated_item, success, message = service.add_or_update_item(owner, cart_item_to_update.variant_id, quantity)
 
             if success:
                 if updated_item:  # Quantity updated
@@ -223,11 +302,8 @@ class CartItemDetailView(APIView):
         if not new_variant_id:
             return Response({"error": "New variant ID is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        success, message = CartService.update_cart_item_variant(
-            user=request.user,
-            cart_item_id=pk,
-            new_variant_id=new_variant_id
-        )
+        service, owner = get_cart_owner(request)
+        success, message = service.update_cart_item_variant(owner, pk, new_variant_id)
 
         if success:
             return Response({"message": message}, status=status.HTTP_200_OK)
@@ -250,7 +326,8 @@ class CartItemDetailView(APIView):
     def delete(self, request, pk, format=None):
         try:
             # _get_object(pk, request.user) # Optional check before delete
-            success = CartService.remove_item(user=request.user, cart_item_id=pk)
+            service, owner = get_cart_owner(request)
+            success = service.remove_item(owner, pk)
             if success:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             else:
@@ -259,13 +336,11 @@ class CartItemDetailView(APIView):
              logger.error(f"Error deleting cart item {pk} for user {request.user.pk}: {e}", exc_info=True)
              return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-from cart.models import CartItem
-
 class BulkDeleteCartItemsView(APIView):
     """
     View to delete multiple cart items at once.
     """
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.AllowAny]
 
     def delete(self, request, format=None):
         cart_item_ids = request.data.get('cart_item_ids', [])
@@ -275,16 +350,18 @@ class BulkDeleteCartItemsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Filter cart items belonging to the user
-        cart_items = CartItem.objects.filter(user=request.user, id__in=cart_item_ids)
-        if not cart_items.exists():
+        try:
+            # Chỉ xóa item thuộc về user (giỏ Redis hoặc database, xem CartService)
+            service, owner = get_cart_owner(request)
+            deleted_count = service.delete_cart_items(owner, cart_item_ids)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not deleted_count:
             return Response(
                 {"error": "No valid cart items found for deletion."},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Delete the cart items
-        deleted_count, _ = cart_items.delete()
         return Response(
             {"message": f"{deleted_count} cart item(s) deleted successfully."},
             status=status.HTTP_200_OK
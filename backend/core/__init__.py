@@ -0,0 +1,4 @@
+# Đảm bảo Celery app được nạp khi Django khởi động để @shared_task dùng đúng app
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -0,0 +1,80 @@
+# core/caching.py
+"""
+Tiện ích cache dùng chung cho các app.
+
+Khóa có phiên bản (versioned key): dữ liệu được cache dưới khóa gắn với một số
+phiên bản lưu trong Redis. Muốn vô hiệu hóa chỉ cần tăng phiên bản, các bản cũ
+sẽ tự hết hạn theo TTL.
+
+get_or_build: đọc qua cache (read-through) có chống cache stampede.
+"""
+import random
+import time
+from typing import Any, Callable
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Thời gian tối đa một request chờ request khác build entry (get_or_build)
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_version(version_key: str) -> int:
+    """Lấy phiên bản hiện tại, khởi tạo nếu chưa có."""
+    version = cache.get(version_key)
+    if version is None:
+        # Khởi tạo theo thời gian để không bao giờ trùng với phiên bản cũ đã bị evict
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_version(version_key: str) -> int:
+    """Tăng phiên bản, làm mọi khóa gắn với phiên bản cũ trở nên vô hiệu."""
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # Khóa chưa tồn tại hoặc đã bị evict
+        return get_version(version_key)
+
+
+def bump_version_on_commit(version_key: str) -> None:
+    """Tăng phiên bản sau khi transaction hiện tại commit thành công."""
+    transaction.on_commit(lambda: bump_version(version_key))
+
+
+def get_or_build(key: str, builder: Callable[[], Any], timeout: int, stale_timeout: int = 300, lock_timeout: int = 10) -> Any:
+    """
+    Read-through cache có chống stampede.
+
+    - Entry được giữ thêm stale_timeout giây sau khi hết hạn "tươi".
+    - Khi entry cũ đi, chỉ một request (giữ lock qua cache.add) build lại, các request khác dùng bản cũ.
+    - Khi chưa có entry, các request không giữ lock chờ ngắn cho bản build xong trước khi tự build.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and now < entry['fresh_until']:
+        return entry['value']
+
+    lock_key = f'lock:{key}'
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        if entry is not None:
+            return entry['value']
+        # Đợi request đang giữ lock build xong
+        deadline = now + LOCK_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        return builder()
+
+    try:
+        value = builder()
+        # Jitter để các key được tạo cùng lúc không hết hạn cùng lúc
+        fresh_for = timeout * random.uniform(0.9, 1.0)
+        cache.set(key, {'value': value, 'fresh_until': time.time() + fresh_for}, timeout=timeout + stale_timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,14 @@
+# core/celery.py
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+app = Celery('core')
+
+# Đọc cấu hình CELERY_* từ settings.py
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Tự tìm tasks.py trong các app đã cài đặt
+app.autodiscover_tasks()
@@ -0,0 +1,100 @@
+# core/lookups.py
+"""
+Cache cho các bảng tra cứu nhỏ, ít thay đổi (OrderStatus, ShippingMethod, PaymentStatus, Size, Color...).
+
+Mỗi tiến trình nạp cả bảng MỘT lần vào bộ nhớ và tra cứu theo id / code / name không cần truy vấn.
+Bản trong bộ nhớ hợp lệ khi số phiên bản trong Redis không đổi (giống CategoryTreeService);
+post_save / post_delete của model tăng phiên bản nên mọi tiến trình nạp lại ở lần tra cứu kế tiếp.
+
+Lưu ý: update() / bulk_create không phát signal, cần gọi invalidate() thủ công.
+"""
+import copy
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+
+from core.caching import bump_version_on_commit, get_version
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    # Code / name được so khớp không phân biệt hoa thường (giống __iexact và collation của MySQL)
+    return value.strip().upper() if isinstance(value, str) else value
+
+
+class LookupTable:
+    """
+    Bảng tra cứu theo các khóa khai báo trong lookup_fields, ví dụ ('code', 'name', ('name', 'hex_code')).
+    Giá trị trả về là bản sao của instance đã cache, có thể sửa / save mà không ảnh hưởng cache.
+    """
+    # Nạp lại định kỳ kể cả khi phiên bản không đổi (phòng trường hợp cập nhật không qua signal)
+    MAX_AGE = 60 * 60  # giây
+
+    def __init__(self, model: Type[models.Model], lookup_fields: Iterable[Union[str, Tuple[str, ...]]]):
+        self.model = model
+        self.lookup_fields = [(fields,) if isinstance(fields, str) else tuple(fields) for fields in lookup_fields]
+        self.version_key = f'lookup:{model._meta.label_lower}:version'
+        self._lock = threading.Lock()
+        # (phiên bản, thời điểm nạp, {pk: instance}, {fields: {key: instance}})
+        self._local: Tuple[Optional[int], float, Dict[Any, models.Model], Dict[tuple, Dict[Any, models.Model]]] = (None, 0.0, {}, {})
+
+        uid = f'lookup_table_{model._meta.label_lower}'
+        post_save.connect(self._on_change, sender=model, weak=False, dispatch_uid=f'{uid}_save')
+        post_delete.connect(self._on_change, sender=model, weak=False, dispatch_uid=f'{uid}_delete')
+
+    def _on_change(self, sender, **kwargs) -> None:
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        bump_version_on_commit(self.version_key)
+
+    def _load(self):
+        version = get_version(self.version_key)
+        local_version, loaded_at, by_pk, indexes = self._local
+        if local_version == version and time.monotonic() - loaded_at < self.MAX_AGE:
+            return by_pk, indexes
+
+        with self._lock:
+            # Thread khác có thể vừa nạp xong
+            local_version, loaded_at, by_pk, indexes = self._local
+            if local_version == version and time.monotonic() - loaded_at < self.MAX_AGE:
+                return by_pk, indexes
+
+            by_pk = {}
+            indexes = {fields: {} for fields in self.lookup_fields}
+            for instance in self.model._default_manager.order_by('pk'):
+                by_pk[instance.pk] = instance
+                for fields, index in indexes.items():
+                    key = tuple(_normalize(getattr(instance, field)) for field in fields)
+                    # Giá trị trùng (cột không unique): giữ bản ghi có pk nhỏ nhất, giống get_or_create trả về bản đầu tiên
+                    index.setdefault(key, instance)
+            self._local = (version, time.monotonic(), by_pk, indexes)
+            logger.debug(f"Loaded lookup table {self.model._meta.label} ({len(by_pk)} rows, version {version}).")
+            return by_pk, indexes
+
+    def get_by_id(self, pk: Any) -> Optional[models.Model]:
+        by_pk, _ = self._load()
+        instance = by_pk.get(pk)
+        if instance is None and isinstance(pk, str) and pk.isdigit():
+            instance = by_pk.get(int(pk))
+        return copy.copy(instance) if instance is not None else None
+
+    def get(self, **lookup) -> Optional[models.Model]:
+        """Tra cứu theo một bộ khóa đã khai báo, ví dụ get(code='PENDING'). None nếu không có."""
+        if set(lookup) in ({'pk'}, {'id'}):
+            return self.get_by_id(next(iter(lookup.values())))
+        fields = next((fields for fields in self.lookup_fields if set(fields) == set(lookup)), None)
+        if fields is None:
+            raise ValueError(f"{self.model._meta.label} lookup table has no index on {tuple(lookup)}.")
+        _, indexes = self._load()
+        instance = indexes[fields].get(tuple(_normalize(lookup[field]) for field in fields))
+        return copy.copy(instance) if instance is not None else None
+
+    def all(self) -> List[models.Model]:
+        by_pk, _ = self._load()
+        return [copy.copy(instance) for instance in by_pk.values()]
@@ -0,0 +1,307 @@
+# core/media.py
+"""
+Phục vụ file trong MEDIA_ROOT.
+
+Production (DEBUG=False) và có cấu hình proxy:
+    - MEDIA_ACCEL_REDIRECT_PREFIX (Nginx): trả header X-Accel-Redirect, Nginx tự stream file.
+        location /protected-media/ { internal; alias /backend/media/; }
+    - MEDIA_SENDFILE_HEADER (Apache mod_xsendfile / lighttpd): trả header X-Sendfile với đường dẫn tuyệt đối.
+Ngược lại, Django tự trả file:
+    - FileResponse cho toàn bộ file (WSGI server dùng wsgi.file_wrapper -> os.sendfile),
+    - ETag / Last-Modified, trả 304 cho If-None-Match / If-Modified-Since,
+    - Range một đoạn (206 / 416), hỗ trợ If-Range.
+File có tên chứa hash nội dung được cache lâu dài (immutable).
+
+Resize theo yêu cầu: /media/r/<w>x<h>/<path> (serve_resized_media)
+    - Chỉ chấp nhận kích thước trong MEDIA_RESIZE_SIZES và ảnh trong MEDIA_RESIZE_SOURCE_DIRS.
+    - Lần đầu: resize bằng Pillow trong process pool (không chặn thread xử lý request),
+      ghi vào cache trên đĩa MEDIA_ROOT/cache/r/<w>x<h>/<ab>/<cd>/<hash>.<ext>.
+      Hash gồm đường dẫn + mtime + kích thước ảnh gốc nên đổi ảnh gốc sẽ tự sinh bản mới.
+    - Lock (flock) theo thư mục shard để nhiều request / nhiều process không resize trùng.
+    - Các lần sau: trả thẳng file đã cache như serve_media.
+"""
+import fcntl
+import hashlib
+import logging
+import mimetypes
+import multiprocessing
+import os
+import posixpath
+import re
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger(__name__)
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Tên file chứa hash nội dung (hex >= 32 ký tự, ví dụ sha256): "3f8a...c2.webp" hoặc "ao-3f8a...c2.jpg"
+HASHED_NAME_PATTERN = re.compile(r'(^|[._-])[0-9a-f]{32,}([._-]|$)')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RESIZE_CACHE_DIR = os.path.join('cache', 'r')
+RESIZE_LOCK_NAME = '.lock'
+# Phần mở rộng ảnh gốc -> (định dạng PIL, phần mở rộng bản resize)
+RESIZE_OUTPUT_FORMATS = {
+    '.jpg': ('JPEG', 'jpg'),
+    '.jpeg': ('JPEG', 'jpg'),
+    '.png': ('PNG', 'png'),
+    '.webp': ('WEBP', 'webp'),
+}
+RESIZE_DEFAULT_FORMAT = ('JPEG', 'jpg')
+
+
+def _cache_control(path: str) -> str:
+    if HASHED_NAME_PATTERN.search(os.path.basename(path)):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def _etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Phân tích header Range một đoạn -> (start, end) bao gồm end.
+    Trả về None nếu header không hỗ trợ (nhiều đoạn, sai cú pháp) -> trả toàn bộ file.
+    Raise ValueError nếu đoạn không thỏa mãn được (416).
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # "bytes=-500": 500 byte cuối
+        length = int(end)
+        if length == 0:
+            raise ValueError("Unsatisfiable range.")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range.")
+    return start, end
+
+
+def _range_applies(request, etag: str, last_modified: int) -> bool:
+    """If-Range: chỉ trả một đoạn khi file chưa đổi so với bản client đang có."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_file_range(file, start: int, length: int):
+    with file:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _serve_file(request, full_path: str, relative_path: str, cache_control: str):
+    """Trả file full_path nằm trong MEDIA_ROOT; relative_path (tương đối với MEDIA_ROOT) dùng cho X-Accel-Redirect."""
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404("Media file not found.")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404("Media file not found.")
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if not settings.DEBUG and (accel_prefix or sendfile_header):
+        # Proxy phía trước tự stream file và xử lý Range / điều kiện
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(relative_path.lstrip('/'))
+        else:
+            response[sendfile_header] = full_path
+        response['Cache-Control'] = cache_control
+        return response
+
+    etag = _etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        # 304 / 412
+        conditional['ETag'] = etag
+        conditional['Cache-Control'] = cache_control
+        return conditional
+
+    size = stat_result.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_file_range(file, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@require_safe
+def serve_media(request, path: str):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404("Invalid media path.")
+    return _serve_file(request, full_path, path, _cache_control(path))
+
+
+# --- Resize theo yêu cầu ---
+_resize_pool: Optional[ProcessPoolExecutor] = None
+_resize_pool_lock = threading.Lock()
+
+
+def _get_resize_pool() -> ProcessPoolExecutor:
+    global _resize_pool
+    with _resize_pool_lock:
+        if _resize_pool is None:
+            # spawn: fork một process Django đa luồng có thể deadlock
+            _resize_pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'MEDIA_RESIZE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _resize_pool
+
+
+def _reset_resize_pool(broken: ProcessPoolExecutor) -> None:
+    global _resize_pool
+    with _resize_pool_lock:
+        if _resize_pool is broken:
+            _resize_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _resize_image_file(source_path: str, target_path: str, width: int, height: int, pil_format: str) -> None:
+    """Chạy trong process pool: giải mã, resize (không phóng to), ghi ra target_path một cách nguyên tử."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if pil_format == 'JPEG':
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGB')
+        image.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+        temp_path = f'{target_path}.{os.getpid()}.tmp'
+        options = {'quality': 85, 'optimize': True} if pil_format in ('JPEG', 'WEBP') else {'optimize': True}
+        try:
+            image.save(temp_path, format=pil_format, **options)
+            os.replace(temp_path, target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def _resize_cache_path(path: str, source_stat: os.stat_result, width: int, height: int, extension: str) -> str:
+    """Đường dẫn (tương đối MEDIA_ROOT) của bản resize, phân shard theo 2 cấp thư mục."""
+    key = hashlib.sha1(f'{path}:{source_stat.st_mtime_ns}:{source_stat.st_size}'.encode('utf-8')).hexdigest()
+    return os.path.join(RESIZE_CACHE_DIR, f'{width}x{height}', key[:2], key[2:4], f'{key}.{extension}')
+
+
+@require_safe
+def serve_resized_media(request, width: str, height: str, path: str):
+    size = f'{int(width)}x{int(height)}'
+    if size not in getattr(settings, 'MEDIA_RESIZE_SIZES', ()):
+        raise Http404("Image size is not allowed.")
+    # Chuẩn hóa trước khi so với danh sách thư mục: "products/../private/x.png" không nằm trong products/
+    path = posixpath.normpath(path)
+    if not path.startswith(tuple(getattr(settings, 'MEDIA_RESIZE_SOURCE_DIRS', ()))):
+        raise Http404("Image path is not allowed.")
+
+    try:
+        source_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404("Invalid media path.")
+    try:
+        source_stat = os.stat(source_path)
+    except OSError:
+        raise Http404("Media file not found.")
+    if not stat.S_ISREG(source_stat.st_mode):
+        raise Http404("Media file not found.")
+
+    pil_format, extension = RESIZE_OUTPUT_FORMATS.get(os.path.splitext(path)[1].lower(), RESIZE_DEFAULT_FORMAT)
+    relative_path = _resize_cache_path(path, source_stat, int(width), int(height), extension)
+    target_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    # URL không chứa hash nội dung nên không dùng cache immutable
+    cache_control = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+    if not os.path.exists(target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Một file lock cố định cho mỗi thư mục shard, không bao giờ bị xóa: xóa file lock khi
+        # request khác đang chờ trên nó sẽ cho request thứ ba lock một file mới và resize trùng
+        lock_path = os.path.join(os.path.dirname(target_path), RESIZE_LOCK_NAME)
+        with open(lock_path, 'a') as lock_file:
+            # Request khác (cùng hoặc khác process) đang resize trong shard thì chờ rồi dùng lại kết quả.
+            # Đóng file sẽ nhả flock
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(target_path):
+                pool = _get_resize_pool()
+                try:
+                    pool.submit(
+                        _resize_image_file, source_path, target_path, int(width), int(height), pil_format
+                    ).result(timeout=getattr(settings, 'MEDIA_RESIZE_TIMEOUT', 30))
+                except BrokenProcessPool:
+                    logger.error("Image resize pool is broken, recreating it.")
+                    _reset_resize_pool(pool)
+                    return HttpResponse("Image resizing is temporarily unavailable.", status=503)
+                except FutureTimeoutError:
+                    logger.error(f"Timed out resizing image '{path}' to {size}.")
+                    return HttpResponse("Image resizing timed out.", status=503)
+                except Exception as e:
+                    logger.warning(f"Error resizing image '{path}' to {size}: {e}")
+                    raise Http404("Media file is not a valid image.")
+
+    return _serve_file(request, target_path, relative_path, cache_control)
@@ -0,0 +1,120 @@
+# core/models.py
+"""
+Mixin dùng chung cho các model.
+
+DirtyFieldsMixin: ghi nhớ giá trị các cột lúc load từ database (from_db), để biết
+trường nào đã thay đổi mà không cần SELECT lại bản ghi. save() trên bản ghi đã load
+chỉ UPDATE các cột thay đổi (update_fields), không có gì thay đổi thì không ghi.
+
+Lưu ý: save() không thay đổi gì cũng không phát pre_save / post_save. Các receiver hiện có
+(product/signals.py: chỉ mục tìm kiếm, cache chi tiết, hẹn giờ đăng, renditions ảnh) chỉ cần
+chạy khi dữ liệu đổi; muốn sinh lại renditions bị thiếu thì dùng lệnh generate_image_renditions
+thay vì save() lại bản ghi.
+"""
+import copy
+from typing import Any, Dict, Optional
+
+from django.db import models
+
+_UNSET = object()
+
+
+class DirtyFieldsMixin:
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot(field_names)
+        return instance
+
+    def _tracked_value(self, field: models.Field) -> Any:
+        value = getattr(self, field.attname)
+        if isinstance(field, models.FileField):
+            # FieldFile -> tên file
+            return value.name if value else None
+        if isinstance(field, models.JSONField):
+            # Tránh việc sửa trực tiếp dict/list làm thay đổi luôn giá trị đã lưu
+            return copy.deepcopy(value)
+        return value
+
+    def _snapshot(self, attnames=None) -> None:
+        """Ghi nhớ giá trị hiện tại của các cột (mặc định: mọi cột đã load, không tính cột defer)."""
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        deferred = self.get_deferred_fields()
+        for field in self._meta.concrete_fields:
+            # GeneratedField do database tính, không bao giờ được ghi (và bị defer sau save)
+            if field.primary_key or field.generated or field.attname in deferred:
+                continue
+            if attnames is not None and field.attname not in attnames:
+                continue
+            loaded[field.attname] = self._tracked_value(field)
+
+    def get_dirty_fields(self) -> Optional[Dict[str, Any]]:
+        """
+        {tên field: giá trị lúc load} của các field đã thay đổi.
+        None nếu bản ghi không được load từ database (không biết giá trị cũ).
+        """
+        loaded = self.__dict__.get('_loaded_values')
+        if loaded is None:
+            return None
+        dirty = {}
+        for field in self._meta.concrete_fields:
+            old_value = loaded.get(field.attname, _UNSET)
+            if old_value is _UNSET or field.generated:
+                continue
+            if self._tracked_value(field) != old_value:
+                dirty[field.name] = old_value
+        return dirty
+
+    def get_loaded_value(self, field_name: str, default=None) -> Any:
+        """Giá trị lúc load của field (theo tên field hoặc attname)."""
+        field = self._meta.get_field(field_name)
+        return self.__dict__.get('_loaded_values', {}).get(field.attname, default)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        attnames = None
+        if fields is not None:
+            attnames = {self._meta.get_field(name).attname for name in fields}
+        self._snapshot(attnames)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (
+            update_fields is None
+            and not args
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+            and self.pk is not None
+        ):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                # Chỉ ghi các cột đã thay đổi; danh sách rỗng -> Django bỏ qua việc ghi.
+                # Cột bị defer rồi được gán (có trong __dict__ nhưng không có giá trị lúc load)
+                # không so sánh được: luôn ghi, giống save() của Django
+                loaded = self.__dict__['_loaded_values']
+                update_fields = list(dirty) + [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and not field.generated
+                    and field.attname in self.__dict__ and field.attname not in loaded
+                ]
+                if update_fields:
+                    # Trường auto_now được gán trong pre_save nên không bao giờ "thay đổi" trước khi save
+                    update_fields += [
+                        field.name for field in self._meta.concrete_fields
+                        if getattr(field, 'auto_now', False) and field.name not in dirty
+                    ]
+                kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
+        if update_fields is None or update_fields:
+            # Django không đọc lại GeneratedField sau UPDATE: bỏ giá trị cũ, lần truy cập sau sẽ nạp lại
+            for field in self._meta.concrete_fields:
+                if field.generated:
+                    self.__dict__.pop(field.attname, None)
+
+        if update_fields is None:
+            self._snapshot()
+        else:
+            self._snapshot({self._meta.get_field(name).attname for name in update_fields})
@@ -180,6 +180,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static') # Thư mục để `collectstatic
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') # Thư mục cho media files
+# Giao file media qua proxy khi DEBUG=False (xem core/media.py)
+# Nginx: MEDIA_ACCEL_REDIRECT_PREFIX=/protected-media/ ; Apache/lighttpd: MEDIA_SENDFILE_HEADER=X-Sendfile
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 3600)) # Giây, cho file không có hash trong tên
+# Resize ảnh theo yêu cầu: /media/r/<w>x<h>/<path>
+MEDIA_RESIZE_SIZES = ['64x64', '160x160', '320x320', '480x480', '960x960', '1600x1600']
+MEDIA_RESIZE_SOURCE_DIRS = ['blobs/', 'products/', 'product_variants/', 'categories/']
+MEDIA_RESIZE_WORKERS = int(os.environ.get('MEDIA_RESIZE_WORKERS', 2)) # Số process resize mỗi worker web
+MEDIA_RESIZE_TIMEOUT = 30 # Giây
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'user.User'
@@ -277,10 +287,44 @@ CELERY_ENABLE_UTC = False   # Tắt UTC khi đã dùng timezone cụ thể
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BEAT_SCHEDULE = {
     'publish-scheduled-products-job': {
+        # Lưới an toàn: sản phẩm được đăng đúng giờ bởi task ETA publish_product (xem product/publishing.py)
         'task': 'product.tasks.publish_scheduled_products', # Đảm bảo task này tồn tại và import được
-        'schedule': crontab(minute='*/5'), # Chạy mỗi 5 phút
+        'schedule': crontab(minute='*/15'), # Chạy mỗi 15 phút
+    },
+    'resume-deletion-jobs': {
+        'task': 'product.tasks.resume_deletion_jobs', # Chạy lại các job xóa nền bị kẹt
+        'schedule': crontab(minute='*/10'),
+    },
+    'flush-carts': {
+        'task': 'cart.tasks.flush_carts', # Lưới an toàn cho ghi trễ giỏ hàng Redis (CART_BACKEND = 'redis')
+        'schedule': crontab(minute='*'),
+    },
+    'reconcile-stock-reservations': {
+        'task': 'order.tasks.reconcile_stock_reservations', # Trả lại giữ hàng hết hạn, đối chiếu tồn kho với MySQL
+        'schedule': crontab(minute='*'),
     },
 }
+# Task ETA đăng sản phẩm chỉ được gửi cho lịch trong khoảng này (giây), không vượt quá visibility_timeout của broker Redis
+PRODUCT_PUBLISH_ETA_HORIZON = int(os.environ.get('PRODUCT_PUBLISH_ETA_HORIZON', 3600))
+# Số sản phẩm quá hạn task định kỳ đăng bù trong mỗi lô (mỗi lô một transaction)
+PRODUCT_PUBLISH_SWEEP_BATCH_SIZE = int(os.environ.get('PRODUCT_PUBLISH_SWEEP_BATCH_SIZE', 500))
+# Nơi lưu giỏ hàng: 'database' (bảng cart_item) hoặc 'redis' (hash Redis, ghi trễ xuống cart_item, xem cart/store.py)
+CART_BACKEND = os.environ.get('CART_BACKEND', 'database')
+# Số giây gộp các lần ghi giỏ trước khi flush xuống database, và số giỏ mỗi lần flush
+CART_FLUSH_DELAY = int(os.environ.get('CART_FLUSH_DELAY', 5))
+CART_FLUSH_BATCH_SIZE = int(os.environ.get('CART_FLUSH_BATCH_SIZE', 200))
+# Thời gian giữ giỏ của user trong Redis kể từ lần ghi cuối (giây); hết hạn thì được nạp lại từ cart_item
+CART_REDIS_TTL = int(os.environ.get('CART_REDIS_TTL', 7 * 24 * 3600))
+# Thời gian cache tồn kho biến thể dùng để kiểm tra số lượng khi thêm vào giỏ (giây)
+CART_VARIANT_CACHE_TIMEOUT = int(os.environ.get('CART_VARIANT_CACHE_TIMEOUT', 30))
+# Số thao tác tối đa trong một request POST /cart/bulk/
+CART_BULK_MAX_ITEMS = int(os.environ.get('CART_BULK_MAX_ITEMS', 100))
+# Thời gian giữ hàng từ lúc bắt đầu checkout (giây), và thời gian cache tồn kho MySQL trong Redis (xem order/reservations.py)
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 600))
+STOCK_LEVEL_CACHE_TIMEOUT = int(os.environ.get('STOCK_LEVEL_CACHE_TIMEOUT', 60))
+# Giỏ của khách chưa đăng nhập: lưu trong Redis, token trong cookie đã ký (xem cart/guest.py)
+GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL', 7 * 24 * 3600))
+GUEST_CART_COOKIE_NAME = 'guest_cart'
 if (not CELERY_BROKER_URL or not CELERY_RESULT_BACKEND) and not DEBUG:
     print("WARNING: Celery Broker/Result backend URL not configured. Celery tasks might not work.")
 
@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import RequestFactory
+from PIL import Image
+
+from core.caching import bump_version
+from core.media import RESIZE_LOCK_NAME, serve_media, serve_resized_media
+from product.lookups import colors, sizes
+from product.models import Color, Size
+
+
+class MediaTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        # Django tự trả file (không qua X-Accel-Redirect / X-Sendfile)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX=None, MEDIA_SENDFILE_HEADER=None,
+            MEDIA_RESIZE_SIZES=['64x64'], MEDIA_RESIZE_SOURCE_DIRS=['products/'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def _write(self, path: str, content: bytes) -> None:
+        full_path = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as file:
+            file.write(content)
+
+    @staticmethod
+    def _body(response) -> bytes:
+        return b''.join(response.streaming_content)
+
+
+class ServeMediaTests(MediaTestCase):
+    CONTENT = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self._write('products/file.txt', self.CONTENT)
+
+    def _get(self, **headers):
+        return serve_media(self.factory.get('/media/products/file.txt', **headers), 'products/file.txt')
+
+    def test_full_file_and_not_modified(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_range(self):
+        response = self._get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self._body(response), b'2345')
+
+        response = self._get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, self._body(response)), (206, b'789'))
+
+    def test_unsatisfiable_range(self):
+        response = self._get(HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range(self):
+        etag = self._get()['ETag']
+        response = self._get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, self._body(response)), (206, b'01'))
+
+        # File đã đổi so với bản client đang có: trả toàn bộ file
+        response = self._get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, self._body(response)), (200, self.CONTENT))
+
+    def test_path_outside_media_root(self):
+        with self.assertRaises(Http404):
+            serve_media(self.factory.get('/media/../settings.py'), '../settings.py')
+
+
+# Resize trong thread thay vì process pool (spawn) cho nhanh
+@mock.patch('core.media._get_resize_pool', lambda: ThreadPoolExecutor(max_workers=1))
+class ServeResizedMediaTests(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), (255, 0, 0)).save(buffer, format='PNG')
+        self.image = buffer.getvalue()
+        self._write('products/ao.png', self.image)
+
+    def _get(self, size='64x64', path='products/ao.png'):
+        width, height = size.split('x')
+        return serve_resized_media(self.factory.get(f'/media/r/{size}/{path}'), width, height, path)
+
+    def test_resize_is_cached_and_lock_file_is_kept(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        with Image.open(BytesIO(self._body(response))) as image:
+            self.assertEqual(image.size, (64, 32))
+
+        cached = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(os.path.join(self.media_root, 'cache')) for name in names
+        ]
+        self.assertEqual(sorted(os.path.basename(path) for path in cached)[0], RESIZE_LOCK_NAME)
+        self.assertEqual(len(cached), 2)
+
+        # Lần sau trả thẳng bản đã cache, không resize lại
+        with mock.patch('core.media._resize_image_file') as resize:
+            self.assertEqual(self._get().status_code, 200)
+        resize.assert_not_called()
+
+    def test_size_not_allowed(self):
+        with self.assertRaises(Http404):
+            self._get(size='65x65')
+
+    def test_directory_not_allowed(self):
+        self._write('private/ao.png', self.image)
+        with self.assertRaises(Http404):
+            self._get(path='private/ao.png')
+        with self.assertRaises(Http404):
+            self._get(path='products/../private/ao.png')
+
+    def test_invalid_image(self):
+        self._write('products/broken.png', b'not an image')
+        with self.assertRaises(Http404):
+            self._get(path='products/broken.png')
+
+
+class LookupTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small, cls.medium = Size.objects.bulk_create([Size(name='S'), Size(name='M')])
+        Color.objects.bulk_create([Color(name='Black', hex_code='#000000'), Color(name='Black', hex_code='#111111')])
+
+    def setUp(self):
+        # Bảng tra cứu là biến module: bỏ bản đã nạp ở test trước
+        bump_version(sizes.version_key)
+        bump_version(colors.version_key)
+
+    def test_lookups_after_first_load_need_no_queries(self):
+        sizes.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(sizes.get(name=' s ').pk, self.small.pk)
+            self.assertEqual(sizes.get_by_id(str(self.medium.pk)).name, 'M')
+            self.assertIsNone(sizes.get(name='XL'))
+            self.assertEqual([size.name for size in sizes.all()], ['S', 'M'])
+
+    def test_indexes(self):
+        # Tên trùng: bản ghi có pk nhỏ nhất; khóa ghép phân biệt theo mã màu
+        self.assertEqual(colors.get(name='BLACK').hex_code, '#000000')
+        self.assertEqual(colors.get(name='black', hex_code='#111111').hex_code, '#111111')
+        with self.assertRaises(ValueError):
+            colors.get(hex_code='#000000')
+
+    def test_save_and_delete_bump_version(self):
+        sizes.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            size = Size.objects.create(name='XL')
+        self.assertEqual(sizes.get(name='xl').pk, size.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            size.name = 'XXL'
+            size.save()
+        self.assertIsNone(sizes.get(name='XL'))
+        self.assertEqual(sizes.get(name='XXL').pk, size.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            size.delete()
+        self.assertIsNone(sizes.get(name='XXL'))
+
+    def test_bulk_create_needs_invalidate(self):
+        sizes.all()
+        Size.objects.bulk_create([Size(name='XL')])
+        self.assertIsNone(sizes.get(name='XL'))
+
+        # Như CatalogImporter._ensure_attributes
+        with self.captureOnCommitCallbacks(execute=True):
+            sizes.invalidate()
+        self.assertIsNotNone(sizes.get(name='XL'))
+
+    def test_invalidate_waits_for_commit(self):
+        sizes.all()
+        with self.captureOnCommitCallbacks(execute=False):
+            Size.objects.create(name='XL')
+            self.assertIsNone(sizes.get(name='XL'))
+
+    def test_callers_get_copies(self):
+        size = sizes.get(name='S')
+        size.name = 'Changed'
+        sizes.get_by_id(self.medium.pk).name = 'Changed'
+        sizes.all()[0].name = 'Changed'
+
+        with self.assertNumQueries(0):
+            self.assertEqual([size.name for size in sizes.all()], ['S', 'M'])
+            self.assertIsNone(sizes.get(name='Changed'))
@@ -19,10 +19,10 @@ from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from django.conf.urls.static import static
+import re
 from django.conf import settings
-from django.views.static import serve
 from django.urls import re_path
+from core.media import serve_media, serve_resized_media
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -46,12 +46,13 @@ urlpatterns = [
     
 ]
 
-# Serve media files trong cả development và production
-# Trong production thực tế, nên dùng web server như Nginx để serve static files
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-else:
-    # Serve media files ngay cả khi DEBUG=False (cho development/testing)
-    urlpatterns += [
-        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    ]
+# Serve media files trong cả development và production (xem core/media.py):
+# production có cấu hình proxy thì chỉ trả X-Accel-Redirect / X-Sendfile, proxy tự stream file
+urlpatterns += [
+    # /media/r/<w>x<h>/<path>: ảnh resize theo yêu cầu, cache trên đĩa
+    re_path(
+        r'^%sr/(?P<width>\d+)x(?P<height>\d+)/(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        serve_resized_media,
+    ),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'order'
+
+    def ready(self):
+        # Đăng ký signal vô hiệu hóa cache bảng tra cứu OrderStatus / ShippingMethod
+        from . import lookups  # noqa: F401
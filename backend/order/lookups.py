@@ -0,0 +1,7 @@
+# order/lookups.py
+"""Bảng tra cứu của app order, cache trong bộ nhớ tiến trình (xem core/lookups.py)."""
+from core.lookups import LookupTable
+from order.models import OrderStatus, ShippingMethod
+
+order_statuses = LookupTable(OrderStatus, ['status_code'])
+shipping_methods = LookupTable(ShippingMethod, ['method_code'])
@@ -0,0 +1,247 @@
+# order/reservations.py
+"""
+Giữ hàng có thời hạn trong lúc checkout.
+
+Bắt đầu checkout (TemporaryOrderAPIView) đặt giữ hàng cho từng biến thể trong STOCK_RESERVATION_TTL giây;
+tồn kho khả dụng = tồn kho - tổng hàng đang được giữ. Tạo đơn (OrderService.create_order_from_cart)
+đặt lại / gia hạn giữ hàng rồi trừ tồn kho bằng UPDATE có điều kiện stock >= quantity,
+sau khi commit thì chuyển phần giữ thành hàng đã bán; đơn bị rollback thì trả lại phần giữ ngay (release).
+
+Toàn bộ nằm trong Redis, mỗi thao tác là một script Lua (nguyên tử) nên không khóa dòng biến thể trong MySQL:
+- stock:level:<variant_id>  tồn kho đọc từ MySQL (cache STOCK_LEVEL_CACHE_TIMEOUT giây)
+- stock:held:<variant_id>   tổng số lượng đang được giữ
+- stock:hold:<user_id>      hash {variant_id: số lượng} user đang giữ
+- stock:holds               sorted set "<user_id>:<variant_id>" theo thời điểm hết hạn
+Giữ hàng hết hạn được trả lại ngay trong script đặt giữ và bởi task reconcile_stock_reservations;
+task này cũng đếm lại stock:held từ các phần giữ và đọc lại tồn kho từ MySQL.
+
+MySQL vẫn là nguồn đúng: UPDATE có điều kiện chặn bán quá số lượng kể cả khi Redis lệch
+hoặc không dùng được (khi đó checkout chạy tiếp không giữ hàng).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from product.models import ProductVariant
+
+logger = logging.getLogger(__name__)
+
+HOLDS_KEY = 'stock:holds'
+
+# Trả lại tối đa `limit` phần giữ đã hết hạn (dùng chung cho các script bên dưới)
+RELEASE_EXPIRED_LUA = """
+local function release_expired(now, limit)
+    local expired = redis.call('ZRANGEBYSCORE', 'stock:holds', '-inf', now, 'LIMIT', 0, limit)
+    for _, member in ipairs(expired) do
+        local owner, vid = string.match(member, '^(.-):(%d+)$')
+        local quantity = tonumber(redis.call('HGET', 'stock:hold:' .. owner, vid) or '0')
+        if quantity > 0 then redis.call('DECRBY', 'stock:held:' .. vid, quantity) end
+        redis.call('HDEL', 'stock:hold:' .. owner, vid)
+        redis.call('ZREM', 'stock:holds', member)
+    end
+    return #expired
+end
+"""
+
+# Đặt giữ hàng cho user, thay toàn bộ phần giữ trước đó (tất cả hoặc không).
+# ARGV: user_id, now, expires_at, rồi từng cặp variant_id, quantity
+# Trả về {1} nếu thành công, {0, variant_id, available} nếu không đủ hàng,
+# {-1, variant_id...} nếu chưa có tồn kho của các biến thể trong Redis.
+RESERVE_SCRIPT = RELEASE_EXPIRED_LUA + """
+release_expired(ARGV[2], 100)
+local owner = ARGV[1]
+local hold_key = 'stock:hold:' .. owner
+local wanted = {}
+local missing = {}
+for i = 4, #ARGV, 2 do
+    wanted[ARGV[i]] = tonumber(ARGV[i + 1])
+    if redis.call('EXISTS', 'stock:level:' .. ARGV[i]) == 0 then table.insert(missing, ARGV[i]) end
+end
+if #missing > 0 then return {-1, unpack(missing)} end
+for vid, quantity in pairs(wanted) do
+    local available = tonumber(redis.call('GET', 'stock:level:' .. vid))
+        - tonumber(redis.call('GET', 'stock:held:' .. vid) or '0')
+        + tonumber(redis.call('HGET', hold_key, vid) or '0')
+    if available < quantity then return {0, vid, available} end
+end
+for _, vid in ipairs(redis.call('HKEYS', hold_key)) do
+    if not wanted[vid] then
+        redis.call('DECRBY', 'stock:held:' .. vid, tonumber(redis.call('HGET', hold_key, vid)))
+        redis.call('HDEL', hold_key, vid)
+        redis.call('ZREM', 'stock:holds', owner .. ':' .. vid)
+    end
+end
+for vid, quantity in pairs(wanted) do
+    local mine = tonumber(redis.call('HGET', hold_key, vid) or '0')
+    redis.call('INCRBY', 'stock:held:' .. vid, quantity - mine)
+    redis.call('HSET', hold_key, vid, quantity)
+    redis.call('ZADD', 'stock:holds', ARGV[3], owner .. ':' .. vid)
+end
+return {1}
+"""
+
+# Chuyển phần giữ thành hàng đã bán sau khi đơn được lưu (tồn kho MySQL đã bị trừ).
+# ARGV: user_id, rồi từng cặp variant_id, quantity
+CONSUME_SCRIPT = """
+local hold_key = 'stock:hold:' .. ARGV[1]
+for i = 2, #ARGV, 2 do
+    local vid = ARGV[i]
+    local mine = tonumber(redis.call('HGET', hold_key, vid) or '0')
+    if mine > 0 then
+        redis.call('DECRBY', 'stock:held:' .. vid, mine)
+        redis.call('HDEL', hold_key, vid)
+        redis.call('ZREM', 'stock:holds', ARGV[1] .. ':' .. vid)
+    end
+    if redis.call('EXISTS', 'stock:level:' .. vid) == 1 then
+        redis.call('DECRBY', 'stock:level:' .. vid, tonumber(ARGV[i + 1]))
+    end
+end
+return 1
+"""
+
+# Trả lại mọi phần giữ của user (đặt đơn thất bại). ARGV: user_id
+RELEASE_SCRIPT = """
+local hold_key = 'stock:hold:' .. ARGV[1]
+local holds = redis.call('HGETALL', hold_key)
+for i = 1, #holds, 2 do
+    redis.call('DECRBY', 'stock:held:' .. holds[i], tonumber(holds[i + 1]))
+    redis.call('ZREM', 'stock:holds', ARGV[1] .. ':' .. holds[i])
+end
+redis.call('DEL', hold_key)
+return #holds / 2
+"""
+
+RELEASE_EXPIRED_SCRIPT = RELEASE_EXPIRED_LUA + """
+return release_expired(ARGV[1], tonumber(ARGV[2]))
+"""
+
+# Đếm lại stock:held từ các phần giữ đang có. ARGV: các variant_id đang có khóa stock:held
+RECOUNT_SCRIPT = """
+local sums = {}
+for _, member in ipairs(redis.call('ZRANGE', 'stock:holds', 0, -1)) do
+    local owner, vid = string.match(member, '^(.-):(%d+)$')
+    sums[vid] = (sums[vid] or 0) + tonumber(redis.call('HGET', 'stock:hold:' .. owner, vid) or '0')
+end
+for _, vid in ipairs(ARGV) do
+    if not sums[vid] then redis.call('DEL', 'stock:held:' .. vid) end
+end
+for vid, total in pairs(sums) do
+    redis.call('SET', 'stock:held:' .. vid, total)
+end
+return 1
+"""
+
+
+class InsufficientStock(ValueError):
+    """Không đủ hàng khả dụng (tồn kho trừ hàng người khác đang giữ) cho variant_id."""
+
+    def __init__(self, variant_id: int, available: int):
+        self.variant_id = variant_id
+        self.available = max(available, 0)
+        super().__init__(f"Insufficient stock for variant {variant_id}. Available: {self.available}.")
+
+
+class StockReservationService:
+
+    @staticmethod
+    def _client():
+        return get_redis_connection('default')
+
+    @staticmethod
+    def hold_ttl() -> int:
+        return getattr(settings, 'STOCK_RESERVATION_TTL', 600)
+
+    @staticmethod
+    def _load_levels(variant_ids: Iterable[int], overwrite: bool = False) -> None:
+        """Đọc tồn kho từ MySQL vào stock:level (không khóa dòng). overwrite=False: giữ giá trị đang có."""
+        rows = ProductVariant.objects.filter(pk__in=list(variant_ids)).values_list('pk', 'stock')
+        timeout = getattr(settings, 'STOCK_LEVEL_CACHE_TIMEOUT', 60)
+        pipe = StockReservationService._client().pipeline(transaction=False)
+        for pk, stock in rows:
+            pipe.set(f'stock:level:{pk}', stock, ex=timeout, nx=not overwrite)
+        pipe.execute()
+
+    @staticmethod
+    def reserve(user_id: int, quantities: Dict[int, int]) -> Optional[datetime]:
+        """
+        Giữ {variant_id: quantity} cho user tới thời điểm trả về, thay các phần giữ trước đó của user
+        (gọi lại với cùng giỏ chỉ gia hạn). Raise InsufficientStock nếu một biến thể không đủ hàng, khi đó
+        không có gì thay đổi. Trả về None nếu Redis không dùng được (checkout chạy tiếp không giữ hàng).
+        """
+        quantities = {int(pk): int(quantity) for pk, quantity in quantities.items() if quantity > 0}
+        if not quantities:
+            return None
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=StockReservationService.hold_ttl())
+        args = [user_id, now.timestamp(), expires_at.timestamp()]
+        for variant_id, quantity in quantities.items():
+            args += [variant_id, quantity]
+
+        client = StockReservationService._client()
+        try:
+            result = client.eval(RESERVE_SCRIPT, 0, *args)
+            if int(result[0]) == -1:
+                StockReservationService._load_levels(int(pk) for pk in result[1:])
+                result = client.eval(RESERVE_SCRIPT, 0, *args)
+        except RedisError as e:
+            logger.error(f"Error reserving stock for user {user_id}: {e}", exc_info=True)
+            return None
+
+        if int(result[0]) == -1:
+            # Biến thể không còn trong database
+            raise InsufficientStock(int(result[1]), 0)
+        if int(result[0]) == 0:
+            raise InsufficientStock(int(result[1]), int(result[2]))
+        logger.debug(f"Reserved {quantities} for user {user_id} until {expires_at}.")
+        return expires_at
+
+    @staticmethod
+    def consume(user_id: int, quantities: Dict[int, int]) -> None:
+        """Chuyển phần giữ của user thành hàng đã bán (gọi sau khi đơn đã commit)."""
+        if not quantities:
+            return
+        args = [user_id]
+        for variant_id, quantity in quantities.items():
+            args += [int(variant_id), int(quantity)]
+        try:
+            StockReservationService._client().eval(CONSUME_SCRIPT, 0, *args)
+        except RedisError as e:
+            # Phần giữ tự hết hạn; tồn kho được đọc lại khi reconcile
+            logger.error(f"Error consuming stock reservations for user {user_id}: {e}", exc_info=True)
+
+    @staticmethod
+    def release(user_id: int) -> None:
+        """Trả lại mọi phần giữ của user, ví dụ khi đặt đơn thất bại và transaction bị rollback."""
+        try:
+            StockReservationService._client().eval(RELEASE_SCRIPT, 0, user_id)
+        except RedisError as e:
+            # Phần giữ tự hết hạn sau STOCK_RESERVATION_TTL
+            logger.error(f"Error releasing stock reservations for user {user_id}: {e}", exc_info=True)
+
+    @staticmethod
+    def reconcile(batch_size: int = 500) -> int:
+        """
+        Trả lại các phần giữ hết hạn, đếm lại stock:held và đọc lại tồn kho từ MySQL
+        cho các biến thể đang có trong Redis. Trả về số phần giữ hết hạn đã trả lại.
+        """
+        client = StockReservationService._client()
+        now = timezone.now().timestamp()
+        released = 0
+        while True:
+            count = client.eval(RELEASE_EXPIRED_SCRIPT, 0, now, batch_size)
+            released += count
+            if count < batch_size:
+                break
+
+        held_ids = [key.decode().rsplit(':', 1)[1] for key in client.scan_iter(match='stock:held:*', count=1000)]
+        client.eval(RECOUNT_SCRIPT, 0, *held_ids)
+
+        level_ids = [int(key.decode().rsplit(':', 1)[1]) for key in client.scan_iter(match='stock:level:*', count=1000)]
+        for start in range(0, len(level_ids), batch_size):
+            StockReservationService._load_levels(level_ids[start:start + batch_size], overwrite=True)
+        return released
@@ -19,10 +19,14 @@ from order.models import (
     OrderStatus, ShippingMethod, Order, OrderItem, CancelledOrder, OrderReutrnStatus, ReturnedOrder,
     OrderReturnedItem, OrderHistory, DeliveryMethod
 )
+from order.lookups import order_statuses, shipping_methods
+from order.reservations import InsufficientStock, StockReservationService
 from address.models import DeliveryAddress
 from payment.models import PaymentMethod, PaymentStatus # Assuming these are in payment app
+from payment.lookups import payment_methods
 from cart.models import CartItem # Assuming cart items are here
-from product.models import ProductVariant
+from product.models import Product, ProductVariant
+from product.caching import ProductDetailCache
 # Import services from other apps if needed (e.g., CartService to clear cart)
 from cart.services import CartService
 
@@ -32,20 +36,18 @@ User = get_user_model()
 # --- Helper: Get Initial/Default Statuses ---
 def get_initial_order_status() -> Optional[OrderStatus]:
     # Define your logic to get the first status (e.g., 'PENDING', 'WAITING_PAYMENT')
-    try:
-        # Make sure you have seeded these statuses in your DB
-        return OrderStatus.objects.get(status_code__iexact='PENDING') # Example code
-    except ObjectDoesNotExist:
+    # Make sure you have seeded these statuses in your DB
+    status = order_statuses.get(status_code='PENDING')  # Bảng tra cứu cache trong bộ nhớ (order/lookups.py)
+    if status is None:
         logger.error("Initial OrderStatus ('PENDING') not found in database!")
-        return None
+    return status
 
 def get_standard_shipping_method() -> Optional[ShippingMethod]:
     # Define your logic to get the default shipping method (e.g., 'Standard', 'Express')
-    try:
-        return ShippingMethod.objects.get(method_code__iexact='STANDARD') # Example code
-    except ObjectDoesNotExist:
+    method = shipping_methods.get(method_code='STANDARD')
+    if method is None:
         logger.error("Standard ShippingMethod not found in database!")
-        return None
+    return method
 # --- Order History Service ---
 class OrderHistoryService:
     @staticmethod
@@ -82,7 +84,6 @@ class OrderService:
         return code
 
     @staticmethod
-    @transaction.atomic
     def create_order_from_cart(
         user: User,
         payment_method_id: int,
@@ -95,8 +96,30 @@ class OrderService:
         Creates an Order from the user's current cart items.
         Checks stock, calculates totals, creates OrderItems, clears cart.
         """
+        # Giỏ Redis được ghi xuống cart_item TRƯỚC transaction của đơn: đơn bị rollback không làm mất bản ghi giỏ
+        CartService.flush_for_checkout(user)
+        try:
+            return OrderService._create_order_from_cart(
+                user, payment_method_id, delivery_address_id, customer_note, cart_item_ids, coupons
+            )
+        except Exception:
+            # Đơn bị rollback: trả lại hàng đang giữ ngay, không để nó khóa tồn kho tới khi hết hạn
+            StockReservationService.release(user.pk)
+            raise
+
+    @staticmethod
+    @transaction.atomic
+    def _create_order_from_cart(
+        user: User,
+        payment_method_id: int,
+        delivery_address_id: Optional[int],
+        customer_note: Optional[str],
+        cart_item_ids: Optional[List[int]],
+        coupons: Optional[List[str]],
+    ) -> Order:
         logger.info(f"Attempting to create order for User ID: {user.pk}")
-        shipping_method_id = get_standard_shipping_method().pk if get_standard_shipping_method() else None
+        standard_shipping_method = get_standard_shipping_method()
+        shipping_method_id = standard_shipping_method.pk if standard_shipping_method else None
         # 1. Validate Inputs and Fetch Related Objects
         delivery_address = None
         if delivery_address_id:
@@ -105,14 +128,12 @@ class OrderService:
                 print("Delivery info found:", delivery_address.id)
             except ObjectDoesNotExist:
                 raise ValueError(f"Delivery info with ID {delivery_address_id} not found for this user.")
-        try:
-            shipping_method = ShippingMethod.objects.get(pk=shipping_method_id, is_active=True)
-        except ObjectDoesNotExist:
+        shipping_method = shipping_methods.get_by_id(shipping_method_id)
+        if shipping_method is None or not shipping_method.is_active:
             raise ValueError(f"Shipping method with ID {shipping_method_id} not found or is inactive.")
 
-        try:
-            payment_method = PaymentMethod.objects.get(pk=payment_method_id, is_active=True)
-        except ObjectDoesNotExist:
+        payment_method = payment_methods.get_by_id(payment_method_id)
+        if payment_method is None or not payment_method.is_active:
             raise ValueError(f"Payment method with ID {payment_method_id} not found or is inactive.")
 
         initial_status = get_initial_order_status()
@@ -121,10 +142,25 @@ class OrderService:
 
         # 2. Fetch Cart Items and Check Stock/Availability
         # cart_items = CartService.list_cart_items(user).select_related('variant__product') # Ensure product is selected
-        cart_items = CartService.get_cart_items_by_ids(user, cart_item_ids) if cart_item_ids else CartService.list_cart_items(user)
+        # Giỏ Redis đã được flush trước transaction (create_order_from_cart)
+        if cart_item_ids:
+            cart_items = CartService.get_cart_items_by_ids(user, cart_item_ids, flush=False)
+        else:
+            cart_items = CartService.list_cart_items(user, flush=False)
         if not cart_items:
             raise ValueError("Cannot create order: Cart is empty.")
 
+        # Gia hạn (hoặc đặt) giữ hàng từ lúc bắt đầu checkout: tồn kho khả dụng đã trừ hàng người khác đang giữ
+        reserved_quantities = {}
+        for item in cart_items:
+            if item.variant_id:
+                reserved_quantities[item.variant_id] = reserved_quantities.get(item.variant_id, 0) + item.quantity
+        try:
+            StockReservationService.reserve(user.pk, reserved_quantities)
+        except InsufficientStock as e:
+            variant = next(item.variant for item in cart_items if item.variant_id == e.variant_id)
+            raise ValueError(f"Insufficient stock for '{variant.product.name}'. Requested: {reserved_quantities[e.variant_id]}, Available: {e.available}.")
+
         order_items_data = []
         total_amount = 0  # Sum of price
         final_amount = 0  # Sum of sale_price or price
@@ -140,7 +176,7 @@ class OrderService:
             # Determine price at purchase (use int)
             product = variant.product
             price = int(product.price)
-            sale_price = int(product.sale_price) if product.sale_price > 0 else price
+            sale_price = int(product.effective_price)
 
             total_amount += item.quantity * price
             final_amount += item.quantity * sale_price
@@ -209,14 +245,24 @@ class OrderService:
             # Option 2: Decrement stock *after* successful OrderItem creation
             for item_data in order_items_data:
                  variant = item_data['variant']
-                 # Use F() expression for atomic update to avoid race conditions
-                 ProductVariant.objects.filter(pk=variant.pk).update(stock=models.F('stock') - item_data['quantity'])
+                 # UPDATE có điều kiện: không đủ hàng (bán song song) thì không trừ và hủy cả đơn (rollback)
+                 if not ProductVariant.objects.filter(pk=variant.pk, stock__gte=item_data['quantity']).update(
+                     stock=models.F('stock') - item_data['quantity']
+                 ):
+                     raise ValueError(f"Insufficient stock for '{variant.product.name}'. Please review your cart.")
+                 # Giữ Product.total_stock khớp với tổng stock của các biến thể
+                 Product.objects.filter(pk=variant.product_id).update(total_stock=models.F('total_stock') - item_data['quantity'])
                  # Re-check stock after decrement (optional paranoia check)
                  # updated_variant = ProductVariant.objects.get(pk=variant.pk)
                  # if updated_variant.stock < 0:
                  #    logger.error(f"Stock went negative for Variant {variant.pk} during Order {order.order_code} creation!")
                  #    # This indicates a race condition or logic error, transaction should rollback.
                  #    raise ValidationError("Stock update resulted in negative quantity, order cancelled.")
+            # update() không phát signal, tự vô hiệu hóa cache chi tiết sản phẩm
+            ProductDetailCache.invalidate(item_data['variant'].product_id for item_data in order_items_data)
+            # Phần giữ hàng trở thành hàng đã bán khi đơn được lưu
+            sold_quantities = {item_data['variant'].pk: item_data['quantity'] for item_data in order_items_data}
+            transaction.on_commit(lambda: StockReservationService.consume(user.pk, sold_quantities))
 
 
         # 6. Add Initial History Entry
@@ -302,9 +348,8 @@ class OrderService:
         except ObjectDoesNotExist:
             raise ValueError(f"Order with ID {order_id} not found.")
 
-        try:
-            new_status = OrderStatus.objects.get(status_code__iexact=new_status_code)
-        except ObjectDoesNotExist:
+        new_status = order_statuses.get(status_code=new_status_code)
+        if new_status is None:
             raise ValueError(f"OrderStatus with code '{new_status_code}' not found.")
 
         if order.current_status == new_status:
@@ -355,7 +400,9 @@ class OrderService:
             raise ValueError(f"Order is already in the final status '{current_status_code}'.")
 
         next_status_code = status_sequence[next_status_index]
-        next_status = OrderStatus.objects.get(status_code=next_status_code)
+        next_status = order_statuses.get(status_code=next_status_code)
+        if next_status is None:
+            raise RuntimeError(f"System configuration error: OrderStatus '{next_status_code}' not found.")
 
         order.current_status = next_status
         order.save(update_fields=['current_status', 'updated_at'])
@@ -383,7 +430,9 @@ class OrderService:
         if order.current_status and order.current_status.status_code in ["DELIVERED", "CANCELLED"]:
             raise ValueError(f"Order cannot be cancelled in its current status '{order.current_status.status_code}'.")
 
-        cancelled_status = OrderStatus.objects.get(status_code="CANCELLED")
+        cancelled_status = order_statuses.get(status_code="CANCELLED")
+        if cancelled_status is None:
+            raise RuntimeError("System configuration error: OrderStatus 'CANCELLED' not found.")
         order.current_status = cancelled_status
         order.save(update_fields=['current_status', 'updated_at'])
 
@@ -0,0 +1,19 @@
+import logging
+
+from celery import shared_task
+
+from .reservations import StockReservationService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_stock_reservations():
+    """
+    Trả lại giữ hàng hết hạn và đối chiếu bộ đếm giữ hàng / tồn kho trong Redis với MySQL
+    (xem order/reservations.py).
+    """
+    released = StockReservationService.reconcile()
+    if released:
+        logger.info(f"Released {released} expired stock reservations.")
+    return released
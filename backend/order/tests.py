@@ -1,3 +1,129 @@
+import time
+from unittest import skipUnless
+
 from django.test import TestCase
+from django_redis import get_redis_connection
+
+from order.reservations import HOLDS_KEY, InsufficientStock, StockReservationService
+from product.models import Product, ProductVariant, Supplier
+
+
+def _redis_available() -> bool:
+    try:
+        return bool(get_redis_connection('default').ping())
+    except Exception:
+        return False
+
+
+@skipUnless(_redis_available(), "Redis is not available.")
+class StockReservationTests(TestCase):
+    BUYER, OTHER = 900001, 900002
+
+    @classmethod
+    def setUpTestData(cls):
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        product = Product.objects.create(name='Reserved Product', slug='reserved-product', supplier=supplier, price=100, is_published=True)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku='RESERVED-1', stock=5),
+            ProductVariant(product=product, sku='RESERVED-2', stock=2),
+        ])
+        cls.variant, cls.second = ProductVariant.objects.filter(product=product).order_by('pk')
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self._cleanup()
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        variant_ids = [self.variant.pk, self.second.pk]
+        self.redis.delete(
+            *[f'stock:level:{pk}' for pk in variant_ids], *[f'stock:held:{pk}' for pk in variant_ids],
+            f'stock:hold:{self.BUYER}', f'stock:hold:{self.OTHER}',
+        )
+        self.redis.zrem(HOLDS_KEY, *[f'{user}:{pk}' for user in (self.BUYER, self.OTHER) for pk in variant_ids])
+
+    def _held(self, variant) -> int:
+        return int(self.redis.get(f'stock:held:{variant.pk}') or 0)
+
+    def _level(self, variant) -> int:
+        return int(self.redis.get(f'stock:level:{variant.pk}'))
+
+    def _holds(self, user_id) -> dict:
+        return {int(pk): int(quantity) for pk, quantity in self.redis.hgetall(f'stock:hold:{user_id}').items()}
+
+    def test_holds_reduce_available_stock_for_others(self):
+        self.assertIsNotNone(StockReservationService.reserve(self.OTHER, {self.variant.pk: 4}))
+
+        with self.assertRaises(InsufficientStock) as context:
+            StockReservationService.reserve(self.BUYER, {self.variant.pk: 2})
+        self.assertEqual((context.exception.variant_id, context.exception.available), (self.variant.pk, 1))
+        # Thất bại không giữ gì
+        self.assertEqual(self._holds(self.BUYER), {})
+        self.assertEqual(self._held(self.variant), 4)
+
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 1})
+        self.assertEqual(self._held(self.variant), 5)
+        self.assertEqual(self._level(self.variant), 5)
+
+    def test_reserve_is_all_or_nothing_and_replaces_previous_holds(self):
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 2, self.second.pk: 1})
+
+        with self.assertRaises(InsufficientStock):
+            StockReservationService.reserve(self.BUYER, {self.variant.pk: 3, self.second.pk: 3})
+        self.assertEqual(self._holds(self.BUYER), {self.variant.pk: 2, self.second.pk: 1})
+
+        # Giữ lại cùng giỏ chỉ gia hạn; biến thể không còn trong giỏ được trả lại
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 3})
+        self.assertEqual(self._holds(self.BUYER), {self.variant.pk: 3})
+        self.assertEqual((self._held(self.variant), self._held(self.second)), (3, 0))
+        self.assertIsNone(self.redis.zscore(HOLDS_KEY, f'{self.BUYER}:{self.second.pk}'))
+
+    def test_consume_turns_holds_into_sold_stock(self):
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 2})
+        StockReservationService.reserve(self.OTHER, {self.variant.pk: 1})
+
+        StockReservationService.consume(self.BUYER, {self.variant.pk: 2})
+        self.assertEqual(self._holds(self.BUYER), {})
+        self.assertEqual(self._held(self.variant), 1)
+        self.assertEqual(self._level(self.variant), 3)
+        # Còn 3 - 1 (OTHER giữ) = 2
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 2})
+        with self.assertRaises(InsufficientStock):
+            StockReservationService.reserve(self.BUYER, {self.variant.pk: 3})
+
+    def test_release_returns_all_holds(self):
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 4, self.second.pk: 2})
+
+        StockReservationService.release(self.BUYER)
+        self.assertEqual(self._holds(self.BUYER), {})
+        self.assertEqual((self._held(self.variant), self._held(self.second)), (0, 0))
+        self.assertEqual(self.redis.zmscore(HOLDS_KEY, [f'{self.BUYER}:{self.variant.pk}', f'{self.BUYER}:{self.second.pk}']), [None, None])
+
+    def test_expired_holds_are_released(self):
+        StockReservationService.reserve(self.OTHER, {self.variant.pk: 5})
+        self.redis.zadd(HOLDS_KEY, {f'{self.OTHER}:{self.variant.pk}': time.time() - 1})
+
+        # Script đặt giữ trả lại phần giữ hết hạn trước khi tính tồn kho khả dụng
+        StockReservationService.reserve(self.BUYER, {self.variant.pk: 5})
+        self.assertEqual(self._holds(self.OTHER), {})
+        self.assertEqual(self._held(self.variant), 5)
+
+    def test_reconcile_releases_expired_holds_and_reloads_levels(self):
+        StockReservationService.reserve(self.OTHER, {self.variant.pk: 3})
+        self.redis.zadd(HOLDS_KEY, {f'{self.OTHER}:{self.variant.pk}': time.time() - 1})
+        # Tồn kho trong MySQL đổi mà Redis không biết; tổng hàng giữ bị lệch
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=1)
+        self.redis.set(f'stock:held:{self.second.pk}', 7)
+
+        self.assertGreaterEqual(StockReservationService.reconcile(), 1)
+        self.assertEqual(self._held(self.variant), 0)
+        self.assertEqual(self._held(self.second), 0)
+        self.assertEqual(self._level(self.variant), 1)
 
-# Create your tests here.
+    def test_unknown_variant(self):
+        with self.assertRaises(InsufficientStock) as context:
+            StockReservationService.reserve(self.BUYER, {0: 1})
+        self.assertEqual(context.exception.available, 0)
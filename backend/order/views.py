@@ -446,6 +446,7 @@ class OrderStatusDetailAPIView(APIView):
 from cart.services import CartService
 from marketing.models import Coupon
 from marketing.services import CouponService
+from order.reservations import InsufficientStock, StockReservationService
 
 class TemporaryOrderAPIView(APIView):
     """
@@ -455,7 +456,11 @@ class TemporaryOrderAPIView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Get Temporary Order Details",
-        operation_description="Calculates temporary order details based on cart items and optional coupon IDs. If no coupon IDs are provided, checks for a free shipping coupon.",
+        operation_description=(
+            "Calculates temporary order details based on cart items and optional coupon IDs. If no coupon IDs are provided, checks for a free shipping coupon. "
+            "Starting checkout also holds the stock of the selected items until 'reservation_expires_at' (null if holds are unavailable); "
+            "returns 400 if another checkout holds the remaining stock."
+        ),
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
@@ -494,13 +499,26 @@ class TemporaryOrderAPIView(APIView):
             if not cart_items:
                 return Response({"error": "No valid cart items found."}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Giữ hàng trong lúc checkout (thay các phần giữ trước đó của user)
+            quantities = {}
+            for item in cart_items:
+                if item.variant_id:
+                    quantities[item.variant_id] = quantities.get(item.variant_id, 0) + item.quantity
+            try:
+                reservation_expires_at = StockReservationService.reserve(request.user.pk, quantities)
+            except InsufficientStock as e:
+                variant = next(item.variant for item in cart_items if item.variant_id == e.variant_id)
+                return Response(
+                    {"error": f"Insufficient stock for '{variant.product.name}'. Requested: {quantities[e.variant_id]}, Available: {e.available}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
             # Calculate subtotal
             subtotal = 0
             final_amount = 0
             for item in cart_items:
-                price = item.variant.product.price if item.variant.product.sale_price == 0 else item.variant.product.sale_price
                 subtotal += item.quantity * item.variant.product.price
-                final_amount += item.quantity * price
+                final_amount += item.quantity * item.variant.product.effective_price
             promotion = final_amount - subtotal
             # Fetch and validate coupons
             selected_coupons = []
@@ -527,7 +545,9 @@ class TemporaryOrderAPIView(APIView):
             }
 
             serializer = OrderSerializer(response_data)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            data = serializer.data
+            data['reservation_expires_at'] = reservation_expires_at.isoformat() if reservation_expires_at else None
+            return Response(data, status=status.HTTP_200_OK)
 
         except Exception as e:
             logger.error(f"Error calculating temporary order for user {request.user.pk}: {e}", exc_info=True)
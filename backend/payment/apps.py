@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payment'
+
+    def ready(self):
+        # Đăng ký signal vô hiệu hóa cache bảng tra cứu PaymentStatus / PaymentMethod
+        from . import lookups  # noqa: F401
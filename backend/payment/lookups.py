@@ -0,0 +1,7 @@
+# payment/lookups.py
+"""Bảng tra cứu của app payment, cache trong bộ nhớ tiến trình (xem core/lookups.py)."""
+from core.lookups import LookupTable
+from payment.models import PaymentMethod, PaymentStatus
+
+payment_statuses = LookupTable(PaymentStatus, ['code', 'name'])
+payment_methods = LookupTable(PaymentMethod, ['code'])
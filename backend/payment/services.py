@@ -1,4 +1,5 @@
 from .models import Payment, PaymentStatus, PaymentMethod
+from .lookups import payment_methods, payment_statuses
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from payment.vnpay import vnpay
@@ -21,12 +22,20 @@ class PaymentService:
     def list_payment_methods():
         return PaymentMethod.objects.filter(is_active=True)
 
+    @staticmethod
+    def get_payment_status(code):
+        # Bảng tra cứu cache trong bộ nhớ (payment/lookups.py), không truy vấn mỗi lần cập nhật thanh toán
+        payment_status = payment_statuses.get(code=code)
+        if payment_status is None:
+            raise PaymentStatus.DoesNotExist(f"PaymentStatus with code '{code}' does not exist.")
+        return payment_status
+
     @staticmethod
     def get_payment_method_by_id(payment_method_id):
-        try:
-            return PaymentMethod.objects.get(id=payment_method_id, is_active=True)
-        except ObjectDoesNotExist:
+        payment_method = payment_methods.get_by_id(payment_method_id)
+        if payment_method is None or not payment_method.is_active:
             raise ValueError("Payment method not found")
+        return payment_method
 
     @staticmethod
     def list_payments(order_id):
@@ -36,7 +45,7 @@ class PaymentService:
     def paid_payment(payment_id):
         try:
             payment = Payment.objects.get(id=payment_id)
-            payment.status = PaymentStatus.objects.get(code='COMPLETED')
+            payment.status = PaymentService.get_payment_status('COMPLETED')
             payment.save()
             return payment
         except ObjectDoesNotExist:
@@ -71,7 +80,7 @@ class PaymentService:
         vnp.requestData['vnp_ReturnUrl'] = settings.VNPAY_RETURN_URL
         vnpay_payment_url = vnp.get_payment_url(settings.VNPAY_PAYMENT_URL, settings.VNPAY_HASH_SECRET_KEY)
         try:
-            payment_status = PaymentStatus.objects.get(code="PENDING")
+            payment_status = PaymentService.get_payment_status("PENDING")
             payment = Payment.objects.create(
                 order=order,
                 status=payment_status,
@@ -118,12 +127,12 @@ class PaymentService:
             raise ValueError("Payment not found for the given order ID")
 
         if response_code == "00":  # Successful transaction
-            payment.status = PaymentStatus.objects.get(code="COMPLETED")
+            payment.status = PaymentService.get_payment_status("COMPLETED")
             payment.transaction_id = transaction_no
             payment.paid_at = now()
             payment.gateway_response = error_codes.get(response_code, "Unknown response code")
         else:  # Failed transaction
-            payment.status = PaymentStatus.objects.get(code="FAILED")
+            payment.status = PaymentService.get_payment_status("FAILED")
             payment.paid_at = None
             payment.gateway_response = error_codes.get(response_code, "Unknown response code")
 
@@ -133,8 +142,10 @@ class PaymentService:
     @staticmethod
     def create_payment(order, status, method, transaction_id, gateway_response, amount, paid_at):
         try:
-            payment_status = PaymentStatus.objects.get(code=status)
-            payment_method = PaymentMethod.objects.get(code=method, is_active=True)
+            payment_status = PaymentService.get_payment_status(status)
+            payment_method = payment_methods.get(code=method)
+            if payment_method is None or not payment_method.is_active:
+                raise PaymentMethod.DoesNotExist(f"PaymentMethod with code '{method}' does not exist.")
             payment = Payment.objects.create(
                 order_id=order,
                 status=payment_status,
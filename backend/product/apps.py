@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+
+    def ready(self):
+        # Đăng ký signal giữ chỉ mục tìm kiếm đồng bộ
+        from . import signals  # noqa: F401
+        # Đăng ký signal vô hiệu hóa cache bảng tra cứu Size / Color
+        from . import lookups  # noqa: F401
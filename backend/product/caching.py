@@ -0,0 +1,109 @@
+# product/caching.py
+"""
+Cache chi tiết sản phẩm theo slug (ProductDetailBySlugAPIView, ProductVariantsBySlugAPIView,
+ProductVariantMatrixBySlugAPIView).
+
+Mỗi sản phẩm có một số phiên bản riêng trong Redis; mọi thay đổi của sản phẩm, biến thể,
+tồn kho... chỉ cần tăng phiên bản (ProductDetailCache.invalidate). Slug được ánh xạ
+sang Product ID và được kiểm tra lại với slug lưu trong entry, nên đổi slug không trả nhầm dữ liệu.
+"""
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+from django.core.cache import cache
+
+from core.caching import bump_version_on_commit, get_or_build, get_version
+from product.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductDetailCache:
+    CACHE_TIMEOUT = 600
+    SLUG_TIMEOUT = 3600
+
+    @staticmethod
+    def version_key(product_id: int) -> str:
+        return f'product:{product_id}:version'
+
+    @staticmethod
+    def _slug_key(slug: str) -> str:
+        return f'product:slug:{slug}'
+
+    @staticmethod
+    def _data_key(product_id: int, kind: str, request) -> str:
+        # URL ảnh là tuyệt đối nên payload phụ thuộc scheme + host của request
+        origin = f'{request.scheme}://{request.get_host()}' if request is not None else ''
+        version = get_version(ProductDetailCache.version_key(product_id))
+        return f'product:{product_id}:{version}:{kind}:{origin}'
+
+    @staticmethod
+    def _get(slug: str, kind: str, request, serialize: Callable[[Product, Any], Any]) -> Optional[Any]:
+        def build(product_id: int, product: Optional[Product] = None):
+            if product is None:
+                product = Product.objects.select_related('supplier').filter(pk=product_id).first()
+            if product is None:
+                return None
+            return {'slug': product.slug, 'data': serialize(product, request)}
+
+        product_id = cache.get(ProductDetailCache._slug_key(slug))
+        if product_id is not None:
+            entry = get_or_build(
+                ProductDetailCache._data_key(product_id, kind, request),
+                lambda: build(product_id),
+                timeout=ProductDetailCache.CACHE_TIMEOUT,
+            )
+            if entry is not None and entry['slug'] == slug:
+                return entry['data']
+
+        # Chưa có ánh xạ slug hoặc slug đã đổi: tra cứu từ database
+        product = Product.objects.select_related('supplier').filter(slug=slug).first()
+        if product is None:
+            cache.delete(ProductDetailCache._slug_key(slug))
+            return None
+        cache.set(ProductDetailCache._slug_key(slug), product.pk, timeout=ProductDetailCache.SLUG_TIMEOUT)
+        entry = get_or_build(
+            ProductDetailCache._data_key(product.pk, kind, request),
+            lambda: build(product.pk, product),
+            timeout=ProductDetailCache.CACHE_TIMEOUT,
+        )
+        return entry['data'] if entry is not None else None
+
+    @staticmethod
+    def get_detail(slug: str, request=None) -> Optional[dict]:
+        """Dữ liệu ProductSerializer của sản phẩm, None nếu không tồn tại."""
+        # Import tại chỗ: product.serializers import product.services, services lại dùng module này
+        from product.serializers import ProductSerializer
+
+        def serialize(product, request):
+            return ProductSerializer(product, context={'request': request}).data
+
+        return ProductDetailCache._get(slug, 'detail', request, serialize)
+
+    @staticmethod
+    def get_variants(slug: str, request=None) -> Optional[list]:
+        """Dữ liệu ProductVariantSerializer(many=True) của sản phẩm, None nếu không tồn tại."""
+        from product.serializers import ProductVariantSerializer
+
+        def serialize(product, request):
+            variants = product.variants.select_related('size', 'color').all()
+            return ProductVariantSerializer(variants, many=True, context={'request': request}).data
+
+        return ProductDetailCache._get(slug, 'variants', request, serialize)
+
+    @staticmethod
+    def get_variant_matrix(slug: str, request=None) -> Optional[dict]:
+        """Dữ liệu VariantMatrixSerializer của sản phẩm, None nếu không tồn tại."""
+        from product.serializers import VariantMatrixSerializer
+
+        def serialize(product, request):
+            return VariantMatrixSerializer(product, context={'request': request}).data
+
+        return ProductDetailCache._get(slug, 'matrix', request, serialize)
+
+    @staticmethod
+    def invalidate(product_ids: Iterable[int]) -> None:
+        """Vô hiệu hóa cache chi tiết của các sản phẩm sau khi transaction commit."""
+        for product_id in set(product_ids):
+            if product_id is not None:
+                bump_version_on_commit(ProductDetailCache.version_key(product_id))
@@ -7,4 +7,24 @@ class SupplierStatus(Enum):
 
     @classmethod
     def choices(cls):
-        return [(status.value, status.name) for status in cls]
\ No newline at end of file
+        return [(status.value, status.name) for status in cls]
+
+
+class DeletionJobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    @classmethod
+    def choices(cls):
+        return [(status.value, status.name) for status in cls]
+
+
+class DeletionJobKind(Enum):
+    PRODUCT = "product"
+    SUPPLIER = "supplier"
+
+    @classmethod
+    def choices(cls):
+        return [(kind.value, kind.name) for kind in cls]
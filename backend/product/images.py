@@ -0,0 +1,188 @@
+# product/images.py
+"""
+Sinh ảnh responsive cho Product / ProductVariant.
+
+Ảnh upload được lưu nguyên bản; task Celery (product.tasks.generate_image_renditions)
+tạo các bản resize WebP + JPEG (đã bỏ metadata EXIF) và ghi vào trường image_renditions:
+
+    {
+        "source": "products/ao.png",            # image_url.name tại thời điểm sinh
+        "renditions": {
+            "card": {"width": 400, "height": 533, "webp": "blobs/...", "jpeg": "blobs/..."},
+            ...
+        }
+    }
+
+Serializer dùng ProductImageService.build_image_set(); khi renditions chưa sẵn sàng
+(hoặc đã cũ so với image_url) sẽ trả về ảnh gốc.
+"""
+import logging
+import os
+from io import BytesIO
+from typing import Dict, Optional
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from product.storage import product_media_storage
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions'
+
+# Tên rendition -> cạnh dài tối đa (px)
+RENDITION_SIZES = {
+    'thumbnail': 160,
+    'card': 480,
+    'detail': 960,
+    'zoom': 1600,
+}
+
+# Định dạng -> (định dạng PIL, phần mở rộng, tham số lưu)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+class ProductImageService:
+
+    @staticmethod
+    def is_ready(renditions: Optional[dict], image_name: Optional[str]) -> bool:
+        """Renditions đã được sinh cho đúng file ảnh hiện tại chưa."""
+        return bool(image_name and renditions and renditions.get('source') == image_name and renditions.get('renditions'))
+
+    @staticmethod
+    def generate_renditions(image_name: str) -> dict:
+        """
+        Đọc ảnh gốc từ storage, sinh các bản resize và lưu vào storage (product/storage.py).
+        Không phóng to ảnh nhỏ hơn kích thước rendition. Raise ValueError nếu không đọc được ảnh.
+        """
+        try:
+            with product_media_storage.open(image_name, 'rb') as file:
+                image = Image.open(file)
+                image.load()
+        except Exception as e:
+            raise ValueError(f"Cannot read image '{image_name}': {e}")
+
+        # Áp dụng hướng xoay EXIF trước khi bỏ metadata
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        stem = os.path.splitext(image_name)[0]
+        renditions = {}
+        previous = None
+        for name, max_edge in RENDITION_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            if previous is not None and (previous['width'], previous['height']) == resized.size:
+                # Ảnh gốc nhỏ hơn rendition: dùng lại file của rendition trước
+                renditions[name] = dict(previous)
+                continue
+            entry = {'width': resized.width, 'height': resized.height}
+            for key, (pil_format, extension, options) in RENDITION_FORMATS.items():
+                output = resized
+                if pil_format == 'JPEG' and output.mode != 'RGB':
+                    # JPEG không có kênh alpha: ghép lên nền trắng
+                    background = Image.new('RGB', output.size, (255, 255, 255))
+                    background.paste(output, mask=output.getchannel('A'))
+                    output = background
+                buffer = BytesIO()
+                # Không truyền exif/icc_profile -> metadata bị loại bỏ
+                output.save(buffer, format=pil_format, **options)
+                # Storage đặt tên theo hash nội dung (blobs/...), tên ở đây chỉ để lấy phần mở rộng
+                entry[key] = product_media_storage.save(
+                    f"{RENDITIONS_DIR}/{stem}-{name}.{extension}", ContentFile(buffer.getvalue())
+                )
+            renditions[name] = previous = entry
+
+        return {'source': image_name, 'renditions': renditions}
+
+    @staticmethod
+    def rendition_paths(renditions: Optional[dict]) -> set:
+        """Các file (khác nhau) của renditions; rendition dùng chung file (ảnh gốc nhỏ) chỉ tính một lần."""
+        paths = {
+            entry.get(key)
+            for entry in (renditions or {}).get('renditions', {}).values()
+            for key in RENDITION_FORMATS
+        }
+        return paths - {None, ''}
+
+    @staticmethod
+    def delete_renditions(renditions: Optional[dict]) -> None:
+        """Bỏ tham chiếu tới các file rendition trong storage, bỏ qua lỗi."""
+        for path in ProductImageService.rendition_paths(renditions):
+            try:
+                product_media_storage.delete(path)
+            except Exception as e:
+                logger.warning(f"Error deleting image rendition '{path}': {e}")
+
+    @staticmethod
+    def schedule_renditions(instance) -> None:
+        """Gửi task sinh renditions sau khi transaction commit nếu ảnh hiện tại chưa có renditions."""
+        image_name = instance.image_url.name if instance.image_url else None
+        if not image_name or ProductImageService.is_ready(instance.image_renditions, image_name):
+            return
+        # Import tại chỗ: product.tasks import product.caching -> product.models
+        from product.tasks import generate_image_renditions
+
+        model_label = instance._meta.label
+        pk = instance.pk
+
+        def _enqueue():
+            try:
+                generate_image_renditions.delay(model_label, pk, image_name)
+            except Exception as e:
+                # Broker không khả dụng: serializer vẫn trả ảnh gốc, có thể chạy lại bằng generate_image_renditions command
+                logger.error(f"Error enqueueing image renditions for {model_label} {pk}: {e}", exc_info=True)
+
+        transaction.on_commit(_enqueue)
+
+    @staticmethod
+    def build_image_set(image_field, renditions: Optional[dict], request=None) -> Optional[Dict]:
+        """
+        Dữ liệu ảnh cho serializer:
+            {
+                "original": url ảnh gốc,
+                "ready": renditions đã sẵn sàng hay chưa,
+                "src": {"thumbnail": url, "card": url, ...},   # JPEG, hoặc ảnh gốc nếu chưa sẵn sàng
+                "srcset": {"webp": "url 160w, url 480w, ...", "jpeg": "..."},  # rỗng nếu chưa sẵn sàng
+            }
+        Trả về None nếu không có ảnh.
+        """
+        if not image_field:
+            return None
+
+        def absolute(url: str) -> str:
+            return request.build_absolute_uri(url) if request is not None else url
+
+        original = absolute(image_field.url)
+        if not ProductImageService.is_ready(renditions, image_field.name):
+            return {
+                'original': original,
+                'ready': False,
+                'src': {name: original for name in RENDITION_SIZES},
+                'srcset': {},
+            }
+
+        entries = renditions['renditions']
+        src = {}
+        srcset = {key: [] for key in RENDITION_FORMATS}
+        for name in RENDITION_SIZES:
+            entry = entries.get(name)
+            if not entry:
+                src[name] = original
+                continue
+            src[name] = absolute(product_media_storage.url(entry['jpeg']))
+            for key in RENDITION_FORMATS:
+                srcset[key].append(f"{absolute(product_media_storage.url(entry[key]))} {entry['width']}w")
+
+        return {
+            'original': original,
+            'ready': True,
+            'src': src,
+            # Các rendition dùng chung file khi ảnh gốc nhỏ -> bỏ trùng
+            'srcset': {key: ', '.join(dict.fromkeys(items)) for key, items in srcset.items()},
+        }
@@ -0,0 +1,531 @@
+# product/importer.py
+"""
+Nhập catalog hàng loạt từ file CSV / XLSX (ví dụ viberstore_product_data.xlsx).
+
+Hai dạng bảng (xem iter_rows):
+- bảng phẳng: mỗi dòng là một biến thể, các dòng cùng product_name thuộc cùng một sản phẩm;
+- bảng như viberstore_product_data.xlsx: tiêu đề không nằm ở dòng 1, dòng mục danh mục xen giữa các khối
+  sản phẩm, mỗi màu là một cột; mỗi dòng sản phẩm được tách thành các biến thể (size x màu).
+Thông tin sản phẩm lấy từ dòng đầu tiên; dòng không có supplier dùng nhà cung cấp mặc định.
+File được đọc dạng stream theo từng lô (chunk). Với mỗi lô:
+- supplier / category / size / color được tra trong map nạp sẵn (mỗi loại một truy vấn),
+- product, variant và ProductCategory được tạo bằng bulk_create,
+- lỗi của từng dòng được ghi lại, không dừng cả quá trình.
+Nhập lại cùng file là an toàn: sản phẩm đã có (theo tên) và biến thể đã có (product, size, color) được bỏ qua,
+nên có thể tiếp tục sau khi bị gián đoạn (kết hợp checkpoint để bỏ qua các lô đã xong).
+"""
+import csv
+import logging
+import ntpath
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from product.models import Category, Color, Product, ProductCategory, ProductVariant, Size, Supplier
+from product.lookups import colors as color_lookup, sizes as size_lookup
+from product.search import ProductSearchIndex, fold_diacritics
+from product.services import allocate_unique_slugs, generate_sku, refresh_product_total_stock
+
+logger = logging.getLogger(__name__)
+
+# Tên cột chuẩn -> các tên cột được chấp nhận (đã bỏ dấu, chữ thường, khoảng trắng thành '_')
+COLUMN_ALIASES = {
+    'product_name': ('product_name', 'name', 'ten_san_pham'),
+    'description': ('description', 'mo_ta'),
+    'supplier': ('supplier', 'nha_cung_cap'),
+    'category': ('category', 'danh_muc'),
+    'price': ('price', 'selling_price', 'gia', 'gia_ban'),
+    'sale_price': ('sale_price', 'gia_khuyen_mai'),
+    'cost_price': ('cost_price', 'original_price', 'gia_von', 'gia_goc'),
+    'is_published': ('is_published', 'published'),
+    'image_url': ('image_url', 'image', 'hinh_anh'),
+    'size': ('size', 'sizes', 'kich_thuoc'),
+    'color': ('color', 'mau', 'mau_sac'),
+    'color_hex': ('color_hex', 'hex_code', 'ma_mau'),
+    'sku': ('sku',),
+    'stock': ('stock', 'ton_kho', 'so_luong'),
+    'weight_grams': ('weight_grams', 'weight', 'khoi_luong'),
+    'row_index': ('stt', 'no'),
+}
+# Tên nhóm trong dòng mục (đã chuẩn hóa như tiêu đề) -> category cấp 1
+CATEGORY_GROUP_ALIASES = {
+    'do_nam': 'MEN', "men's_clothing": 'MEN', 'men': 'MEN',
+    'do_nu': 'WOMEN', "women's_clothing": 'WOMEN', 'women': 'WOMEN',
+    'do_tre_em': 'KID', "kids'_clothing": 'KID', "kid's_clothing": 'KID', 'kids': 'KID', 'kid': 'KID',
+}
+HEADER_SEARCH_ROWS = 10
+SIZE_SEPARATOR = re.compile(r'\s*[-,/]\s*')
+NUMBER_PATTERN = re.compile(r'^\d+(\.\d+)?$')
+PRODUCT_IMAGE_DIR = 'products'
+CATEGORY_PATH_SEPARATOR = '>'
+DEFAULT_COLOR_HEX = '#000000'
+HEX_PATTERN = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    products_created: int = 0
+    variants_created: int = 0
+    variants_skipped: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+@dataclass
+class ParsedRow:
+    row_number: int
+    product_name: str
+    product_fields: Dict[str, Any]
+    supplier_id: int
+    category_ids: List[int]
+    size_name: Optional[str]
+    color_name: Optional[str]
+    color_hex: Optional[str]
+    sku: Optional[str]
+    stock: int
+    weight_grams: Decimal
+
+
+# --- Đọc file dạng stream ---
+def _normalize_header(value: Any) -> str:
+    return re.sub(r'\s+', '_', fold_diacritics(str(value or '')).strip())
+
+
+def _map_header(header: List[Any]) -> Dict[str, int]:
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    positions = {}
+    for position, value in enumerate(header):
+        column = lookup.get(_normalize_header(value))
+        if column and column not in positions:
+            positions[column] = position
+    if 'product_name' not in positions:
+        raise ValueError("Missing required column 'product_name'.")
+    return positions
+
+
+def _read_values(path: str, sheet: Optional[str] = None) -> Iterator[Tuple[int, List[Any]]]:
+    """Sinh (số dòng trong file, danh sách giá trị) cho mọi dòng, kể cả dòng tiêu đề."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook  # Chỉ cần khi nhập file Excel
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.active
+            yield from enumerate((list(values) for values in worksheet.iter_rows(values_only=True)), start=1)
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            yield from enumerate(csv.reader(file), start=1)
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _split_sizes(value: Any) -> List[Optional[str]]:
+    sizes = [size.strip() for size in SIZE_SEPARATOR.split(str(value))] if not _is_blank(value) else []
+    return [size for size in sizes if size] or [None]
+
+
+def _image_name(value: Any) -> Optional[str]:
+    # Đường dẫn trên máy người soạn file ('\\Pictures\\OOP\\1.jpg'): chỉ giữ tên file trong thư mục ảnh sản phẩm
+    text = str(value).strip() if not _is_blank(value) else None
+    if text and '\\' in text:
+        return f'{PRODUCT_IMAGE_DIR}/{ntpath.basename(text)}'
+    return text
+
+
+def _iter_sectioned_rows(
+    rows: Iterator[Tuple[int, List[Any]]], positions: Dict[str, int], color_columns: Dict[str, int]
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Bảng dạng viberstore_product_data.xlsx: mỗi dòng một sản phẩm, giữa các khối sản phẩm là dòng mục
+    (chỉ có cột stt / tên). Dòng mục có stt là chữ ('Đồ nam', 'Men's clothing') mở nhóm cấp 1,
+    dòng mục có stt là số ('T-shirt') là danh mục con; danh mục của sản phẩm là 'nhóm > danh mục con'.
+    Mỗi ô màu khác trống cùng với mỗi size trong cột size ('XS - S - M') tạo một dòng biến thể.
+    """
+    group = subcategory = None
+    for row_number, values in rows:
+        cell = {column: values[pos] if pos < len(values) else None for column, pos in positions.items()}
+        colors = [color for color, pos in color_columns.items() if pos < len(values) and not _is_blank(values[pos])]
+        details = [value for column, value in cell.items() if column not in ('row_index', 'product_name')]
+        if _is_blank(cell['product_name']):
+            continue  # Dòng trống
+        if not colors and all(_is_blank(value) for value in details):
+            # Dòng mục
+            index = cell.get('row_index')
+            # CSV đọc mọi ô thành chuỗi: stt '1' / '2.0' vẫn là số
+            if isinstance(index, str) and not _is_blank(index) and not NUMBER_PATTERN.match(index.strip()):
+                group = CATEGORY_GROUP_ALIASES.get(_normalize_header(index), index.strip())
+                subcategory = None
+            else:
+                subcategory = str(cell['product_name']).strip()
+            continue
+
+        category = cell.get('category') or f' {CATEGORY_PATH_SEPARATOR} '.join(
+            name for name in (group, subcategory) if name
+        )
+        cell['image_url'] = _image_name(cell.get('image_url'))
+        for size in _split_sizes(cell.get('size')):
+            for color in colors or [None]:
+                yield row_number, {**cell, 'category': category or None, 'size': size, 'color': color}
+
+
+def iter_rows(path: str, sheet: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Sinh (số dòng trong file, dict theo tên cột chuẩn). Dòng tiêu đề là dòng đầu tiên trong
+    HEADER_SEARCH_ROWS dòng đầu có cột product_name.
+    - Bảng phẳng (có cột color hoặc không có cột màu): mỗi dòng một biến thể.
+    - Bảng có cột màu (tên màu làm tiêu đề, nằm sau các cột đã biết): xem _iter_sectioned_rows;
+      các biến thể của cùng một dòng có cùng số dòng.
+    """
+    rows = _read_values(path, sheet)
+    positions = None
+    for row_number, header in rows:
+        try:
+            positions = _map_header(header)
+            break
+        except ValueError:
+            if row_number >= HEADER_SEARCH_ROWS:
+                raise
+    if positions is None:
+        raise ValueError("Missing required column 'product_name'.")
+
+    last_known = max(positions.values())
+    color_columns = {} if 'color' in positions else {
+        str(value).strip(): position for position, value in enumerate(header)
+        if position > last_known and not _is_blank(value)
+    }
+    if color_columns:
+        yield from _iter_sectioned_rows(rows, positions, color_columns)
+        return
+    for row_number, values in rows:
+        yield row_number, {column: values[pos] if pos < len(values) else None for column, pos in positions.items()}
+
+
+# --- Chuyển đổi giá trị ---
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _integer(value: Any, name: str, default: int = 0) -> int:
+    """Chấp nhận số hoặc chuỗi giá dạng '12.990.000đ'."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = ''.join(filter(str.isdigit, str(value)))
+    if not digits:
+        raise RowError(f"Invalid {name} value '{value}'.")
+    return int(digits)
+
+
+def _decimal(value: Any, name: str) -> Decimal:
+    if value is None or value == '':
+        return Decimal('0')
+    try:
+        return Decimal(str(value).replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(f"Invalid {name} value '{value}'.")
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return _normalize_header(value) in ('1', 'true', 'yes', 'y', 'x', 'co')
+
+
+class CatalogImporter:
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        batch_size: int = 1000,
+        supplier: Optional[str] = None,
+        default_stock: int = 0,
+        price_unit: int = 1,
+        publish: bool = False,
+    ):
+        """
+        supplier: nhà cung cấp (tên hoặc slug) cho các dòng không có cột supplier; mặc định nhà cung cấp có ID nhỏ nhất.
+        default_stock: tồn kho của biến thể khi file không có cột stock.
+        price_unit: hệ số nhân giá trong file (ví dụ 1000 khi giá tính theo nghìn đồng).
+        publish: đăng bán sản phẩm mới khi file không có cột is_published.
+        """
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.default_stock = default_stock
+        self.price_unit = price_unit
+        self.publish = publish
+        self.stats = ImportStats()
+        self._load_lookups()
+        self.default_supplier = self._resolve_default_supplier(supplier)
+
+    # --- Map nạp sẵn, mỗi loại một truy vấn ---
+    def _load_lookups(self) -> None:
+        self.suppliers: Dict[str, int] = {}
+        for pk, company_name, slug in Supplier.objects.values_list('pk', 'company_name', 'slug'):
+            self.suppliers[company_name.strip().lower()] = pk
+            if slug:
+                self.suppliers.setdefault(slug.lower(), pk)
+
+        self.categories: Dict[int, Tuple[str, Optional[int]]] = {
+            pk: (name, parent_id) for pk, name, parent_id in Category.objects.values_list('pk', 'name', 'parent_id')
+        }
+        self.categories_by_name: Dict[str, List[int]] = {}
+        for pk, (name, _) in self.categories.items():
+            self.categories_by_name.setdefault(name.strip().lower(), []).append(pk)
+
+        self._load_attributes()
+
+    def _resolve_default_supplier(self, supplier: Optional[str]) -> Optional[Tuple[int, str]]:
+        """(ID, tên) của nhà cung cấp mặc định; None nếu chưa có nhà cung cấp nào."""
+        if supplier:
+            supplier_id = self.suppliers.get(supplier.strip().lower())
+            if supplier_id is None:
+                raise ValueError(f"Supplier '{supplier}' not found.")
+            return supplier_id, Supplier.objects.values_list('company_name', flat=True).get(pk=supplier_id)
+        return Supplier.objects.order_by('pk').values_list('pk', 'company_name').first()
+
+    def _load_attributes(self) -> None:
+        self.sizes: Dict[str, int] = {name.strip().lower(): pk for pk, name in Size.objects.values_list('pk', 'name')}
+        self.colors: Dict[str, int] = {name.strip().lower(): pk for pk, name in Color.objects.values_list('pk', 'name')}
+
+    def _category_chain(self, category_id: int) -> List[int]:
+        chain, seen = [], set()
+        while category_id is not None and category_id in self.categories and category_id not in seen:
+            seen.add(category_id)
+            chain.append(category_id)
+            category_id = self.categories[category_id][1]
+        return chain
+
+    def _resolve_category(self, value: str) -> List[int]:
+        """'Nam > Áo > Áo thun' hoặc tên category duy nhất -> category và các category cha."""
+        names = [part.strip().lower() for part in value.split(CATEGORY_PATH_SEPARATOR) if part.strip()]
+        candidates = [
+            pk for pk in self.categories_by_name.get(names[-1], [])
+            if [self.categories[c][0].strip().lower() for c in reversed(self._category_chain(pk))][-len(names):] == names
+        ]
+        if not candidates:
+            raise RowError(f"Category '{value}' not found.")
+        if len(candidates) > 1:
+            raise RowError(f"Category '{value}' is ambiguous; use the full path, e.g. 'Parent > Child'.")
+        return self._category_chain(candidates[0])
+
+    def _parse_row(self, row_number: int, values: Dict[str, Any]) -> ParsedRow:
+        product_name = _text(values.get('product_name'))
+        if not product_name:
+            raise RowError("Missing product_name.")
+
+        supplier_name = _text(values.get('supplier'))
+        if supplier_name:
+            supplier_id = self.suppliers.get(supplier_name.lower())
+            if supplier_id is None:
+                raise RowError(f"Supplier '{supplier_name}' not found.")
+        elif self.default_supplier:
+            supplier_id = self.default_supplier[0]
+        else:
+            raise RowError("Missing supplier.")
+
+        category = _text(values.get('category'))
+        category_ids = self._resolve_category(category) if category else []
+
+        color_hex = _text(values.get('color_hex'))
+        if color_hex and not HEX_PATTERN.match(color_hex):
+            raise RowError(f"Invalid color_hex '{color_hex}'. Must be in the format '#RRGGBB'.")
+
+        stock = _integer(values.get('stock'), 'stock', default=self.default_stock)
+        published = values.get('is_published')
+        return ParsedRow(
+            row_number=row_number,
+            product_name=product_name,
+            product_fields={
+                'description': _text(values.get('description')),
+                'price': _integer(values.get('price'), 'price') * self.price_unit,
+                'sale_price': _integer(values.get('sale_price'), 'sale_price') * self.price_unit,
+                'cost_price': _integer(values.get('cost_price'), 'cost_price') * self.price_unit,
+                'is_published': self.publish if _is_blank(published) else _boolean(published),
+                'image_url': _text(values.get('image_url')),
+            },
+            supplier_id=supplier_id,
+            category_ids=category_ids,
+            size_name=_text(values.get('size')),
+            color_name=_text(values.get('color')),
+            color_hex=color_hex,
+            sku=_text(values.get('sku')),
+            stock=stock,
+            weight_grams=_decimal(values.get('weight_grams'), 'weight_grams'),
+        )
+
+    # --- Ghi theo lô ---
+    def _ensure_attributes(self, rows: List[ParsedRow]) -> None:
+        """Tạo các size / color chưa có bằng bulk_create, rồi nạp lại ID."""
+        new_sizes = {row.size_name.lower(): row.size_name for row in rows if row.size_name and row.size_name.lower() not in self.sizes}
+        if new_sizes:
+            Size.objects.bulk_create([Size(name=name) for name in new_sizes.values()], batch_size=self.batch_size)
+            # bulk_create không phát signal: vô hiệu hóa bảng tra cứu Size (product/lookups.py)
+            size_lookup.invalidate()
+            self.sizes.update(
+                (name.strip().lower(), pk) for pk, name in Size.objects.filter(name__in=new_sizes.values()).values_list('pk', 'name')
+            )
+
+        new_colors = {}
+        for row in rows:
+            if row.color_name and row.color_name.lower() not in self.colors:
+                new_colors.setdefault(row.color_name.lower(), (row.color_name, row.color_hex or DEFAULT_COLOR_HEX))
+        if new_colors:
+            Color.objects.bulk_create(
+                [Color(name=name, hex_code=hex_code) for name, hex_code in new_colors.values()], batch_size=self.batch_size
+            )
+            color_lookup.invalidate()
+            self.colors.update(
+                (name.strip().lower(), pk)
+                for pk, name in Color.objects.filter(name__in=[name for name, _ in new_colors.values()]).values_list('pk', 'name')
+            )
+
+    def _write_chunk(self, rows: List[ParsedRow]) -> List[int]:
+        """Ghi một lô trong một transaction, trả về ID các sản phẩm bị ảnh hưởng."""
+        groups: Dict[str, List[ParsedRow]] = OrderedDict()
+        for row in rows:
+            groups.setdefault(row.product_name, []).append(row)
+
+        with transaction.atomic():
+            self._ensure_attributes(rows)
+
+            product_ids = dict(Product.objects.filter(name__in=groups.keys()).values_list('name', 'pk'))
+            new_names = [name for name in groups if name not in product_ids]
+            if new_names:
+                now = timezone.now()
+                slugs = allocate_unique_slugs(Product, new_names)
+                Product.objects.bulk_create([
+                    Product(
+                        name=name,
+                        slug=slug,
+                        supplier_id=groups[name][0].supplier_id,
+                        updated_at=now,
+                        **groups[name][0].product_fields,
+                    )
+                    for name, slug in zip(new_names, slugs)
+                ], batch_size=self.batch_size)
+                # MySQL không trả về PK sau bulk_create, nạp lại theo tên
+                product_ids.update(Product.objects.filter(name__in=new_names).values_list('name', 'pk'))
+
+            existing_variants = set(
+                ProductVariant.objects.filter(product_id__in=product_ids.values()).values_list('product_id', 'size_id', 'color_id')
+            )
+            variants = []
+            skipped = 0
+            for name, group in groups.items():
+                for row in group:
+                    size_id = self.sizes.get(row.size_name.lower()) if row.size_name else None
+                    color_id = self.colors.get(row.color_name.lower()) if row.color_name else None
+                    key = (product_ids[name], size_id, color_id)
+                    if key in existing_variants:
+                        skipped += 1
+                        continue
+                    existing_variants.add(key)
+                    variants.append(ProductVariant(
+                        product_id=product_ids[name],
+                        size_id=size_id,
+                        color_id=color_id,
+                        sku=row.sku or generate_sku(name, row.size_name, row.color_name),
+                        stock=row.stock,
+                        weight_grams=row.weight_grams,
+                    ))
+            ProductVariant.objects.bulk_create(variants, batch_size=self.batch_size)
+
+            existing_links = set(
+                ProductCategory.objects.filter(product_id__in=product_ids.values()).values_list('product_id', 'category_id')
+            )
+            links = {
+                (product_ids[name], category_id)
+                for name, group in groups.items()
+                for row in group
+                for category_id in row.category_ids
+            } - existing_links
+            ProductCategory.objects.bulk_create(
+                [ProductCategory(product_id=product_id, category_id=category_id) for product_id, category_id in links],
+                batch_size=self.batch_size,
+            )
+
+            affected_ids = [product_ids[name] for name in groups]
+            # bulk_create không phát signal: cập nhật total_stock (kèm vô hiệu hóa cache) thủ công
+            refresh_product_total_stock(affected_ids)
+
+        self.stats.products_created += len(new_names)
+        self.stats.variants_created += len(variants)
+        self.stats.variants_skipped += skipped
+        return affected_ids
+
+    def _flush(self, rows: List[ParsedRow]) -> None:
+        if not rows:
+            return
+        try:
+            affected_ids = self._write_chunk(rows)
+        except DatabaseError as e:
+            # Size / color vừa tạo trong lô đã bị rollback
+            self._load_attributes()
+            # Lỗi cả lô (ví dụ trùng tên sản phẩm): ghi lại từng sản phẩm để khoanh vùng dòng lỗi
+            groups: Dict[str, List[ParsedRow]] = OrderedDict()
+            for row in rows:
+                groups.setdefault(row.product_name, []).append(row)
+            if len(groups) == 1:
+                for row in rows:
+                    self.stats.errors.append((row.row_number, f"Database error: {e}"))
+                return
+            logger.warning(f"Chunk of {len(rows)} rows failed ({e}); retrying product by product.")
+            for group in groups.values():
+                self._flush(group)
+            return
+
+        try:
+            ProductSearchIndex.index_products(affected_ids)
+        except Exception as e:
+            logger.error(f"Error indexing imported products for search: {e}", exc_info=True)
+
+    def run(self, path: str, sheet: Optional[str] = None, start_row: int = 0, on_chunk=None) -> ImportStats:
+        """
+        Nhập file. start_row: bỏ qua các dòng có số <= start_row (tiếp tục từ checkpoint).
+        on_chunk(last_row_number, stats) được gọi sau mỗi lô đã commit.
+        """
+        chunk: List[ParsedRow] = []
+        last_row_number = reported_row_number = start_row
+        for row_number, values in iter_rows(path, sheet):
+            if row_number <= start_row:
+                continue
+            # Chỉ ngắt lô giữa hai dòng của file: các biến thể của cùng một dòng (bảng có cột màu)
+            # nằm chung một lô để checkpoint theo số dòng không bỏ sót biến thể
+            if len(chunk) >= self.chunk_size and row_number != last_row_number:
+                self._flush(chunk)
+                chunk = []
+                reported_row_number = last_row_number
+                if on_chunk:
+                    on_chunk(last_row_number, self.stats)
+            last_row_number = row_number
+            if not any(value not in (None, '') for value in values.values()):
+                continue  # Dòng trống
+            self.stats.rows += 1
+            try:
+                chunk.append(self._parse_row(row_number, values))
+            except RowError as e:
+                if not self.stats.errors or self.stats.errors[-1] != (row_number, str(e)):
+                    self.stats.errors.append((row_number, str(e)))
+
+        self._flush(chunk)
+        if on_chunk and last_row_number != reported_row_number:
+            on_chunk(last_row_number, self.stats)
+        return self.stats
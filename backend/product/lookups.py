@@ -0,0 +1,7 @@
+# product/lookups.py
+"""Bảng tra cứu Size / Color, cache trong bộ nhớ tiến trình (xem core/lookups.py)."""
+from core.lookups import LookupTable
+from product.models import Color, Size
+
+sizes = LookupTable(Size, ['name'])
+colors = LookupTable(Color, ['name', ('name', 'hex_code')])
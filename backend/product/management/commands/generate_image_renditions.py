@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from product.images import ProductImageService
+from product.models import Product, ProductVariant
+from product.tasks import generate_image_renditions
+
+
+class Command(BaseCommand):
+    help = "Sinh ảnh responsive (WebP/JPEG) cho các sản phẩm và biến thể chưa có renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help="Chạy trực tiếp trong tiến trình này thay vì gửi task Celery.",
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Sinh lại cả những ảnh đã có renditions.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in (Product, ProductVariant):
+            rows = model.objects.exclude(image_url='').exclude(image_url__isnull=True).order_by('pk').values_list(
+                'pk', 'image_url', 'image_renditions'
+            )
+            model_label = model._meta.label
+            count = 0
+            for pk, image_name, renditions in rows.iterator(chunk_size=500):
+                if not options['force'] and ProductImageService.is_ready(renditions, image_name):
+                    continue
+                if options['force']:
+                    ProductImageService.delete_renditions(renditions)
+                    model.objects.filter(pk=pk).update(image_renditions={})
+                if options['sync']:
+                    generate_image_renditions.apply(args=(model_label, pk, image_name))
+                else:
+                    generate_image_renditions.delay(model_label, pk, image_name)
+                count += 1
+                if count % 100 == 0:
+                    self.stdout.write(f"{model_label}: {count} ảnh...")
+            self.stdout.write(f"{model_label}: {count} ảnh.")
+            total += count
+
+        action = "Đã sinh" if options['sync'] else "Đã gửi task sinh"
+        self.stdout.write(self.style.SUCCESS(f"{action} renditions cho {total} ảnh."))
@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = "Nhập sản phẩm và biến thể hàng loạt từ file CSV / XLSX (xem product/importer.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Đường dẫn file .csv hoặc .xlsx (ví dụ viberstore_product_data.xlsx).")
+        parser.add_argument('--sheet', help="Tên sheet khi nhập file Excel (mặc định sheet đang active).")
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help="Số dòng được ghi trong mỗi transaction (mặc định 1000).",
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="File lưu dòng cuối cùng đã commit; nếu file đã tồn tại, tiếp tục nhập từ dòng đó.",
+        )
+        parser.add_argument('--errors', help="Ghi các dòng lỗi ra file CSV (row, error).")
+        parser.add_argument(
+            '--supplier',
+            help="Nhà cung cấp (tên hoặc slug) cho các dòng không có cột supplier "
+                 "(mặc định nhà cung cấp có ID nhỏ nhất).",
+        )
+        parser.add_argument(
+            '--stock',
+            type=int,
+            default=0,
+            help="Tồn kho của mỗi biến thể khi file không có cột stock (mặc định 0).",
+        )
+        parser.add_argument(
+            '--price-unit',
+            type=int,
+            default=1,
+            help="Hệ số nhân giá trong file, ví dụ 1000 khi giá tính theo nghìn đồng "
+                 "như viberstore_product_data.xlsx (mặc định 1).",
+        )
+        parser.add_argument(
+            '--publish',
+            action='store_true',
+            help="Đăng bán sản phẩm mới khi file không có cột is_published.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File '{path}' không tồn tại.")
+
+        checkpoint = options['checkpoint']
+        start_row = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint, encoding='utf-8') as file:
+                state = json.load(file)
+            if state.get('path') == os.path.abspath(path):
+                start_row = state.get('row', 0)
+                self.stdout.write(f"Tiếp tục từ dòng {start_row + 1} theo checkpoint.")
+
+        started = time.monotonic()
+
+        def on_chunk(last_row, stats):
+            if checkpoint:
+                with open(checkpoint, 'w', encoding='utf-8') as file:
+                    json.dump({'path': os.path.abspath(path), 'row': last_row}, file)
+            self.stdout.write(
+                f"Dòng {last_row}: {stats.products_created} sản phẩm, {stats.variants_created} biến thể mới, "
+                f"{len(stats.errors)} lỗi ({time.monotonic() - started:.1f}s)"
+            )
+
+        try:
+            importer = CatalogImporter(
+                chunk_size=max(options['chunk_size'], 1),
+                supplier=options['supplier'],
+                default_stock=max(options['stock'], 0),
+                price_unit=max(options['price_unit'], 1),
+                publish=options['publish'],
+            )
+            if importer.default_supplier:
+                self.stdout.write(f"Nhà cung cấp mặc định: {importer.default_supplier[1]}.")
+            stats = importer.run(path, sheet=options['sheet'], start_row=start_row, on_chunk=on_chunk)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['errors'] and stats.errors:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(['row', 'error'])
+                writer.writerows(stats.errors)
+
+        for row_number, error in stats.errors[:20]:
+            self.stdout.write(self.style.ERROR(f"Dòng {row_number}: {error}"))
+        if len(stats.errors) > 20:
+            self.stdout.write(self.style.ERROR(f"... và {len(stats.errors) - 20} lỗi khác."))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: {stats.rows} dòng, {stats.products_created} sản phẩm mới, {stats.variants_created} biến thể mới, "
+            f"{stats.variants_skipped} biến thể đã tồn tại, {len(stats.errors)} dòng lỗi "
+            f"trong {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,126 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.caching import ProductDetailCache
+from product.images import RENDITION_FORMATS, ProductImageService
+from product.models import Category, Product, ProductVariant
+from product.services import CategoryTreeService
+from product.storage import ContentAddressedStorage, product_media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển ảnh sản phẩm / biến thể / danh mục (và renditions) sang storage định danh theo nội dung "
+        "(blobs/<ab>/<cd>/<sha256>.<ext>), gộp các file trùng nội dung."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Chỉ thống kê, không ghi file và không cập nhật database.",
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help="Không xóa file cũ sau khi chuyển.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Tên file cũ -> tên blob, mỗi file cũ chỉ đọc và hash một lần
+        migrated = {}
+        missing = set()
+        references = 0
+
+        def migrate_name(name):
+            """Trả về tên blob cho name (mỗi lần gọi là một tham chiếu), None nếu file không tồn tại."""
+            nonlocal references
+            if not name or ContentAddressedStorage.is_blob_name(name):
+                return name
+            if name in missing:
+                return None
+            if name in migrated:
+                references += 1
+                if not dry_run:
+                    product_media_storage.retain(migrated[name])
+                return migrated[name]
+            if not product_media_storage.exists(name):
+                missing.add(name)
+                self.stderr.write(f"Không tìm thấy file '{name}', giữ nguyên.")
+                return None
+            if dry_run:
+                with product_media_storage.open(name, 'rb') as file:
+                    digest = ContentAddressedStorage._digest(File(file))
+                migrated[name] = ContentAddressedStorage.blob_name(digest, name)
+            else:
+                with product_media_storage.open(name, 'rb') as file:
+                    migrated[name] = product_media_storage.save(name, File(file, name=name))
+            references += 1
+            return migrated[name]
+
+        def migrate_renditions(renditions):
+            if not renditions or not renditions.get('renditions'):
+                return renditions
+            # Các rendition dùng chung file được tính là một tham chiếu (xem ProductImageService.delete_renditions)
+            paths = ProductImageService.rendition_paths(renditions)
+            mapping = {path: migrate_name(path) or path for path in paths}
+            return {
+                'source': renditions.get('source'),
+                'renditions': {
+                    name: {key: mapping.get(value, value) if key in RENDITION_FORMATS else value for key, value in entry.items()}
+                    for name, entry in renditions['renditions'].items()
+                },
+            }
+
+        product_ids = set()
+        for model in (Category, Product, ProductVariant):
+            has_renditions = model is not Category
+            fields = ['pk', 'image_url'] + (['image_renditions'] if has_renditions else [])
+            fields += ['product_id'] if model is ProductVariant else []
+            rows = model.objects.exclude(image_url='').exclude(image_url__isnull=True).order_by('pk').values(*fields)
+            updated_count = 0
+            for row in rows.iterator(chunk_size=500):
+                with transaction.atomic():
+                    changes = {}
+                    new_name = migrate_name(row['image_url'])
+                    if new_name and new_name != row['image_url']:
+                        changes['image_url'] = new_name
+                    if has_renditions:
+                        renditions = migrate_renditions(row['image_renditions'])
+                        if renditions and renditions.get('source') == row['image_url'] and new_name:
+                            renditions['source'] = new_name
+                        if renditions != row['image_renditions']:
+                            changes['image_renditions'] = renditions
+                    if not changes:
+                        continue
+                    updated_count += 1
+                    if not dry_run:
+                        model.objects.filter(pk=row['pk']).update(**changes)
+                if model is Product:
+                    product_ids.add(row['pk'])
+                elif model is ProductVariant:
+                    product_ids.add(row['product_id'])
+            self.stdout.write(f"{model._meta.label}: {updated_count} bản ghi được cập nhật.")
+
+        blobs = set(migrated.values())
+        self.stdout.write(
+            f"{len(migrated)} file cũ -> {len(blobs)} blob ({len(migrated) - len(blobs)} file trùng nội dung), "
+            f"{references} tham chiếu, {len(missing)} file không tồn tại."
+        )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS("Dry run: không có thay đổi nào được ghi."))
+            return
+
+        # update() không phát signal
+        ProductDetailCache.invalidate(product_ids)
+        CategoryTreeService.invalidate()
+
+        if not options['keep_originals']:
+            for name in migrated:
+                # Tên cũ không phải blob -> storage xóa file trực tiếp
+                product_media_storage.delete(name)
+            self.stdout.write(f"Đã xóa {len(migrated)} file cũ.")
+
+        self.stdout.write(self.style.SUCCESS("Đã chuyển media sang storage định danh theo nội dung."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from product.models import Product, ProductSearchDocument, ProductSearchPosting
+from product.search import ProductSearchIndex
+
+
+class Command(BaseCommand):
+    help = "Xây dựng lại toàn bộ chỉ mục tìm kiếm sản phẩm (BM25)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Số sản phẩm được index trong mỗi lô (mặc định 500).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        # Xóa các dòng mồ côi còn sót lại trước khi index lại
+        ProductSearchPosting.objects.exclude(product_id__in=Product.objects.values('pk')).delete()
+        ProductSearchDocument.objects.exclude(product_id__in=Product.objects.values('pk')).delete()
+
+        indexed_count = 0
+        for start in range(0, len(product_ids), batch_size):
+            indexed_count += ProductSearchIndex.index_products(product_ids[start:start + batch_size])
+            self.stdout.write(f"Đã index {indexed_count}/{len(product_ids)} sản phẩm...")
+        ProductSearchIndex.invalidate_stats()
+
+        self.stdout.write(self.style.SUCCESS(f"Đã xây dựng lại chỉ mục tìm kiếm cho {indexed_count} sản phẩm."))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from product.models import Product
+from product.services import refresh_product_total_stock
+
+
+class Command(BaseCommand):
+    help = "Kiểm tra và tính lại Product.total_stock từ tổng stock của các ProductVariant."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Chỉ kiểm tra và báo cáo các sản phẩm bị lệch, không ghi vào database.",
+        )
+        parser.add_argument(
+            '--product',
+            type=int,
+            nargs='+',
+            dest='product_ids',
+            help="Chỉ xử lý các Product ID được chỉ định.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Số sản phẩm được cập nhật trong mỗi câu UPDATE (mặc định 1000).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['product_ids']:
+            queryset = queryset.filter(pk__in=options['product_ids'])
+
+        # Một truy vấn GROUP BY cho toàn bộ sản phẩm thay vì aggregate từng dòng
+        mismatched = list(
+            queryset.annotate(actual_stock=Coalesce(Sum('variants__stock'), 0))
+            .exclude(total_stock=F('actual_stock'))
+            .values_list('pk', 'total_stock', 'actual_stock')
+            .order_by('pk')
+        )
+
+        for product_id, stored, actual in mismatched:
+            self.stdout.write(f"Product ID {product_id}: total_stock={stored}, tổng stock biến thể={actual}")
+
+        if options['check']:
+            if mismatched:
+                raise CommandError(f"{len(mismatched)} sản phẩm có total_stock không khớp.")
+            self.stdout.write(self.style.SUCCESS("Tất cả total_stock đều khớp."))
+            return
+
+        batch_size = max(options['batch_size'], 1)
+        product_ids = [product_id for product_id, _, _ in mismatched]
+        updated_count = 0
+        for start in range(0, len(product_ids), batch_size):
+            updated_count += refresh_product_total_stock(product_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật total_stock cho {updated_count} sản phẩm."))
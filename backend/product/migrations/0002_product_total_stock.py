@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_stock(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    ProductVariant = apps.get_model('product', 'ProductVariant')
+    variant_stock = (
+        ProductVariant.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('stock'))
+        .values('total')
+    )
+    Product.objects.update(total_stock=Coalesce(Subquery(variant_stock), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='Total Stock'),
+        ),
+        migrations.RunPython(backfill_total_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_product_total_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_published', 'created_at', 'id'], name='product_is_publ_143b26_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_published', 'publish_at', 'id'], name='product_is_publ_794223_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='product.product')),
+                ('length', models.PositiveIntegerField(default=0, verbose_name='Document Length')),
+            ],
+            options={
+                'db_table': 'product_search_document',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Term')),
+                ('term_frequency', models.PositiveIntegerField(default=0, verbose_name='Term Frequency')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='product.product')),
+            ],
+            options={
+                'db_table': 'product_search_posting',
+                'constraints': [models.UniqueConstraint(fields=('term', 'product'), name='unique_search_term_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Image Renditions'),
+        ),
+    ]
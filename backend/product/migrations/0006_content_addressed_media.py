@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:40
+
+import product.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Blob Name')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Reference Count')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Size (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'db_table': 'media_blob',
+            },
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='image_url',
+            field=models.ImageField(blank=True, null=True, storage=product.storage.ContentAddressedStorage(), upload_to='categories/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_url',
+            field=models.ImageField(blank=True, null=True, storage=product.storage.ContentAddressedStorage(), upload_to='products/', verbose_name='Image URL'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='image_url',
+            field=models.ImageField(blank=True, null=True, storage=product.storage.ContentAddressedStorage(), upload_to='product_variants/', verbose_name='Image URL'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:40
+
+import product.enums
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=product.enums.DeletionJobKind.choices, max_length=20, verbose_name='Kind')),
+                ('object_id', models.BigIntegerField(verbose_name='Object ID')),
+                ('object_repr', models.CharField(blank=True, default='', max_length=255, verbose_name='Object')),
+                ('status', models.CharField(choices=product.enums.DeletionJobStatus.choices, db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('total_products', models.PositiveIntegerField(default=0, verbose_name='Total Products')),
+                ('deleted_products', models.PositiveIntegerField(default=0, verbose_name='Deleted Products')),
+                ('released_files', models.PositiveIntegerField(default=0, verbose_name='Released Files')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+            ],
+            options={
+                'db_table': 'deletion_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='Deleted At'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='Deleted At'),
+        ),
+    ]
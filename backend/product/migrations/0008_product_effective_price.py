@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(sale_price__gt=0, then=models.F('sale_price')), default=models.F('price')), output_field=models.IntegerField(), verbose_name='Effective Price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_published', 'effective_price', 'id'], name='product_is_publ_c77549_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletionjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat At'),
+        ),
+        migrations.AddField(
+            model_name='deletionjob',
+            name='lease_token',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Lease Token'),
+        ),
+    ]
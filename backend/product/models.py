@@ -1,9 +1,85 @@
+import logging
+from typing import Optional
+
 from django.db import models
+from django.db.models import Case, F, When
 from django.utils import timezone
 # Create your models here.
-from product.enums import SupplierStatus
-from django.core.exceptions import ObjectDoesNotExist # Import để xử lý lỗi không tìm thấy
+from product.enums import DeletionJobKind, DeletionJobStatus, SupplierStatus
+from product.images import ProductImageService
+from product.storage import ContentAddressedStorage, product_media_storage
+from core.models import DirtyFieldsMixin
 from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+
+class ImageOwnerMixin:
+    """
+    Bỏ tham chiếu ảnh cũ khi image_url được thay (Product, ProductVariant, Category; dùng cùng DirtyFieldsMixin).
+    Giá trị cũ lấy từ lúc load nên không cần SELECT lại. Ảnh cũ và renditions của nó chỉ được release
+    sau khi bản ghi được ghi thành công; renditions cũ bị bỏ khỏi bản ghi để task sinh lại cho ảnh mới.
+    """
+    # Ảnh cũ (không phải blob) của biến thể có thể dùng chung giữa nhiều bản ghi: không xóa (xem release_variant_image)
+    release_legacy_image = True
+
+    def _has_renditions(self) -> bool:
+        return any(field.name == 'image_renditions' for field in self._meta.concrete_fields)
+
+    def _replaced_image(self, update_fields=None) -> Optional[tuple]:
+        """(tên ảnh cũ, renditions cũ) nếu lần save này thay image_url, ngược lại None."""
+        if self._state.adding or self.pk is None:
+            return None
+        if update_fields is not None and 'image_url' not in update_fields:
+            return None
+        dirty = self.get_dirty_fields()
+        if dirty is None:
+            # Instance không được load từ database (trường hợp hiếm): đọc giá trị cũ
+            columns = ['image_url', 'image_renditions'] if self._has_renditions() else ['image_url']
+            old = type(self)._base_manager.filter(pk=self.pk).values(*columns).first()
+            if old is None or (old['image_url'] or None) == (self.image_url.name or None):
+                return None
+            return old['image_url'] or None, old.get('image_renditions')
+        if 'image_url' not in dirty:
+            return None
+        renditions = self.get_loaded_value('image_renditions') if self._has_renditions() else None
+        return dirty['image_url'], renditions
+
+    def _release_image(self, image_name: Optional[str], renditions: Optional[dict]) -> None:
+        try:
+            if image_name and (self.release_legacy_image or ContentAddressedStorage.is_blob_name(image_name)):
+                self._meta.get_field('image_url').storage.delete(image_name)
+            ProductImageService.delete_renditions(renditions)
+        except Exception as e:
+            logger.warning(f"Error releasing old image '{image_name}' of {self._meta.label} {self.pk}: {e}")
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        replaced = self._replaced_image(update_fields)
+        if replaced is not None and self._has_renditions():
+            # Renditions của ảnh cũ không còn dùng được
+            self.image_renditions = {}
+            if update_fields is not None and 'image_renditions' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'image_renditions']
+        super().save(*args, **kwargs)
+        if replaced is not None:
+            self._release_image(*replaced)
+
+
+class SoftDeleteManager(models.Manager):
+    """Manager mặc định: ẩn các bản ghi đã bị xóa mềm (deleted_at khác NULL), xem DeletionService."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class ActiveVariantManager(models.Manager):
+    """Ẩn biến thể của các sản phẩm đã bị xóa mềm."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(product__deleted_at__isnull=True)
+
+
 class Supplier(models.Model):
     company_name = models.CharField(max_length=255, verbose_name="Company Name", unique=True)
     slug = models.SlugField(max_length=255, unique=True, blank=True, verbose_name="Slug")
@@ -20,6 +96,11 @@ class Supplier(models.Model):
     started_at = models.DateTimeField(default=timezone.now, verbose_name="Started At")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(default=None, blank=True, null=True, verbose_name="Updated At")
+    # Xóa mềm: bản ghi bị ẩn ngay, job nền xóa thật sau (xem DeletionService)
+    deleted_at = models.DateTimeField(null=True, blank=True, default=None, db_index=True, verbose_name="Deleted At")
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.company_name
@@ -33,7 +114,7 @@ class Supplier(models.Model):
     class Meta:
         db_table = 'supplier'
     
-class Product(models.Model):
+class Product(ImageOwnerMixin, DirtyFieldsMixin, models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="products")
     name = models.CharField(max_length=255, unique=True, verbose_name="Product Name")
     slug = models.SlugField(max_length=255, unique=True, default="product-name")
@@ -41,6 +122,16 @@ class Product(models.Model):
     cost_price = models.IntegerField(default=0, verbose_name="Cost Price")
     price = models.IntegerField(default=0, verbose_name="Cost Price")
     sale_price = models.IntegerField(default=0, verbose_name="Cost Price")
+    # Giá khách thực trả: sale_price nếu đang giảm giá, ngược lại là price.
+    # Cột do database tính (STORED) nên luôn đúng kể cả khi ghi bằng update() / bulk_create
+    effective_price = models.GeneratedField(
+        expression=Case(When(sale_price__gt=0, then=F('sale_price')), default=F('price')),
+        output_field=models.IntegerField(),
+        db_persist=True,
+        verbose_name="Effective Price",
+    )
+    # Tổng tồn kho của các biến thể, được duy trì bởi service (xem refresh_product_total_stock)
+    total_stock = models.PositiveIntegerField(default=0, verbose_name="Total Stock")
     is_published = models.BooleanField(default=False, verbose_name="Is Published")
     # --- Trường mới cho hẹn giờ ---
     publish_at = models.DateTimeField(
@@ -52,9 +143,16 @@ class Product(models.Model):
                   "Product will only appear if 'Published Status' is also checked AND this time is reached (or if this field is blank).",
         db_index=True       # Thêm index vì có thể sẽ query theo trường này
     )
-    image_url = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name="Image URL")
+    image_url = models.ImageField(upload_to='products/', storage=product_media_storage, blank=True, null=True, verbose_name="Image URL")
+    # Các bản resize WebP/JPEG của image_url, do task Celery sinh ra (xem product/images.py)
+    image_renditions = models.JSONField(default=dict, blank=True, verbose_name="Image Renditions")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(default=None, blank=True, null=True, verbose_name="Updated At")
+    deleted_at = models.DateTimeField(null=True, blank=True, default=None, db_index=True, verbose_name="Deleted At")
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
@@ -66,6 +164,11 @@ class Product(models.Model):
             models.Index(fields=['name']),
             models.Index(fields=['publish_at']), # Thêm index cho trường mới
             models.Index(fields=['is_published']),
+            # Index cho phân trang keyset (xem product/pagination.py)
+            models.Index(fields=['is_published', 'created_at', 'id']),
+            models.Index(fields=['is_published', 'publish_at', 'id']),
+            # Lọc min_price / max_price và sắp xếp theo giá (sort=price_asc|price_desc)
+            models.Index(fields=['is_published', 'effective_price', 'id']),
         ]
 
     def delete(self, *args, **kwargs):
@@ -91,36 +194,24 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Override phương thức save để tự động tạo slug và xử lý xóa ảnh cũ.
+        Override phương thức save để tự động tạo slug; ảnh cũ được bỏ tham chiếu bởi ImageOwnerMixin.
         """
         # 1. Tự động tạo slug từ name nếu slug rỗng
         if not self.slug:
             self.slug = slugify(self.name)
 
-        # 2. Xử lý xóa ảnh cũ nếu ảnh mới được tải lên (logic từ ban đầu)
-        if self.pk: # Chỉ thực hiện khi update (đã có pk)
-            try:
-                old_instance = Product.objects.get(pk=self.pk)
-                if old_instance.image_url and self.image_url != old_instance.image_url:
-                    # Kiểm tra file cũ tồn tại trước khi xóa
-                    if hasattr(old_instance.image_url, 'path') and old_instance.image_url.storage.exists(old_instance.image_url.name):
-                         old_instance.image_url.delete(save=False)
-                    elif not hasattr(old_instance.image_url, 'path'):
-                         old_instance.image_url.delete(save=False)
-            except ObjectDoesNotExist:
-                pass # Bỏ qua nếu không tìm thấy instance cũ (trường hợp hiếm)
-            except Exception as e:
-                 # Log lỗi hoặc xử lý phù hợp
-                print(f"Error deleting old image file for product {self.pk}: {e}")
-        self.updated_at = timezone.now()
+        # 2. Không có gì thay đổi thì không ghi (kể cả updated_at); giá trị cũ lấy từ lúc load (DirtyFieldsMixin)
+        dirty = self.get_dirty_fields() if self.pk else None
+        if dirty is None or dirty:
+            self.updated_at = timezone.now()
         super().save(*args, **kwargs) # Gọi phương thức save gốc
 
-class Category(models.Model):
+class Category(ImageOwnerMixin, DirtyFieldsMixin, models.Model):
     name = models.CharField(max_length=255)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name="subcategories")
     slug = models.SlugField(max_length=255, unique=True, default="category-name")
     description = models.TextField(blank=True, null=True)
-    image_url = models.ImageField(upload_to='categories/', blank=True, null=True)
+    image_url = models.ImageField(upload_to='categories/', storage=product_media_storage, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(default=None, blank=True, null=True)
     def __str__(self):
@@ -162,20 +253,94 @@ class Color(models.Model):
     class Meta:
         db_table = 'color'
 
-class ProductVariant(models.Model):
+class ProductVariant(ImageOwnerMixin, DirtyFieldsMixin, models.Model):
+    release_legacy_image = False
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variants")
     size = models.ForeignKey(Size, on_delete=models.CASCADE, blank=True, null=True, verbose_name="Size")
     color = models.ForeignKey(Color, on_delete=models.CASCADE, blank=True, null=True, verbose_name="Color")
     sku = models.CharField(max_length=255, verbose_name="SKU")
     stock = models.PositiveIntegerField(default=0, verbose_name="Stock")
-    image_url = models.ImageField(upload_to='product_variants/', blank=True, null=True, verbose_name="Image URL")
+    image_url = models.ImageField(upload_to='product_variants/', storage=product_media_storage, blank=True, null=True, verbose_name="Image URL")
+    image_renditions = models.JSONField(default=dict, blank=True, verbose_name="Image Renditions")
     weight_grams = models.DecimalField(max_digits=10, decimal_places=2, default=0.0, verbose_name="Weight (grams)")
     is_active = models.BooleanField(default=True, verbose_name="Is Active")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
     updated_at = models.DateTimeField(default=None, blank=True, null=True, verbose_name="Updated At")
+
+    objects = ActiveVariantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.product.name} - {self.size.name if self.size else 'N/A'} - {self.color.name if self.color else 'N/A'}"
 
     class Meta:
         db_table = 'product_variant'
 
+
+
+class ProductSearchDocument(models.Model):
+    """Thống kê tài liệu cho chỉ mục tìm kiếm BM25 (xem product/search.py)."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    length = models.PositiveIntegerField(default=0, verbose_name="Document Length")
+
+    class Meta:
+        db_table = 'product_search_document'
+
+
+class ProductSearchPosting(models.Model):
+    """Một dòng của chỉ mục đảo ngược: term xuất hiện trong product với tần suất term_frequency."""
+    term = models.CharField(max_length=64, verbose_name="Term")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_postings")
+    term_frequency = models.PositiveIntegerField(default=0, verbose_name="Term Frequency")
+
+    class Meta:
+        db_table = 'product_search_posting'
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_search_term_product'),
+        ]
+
+
+class MediaBlob(models.Model):
+    """Số tham chiếu tới một file ảnh lưu theo hash nội dung (xem product/storage.py)."""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Blob Name")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Reference Count")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Size (bytes)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'media_blob'
+
+
+class DeletionJob(models.Model):
+    """Tiến trình xóa nền một Product / Supplier đã bị xóa mềm (xem product.tasks.run_deletion_job)."""
+    kind = models.CharField(max_length=20, choices=DeletionJobKind.choices, verbose_name="Kind")
+    object_id = models.BigIntegerField(verbose_name="Object ID")
+    object_repr = models.CharField(max_length=255, blank=True, default='', verbose_name="Object")
+    status = models.CharField(
+        max_length=20,
+        choices=DeletionJobStatus.choices,
+        default=DeletionJobStatus.PENDING.value,
+        db_index=True,
+        verbose_name="Status",
+    )
+    total_products = models.PositiveIntegerField(default=0, verbose_name="Total Products")
+    deleted_products = models.PositiveIntegerField(default=0, verbose_name="Deleted Products")
+    released_files = models.PositiveIntegerField(default=0, verbose_name="Released Files")
+    error = models.TextField(blank=True, default='', verbose_name="Error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Finished At")
+    # Worker đang giữ job: lease_token được đặt khi nhận job, heartbeat_at được gia hạn sau mỗi lô
+    lease_token = models.CharField(max_length=32, blank=True, default='', verbose_name="Lease Token")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Heartbeat At")
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} ({self.status})"
+
+    class Meta:
+        db_table = 'deletion_job'
+        ordering = ['-created_at']
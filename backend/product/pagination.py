@@ -0,0 +1,152 @@
+# product/pagination.py
+"""
+Phân trang keyset (cursor) cho danh sách sản phẩm.
+
+Thay vì OFFSET, mỗi trang lọc theo vị trí của dòng cuối trang trước trên bộ khóa
+sắp xếp, ví dụ (created_at, id). Nhờ index tương ứng, trang sâu tốn chi phí như trang đầu.
+Cursor là chuỗi base64 mờ (opaque), client chỉ việc gửi lại giá trị next/previous.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# (tên field, sắp xếp giảm dần?) - field cuối luôn là khóa duy nhất để phá thế hòa
+ORDERINGS: Dict[str, Tuple[Tuple[str, bool], ...]] = {
+    'created': (('created_at', True), ('id', True)),
+    'latest': (('publish_at', True), ('id', True)),
+    'price_asc': (('effective_price', False), ('id', False)),
+    'price_desc': (('effective_price', True), ('id', True)),
+}
+# Giá trị hợp lệ của query param sort
+PRICE_SORTS = ('price_asc', 'price_desc')
+
+
+class ProductKeysetPagination:
+    """
+    Phân trang keyset trên một trong các ORDERINGS.
+    Giả định NULL nhỏ nhất khi sắp xếp (ngữ nghĩa của MySQL), nên publish_at rỗng nằm cuối khi giảm dần.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, ordering: str = 'created'):
+        self.ordering = ORDERINGS[ordering]
+        self.next_cursor: Optional[str] = None
+        self.previous_cursor: Optional[str] = None
+        self.request = None
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        """Client yêu cầu phân trang khi gửi cursor hoặc page_size."""
+        return cls.cursor_query_param in request.query_params or cls.page_size_query_param in request.query_params
+
+    def get_page_size(self, request) -> int:
+        default = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return default
+        try:
+            page_size = int(raw)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid page_size value. Must be an integer.")
+        if page_size <= 0:
+            raise ValueError("page_size must be a positive integer.")
+        return min(page_size, self.max_page_size)
+
+    # --- Cursor encode/decode ---
+    @staticmethod
+    def _encode_cursor(values: Sequence[Any], reverse: bool) -> str:
+        # DjangoJSONEncoder cắt datetime về mili giây, cursor cần giữ đủ micro giây để so sánh chính xác
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _decode_cursor(self, queryset: QuerySet, cursor: str) -> Tuple[List[Any], bool]:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            raw_values = payload['v']
+            if len(raw_values) != len(self.ordering):
+                raise ValueError
+            values = [
+                None if raw is None else queryset.model._meta.get_field(field).to_python(raw)
+                for (field, _), raw in zip(self.ordering, raw_values)
+            ]
+            return values, bool(payload.get('r'))
+        except Exception:
+            raise ValueError("Invalid cursor.")
+
+    # --- Keyset filter ---
+    @staticmethod
+    def _beyond(field: str, descending: bool, value: Any) -> Optional[Q]:
+        """Điều kiện 'nằm sau value' trên một field, None nếu không có dòng nào nằm sau."""
+        if descending:
+            if value is None:
+                return None
+            return Q(**{f'{field}__lt': value}) | Q(**{f'{field}__isnull': True})
+        if value is None:
+            return Q(**{f'{field}__isnull': False})
+        return Q(**{f'{field}__gt': value})
+
+    def _keyset_filter(self, ordering, values: Sequence[Any]) -> Q:
+        """(f1, f2, ...) nằm sau (v1, v2, ...) theo thứ tự từ điển."""
+        condition = Q(pk__in=[])
+        equal_prefix = Q()
+        for (field, descending), value in zip(ordering, values):
+            beyond = self._beyond(field, descending, value)
+            if beyond is not None:
+                condition |= equal_prefix & beyond
+            equal_prefix &= Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+        return condition
+
+    def paginate_queryset(self, queryset: QuerySet, request) -> List[Any]:
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        values, reverse = self._decode_cursor(queryset, cursor) if cursor else (None, False)
+
+        # Trang trước: đảo chiều sắp xếp, lấy rồi đảo lại kết quả
+        ordering = tuple((field, descending != reverse) for field, descending in self.ordering)
+        queryset = queryset.order_by(*[f'-{field}' if descending else field for field, descending in ordering])
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(ordering, values))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        if rows:
+            if has_next:
+                self.next_cursor = self._encode_cursor(self._position(rows[-1]), reverse=False)
+            if has_previous:
+                self.previous_cursor = self._encode_cursor(self._position(rows[0]), reverse=True)
+        return rows
+
+    def _position(self, obj) -> List[Any]:
+        return [getattr(obj, field) for field, _ in self.ordering]
+
+    def _link(self, cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data, **extra) -> Response:
+        return Response({
+            'next': self._link(self.next_cursor),
+            'previous': self._link(self.previous_cursor),
+            **extra,
+            'results': data,
+        })
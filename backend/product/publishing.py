@@ -0,0 +1,127 @@
+# product/publishing.py
+"""
+Đăng sản phẩm hẹn giờ (publish_at).
+
+Khi lưu sản phẩm có publish_at trong tương lai, một task Celery được gửi với eta = publish_at
+nên sản phẩm được đăng đúng thời điểm. Task mang theo publish_at lúc gửi và chỉ đăng nếu
+giá trị trong database vẫn như vậy: đổi lịch, hủy lịch hoặc task bị gửi lặp đều vô hại.
+
+Task chỉ được gửi ngay cho các lịch trong khoảng PRODUCT_PUBLISH_ETA_HORIZON tới
+(worker giữ task ETA trong bộ nhớ, và broker Redis gửi lại task chưa ack sau visibility_timeout).
+Lịch xa hơn được task định kỳ publish_scheduled_products gửi khi vào khoảng này; task định kỳ
+đồng thời đăng mọi sản phẩm quá hạn (ví dụ broker mất task) - cả hai dùng
+index (is_published, publish_at, id).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from product.caching import ProductDetailCache
+from product.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductPublishService:
+
+    @staticmethod
+    def eta_horizon() -> timedelta:
+        return timedelta(seconds=getattr(settings, 'PRODUCT_PUBLISH_ETA_HORIZON', 3600))
+
+    @staticmethod
+    def sweep_batch_size() -> int:
+        return getattr(settings, 'PRODUCT_PUBLISH_SWEEP_BATCH_SIZE', 500)
+
+    @staticmethod
+    def _enqueued_key(product_id: int, publish_at: datetime) -> str:
+        return f'product:{product_id}:publish:{publish_at.timestamp()}'
+
+    @staticmethod
+    def _enqueue(product_id: int, publish_at: datetime) -> None:
+        # Import tại chỗ: product.tasks import module này
+        from product.tasks import publish_product
+
+        # Mỗi (sản phẩm, lịch) chỉ gửi một lần trong khoảng horizon
+        timeout = int((publish_at - timezone.now() + ProductPublishService.eta_horizon()).total_seconds())
+        if not cache.add(ProductPublishService._enqueued_key(product_id, publish_at), 1, timeout=max(timeout, 1)):
+            return
+        try:
+            publish_product.apply_async(args=(product_id, publish_at.isoformat()), eta=publish_at)
+        except Exception as e:
+            cache.delete(ProductPublishService._enqueued_key(product_id, publish_at))
+            # Task định kỳ sẽ đăng sản phẩm khi broker hoạt động lại
+            logger.error(f"Error enqueueing publish task for product {product_id}: {e}", exc_info=True)
+
+    @staticmethod
+    def schedule(product: Product) -> None:
+        """Gửi task đăng sản phẩm tại publish_at sau khi transaction commit (nếu lịch nằm trong horizon)."""
+        publish_at = product.publish_at
+        if product.is_published or publish_at is None:
+            return
+        if publish_at > timezone.now() + ProductPublishService.eta_horizon():
+            return
+        product_id = product.pk
+        transaction.on_commit(lambda: ProductPublishService._enqueue(product_id, publish_at))
+
+    @staticmethod
+    def publish(product_id: int, publish_at: datetime) -> bool:
+        """
+        Đăng sản phẩm nếu lịch vẫn là publish_at và đã tới giờ. Trả về True nếu sản phẩm được đăng.
+        """
+        updated = Product.objects.filter(
+            pk=product_id, is_published=False, publish_at=publish_at, publish_at__lte=timezone.now()
+        ).update(is_published=True, updated_at=timezone.now())
+        if updated:
+            # update() không phát signal
+            ProductDetailCache.invalidate([product_id])
+            logger.info(f"Product {product_id} published as scheduled at {publish_at}.")
+        return bool(updated)
+
+    @staticmethod
+    def publish_due(now: Optional[datetime] = None) -> List[int]:
+        """
+        Đăng mọi sản phẩm quá hạn, không giới hạn thời gian quá hạn (task ETA có thể mất từ lâu,
+        ví dụ broker / beat ngừng nhiều ngày). Đọc theo lô trên index (is_published, publish_at, id),
+        mỗi lô một transaction. Trả về danh sách ID được đăng.
+        """
+        now = now or timezone.now()
+        batch_size = ProductPublishService.sweep_batch_size()
+        published_ids: List[int] = []
+        while True:
+            product_ids = list(
+                Product.objects.filter(is_published=False, publish_at__lte=now)
+                .order_by('publish_at', 'id')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not product_ids:
+                break
+            with transaction.atomic():
+                batch_ids = list(
+                    Product.objects.select_for_update().filter(pk__in=product_ids, is_published=False).values_list('pk', flat=True)
+                )
+                Product.objects.filter(pk__in=batch_ids).update(is_published=True, updated_at=now)
+                ProductDetailCache.invalidate(batch_ids)
+            published_ids += batch_ids
+            if len(product_ids) < batch_size:
+                break
+        return published_ids
+
+    @staticmethod
+    def schedule_upcoming(now: Optional[datetime] = None) -> int:
+        """Gửi task ETA cho các lịch vừa vào khoảng horizon. Trả về số sản phẩm được xét."""
+        now = now or timezone.now()
+        rows = Product.objects.filter(
+            is_published=False,
+            publish_at__gt=now,
+            publish_at__lte=now + ProductPublishService.eta_horizon(),
+        ).values_list('pk', 'publish_at')
+        count = 0
+        for product_id, publish_at in rows:
+            ProductPublishService._enqueue(product_id, publish_at)
+            count += 1
+        return count
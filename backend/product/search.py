@@ -0,0 +1,211 @@
+# product/search.py
+"""
+Tìm kiếm toàn văn cho sản phẩm, không cần Elasticsearch.
+
+Chỉ mục đảo ngược được lưu trong MySQL (ProductSearchPosting / ProductSearchDocument),
+gồm tên, mô tả, tên danh mục và SKU biến thể. Văn bản được bỏ dấu tiếng Việt
+("Áo thun" -> "ao thun") trước khi tách từ, kết quả được xếp hạng bằng BM25.
+Chỉ mục được cập nhật sau mỗi lần commit thông qua product/signals.py.
+"""
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, FloatField, OuterRef, Prefetch, QuerySet, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from product.models import Product, ProductCategory, ProductSearchDocument, ProductSearchPosting, ProductVariant
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+STATS_CACHE_KEY = 'product_search:stats'
+
+# Trọng số theo trường: từ khớp ở tên quan trọng hơn ở mô tả
+FIELD_WEIGHTS = {
+    'name': 3,
+    'category': 2,
+    'sku': 2,
+    'description': 1,
+}
+
+
+def fold_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: 'Áo Đỏ' -> 'ao do'."""
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    normalized = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in normalized if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Tách văn bản đã bỏ dấu thành các term chữ-số."""
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_PATTERN.findall(fold_diacritics(text))]
+
+
+class ProductSearchIndex:
+    # Tham số BM25 chuẩn
+    K1 = 1.2
+    B = 0.75
+    # Term cuối của truy vấn được mở rộng theo tiền tố ("ao thu" khớp "thun")
+    MAX_PREFIX_EXPANSIONS = 20
+    MAX_RESULTS = 1000
+    STATS_CACHE_TIMEOUT = 300
+
+    # --- Indexing ---
+    @staticmethod
+    def _document_fields(product: Product) -> Iterator[Tuple[str, int]]:
+        yield product.name, FIELD_WEIGHTS['name']
+        yield product.description, FIELD_WEIGHTS['description']
+        for link in product.product_categories.all():
+            yield link.category.name, FIELD_WEIGHTS['category']
+        for variant in product.variants.all():
+            yield variant.sku, FIELD_WEIGHTS['sku']
+
+    @staticmethod
+    def index_products(product_ids: Iterable[int]) -> int:
+        """
+        (Re)index các sản phẩm được chỉ định. Sản phẩm không còn tồn tại sẽ bị xóa khỏi chỉ mục.
+        Trả về số sản phẩm đã được index.
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return 0
+
+        products = Product.objects.filter(pk__in=product_ids).only('id', 'name', 'description').prefetch_related(
+            Prefetch('product_categories', queryset=ProductCategory.objects.select_related('category').only('product_id', 'category__name')),
+            Prefetch('variants', queryset=ProductVariant.objects.only('product_id', 'sku')),
+        )
+
+        documents = []
+        postings = []
+        for product in products:
+            term_counts = Counter()
+            for text, weight in ProductSearchIndex._document_fields(product):
+                for term in tokenize(text):
+                    term_counts[term] += weight
+            documents.append(ProductSearchDocument(product=product, length=sum(term_counts.values())))
+            postings.extend(
+                ProductSearchPosting(term=term, product=product, term_frequency=count)
+                for term, count in term_counts.items()
+            )
+
+        with transaction.atomic():
+            ProductSearchPosting.objects.filter(product_id__in=product_ids).delete()
+            ProductSearchDocument.objects.filter(product_id__in=product_ids).delete()
+            ProductSearchDocument.objects.bulk_create(documents, batch_size=1000)
+            ProductSearchPosting.objects.bulk_create(postings, batch_size=1000)
+
+        logger.debug(f"Indexed {len(documents)} products for search.")
+        return len(documents)
+
+    @staticmethod
+    def schedule_reindex(product_ids: Iterable[int]) -> None:
+        """Reindex sau khi transaction hiện tại commit, lỗi index không làm hỏng request."""
+        product_ids = [product_id for product_id in product_ids if product_id is not None]
+        if not product_ids:
+            return
+
+        def _reindex():
+            try:
+                ProductSearchIndex.index_products(product_ids)
+            except Exception as e:
+                logger.error(f"Error indexing products {product_ids} for search: {e}", exc_info=True)
+
+        transaction.on_commit(_reindex)
+
+    # --- Querying ---
+    @staticmethod
+    def corpus_stats() -> Optional[Tuple[int, float]]:
+        """
+        (số tài liệu, độ dài trung bình) của chỉ mục, cache STATS_CACHE_TIMEOUT giây:
+        BM25 chỉ cần giá trị gần đúng, không cần COUNT/AVG toàn bảng cho mỗi truy vấn.
+        None nếu chỉ mục chưa được xây dựng (không cache, để nhận ra ngay khi chỉ mục được xây).
+        """
+        stats = cache.get(STATS_CACHE_KEY)
+        if stats is None:
+            aggregate = ProductSearchDocument.objects.aggregate(total=Count('pk'), average_length=Avg('length'))
+            if not aggregate['total']:
+                return None
+            stats = (aggregate['total'], float(aggregate['average_length'] or 1))
+            cache.set(STATS_CACHE_KEY, stats, ProductSearchIndex.STATS_CACHE_TIMEOUT)
+        return stats
+
+    @staticmethod
+    def invalidate_stats() -> None:
+        cache.delete(STATS_CACHE_KEY)
+
+    @staticmethod
+    def rank(queryset: QuerySet, query: str) -> Optional[QuerySet]:
+        """
+        Lọc queryset còn các sản phẩm khớp truy vấn, annotate search_rank (điểm BM25) và xếp giảm dần.
+        Điểm được tính trong SQL và chỉ cho các dòng của queryset, nên các bộ lọc khác
+        (đã đăng, xóa mềm, facet...) được áp dụng trước khi xếp hạng / phân trang.
+        Trả về None nếu chỉ mục chưa được xây dựng (xem lệnh rebuild_search_index).
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return queryset.none()
+
+        stats = ProductSearchIndex.corpus_stats()
+        if stats is None:
+            return None
+        total_documents, average_length = stats
+
+        terms = set(query_terms)
+        last_term = query_terms[-1]
+        terms.update(
+            ProductSearchPosting.objects.filter(term__startswith=last_term)
+            .exclude(term=last_term)
+            .values_list('term', flat=True)
+            .distinct()[:ProductSearchIndex.MAX_PREFIX_EXPANSIONS]
+        )
+
+        document_frequency: Dict[str, int] = dict(
+            ProductSearchPosting.objects.filter(term__in=terms)
+            .values('term')
+            .annotate(df=Count('product_id'))
+            .values_list('term', 'df')
+        )
+        if not document_frequency:
+            return queryset.none()
+
+        # idf chỉ có vài giá trị (một cho mỗi term), được đưa vào SQL dưới dạng hằng số
+        idf = Case(
+            *[
+                When(term=term, then=Value(math.log(1 + (total_documents - df + 0.5) / (df + 0.5))))
+                for term, df in document_frequency.items()
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        k1, b = ProductSearchIndex.K1, ProductSearchIndex.B
+        tf = Cast('term_frequency', FloatField())
+        length = Cast(Coalesce('product__search_document__length', 0), FloatField())
+        score = Sum(idf * tf * (k1 + 1) / (tf + k1 * (1 - b) + k1 * b * length / average_length))
+
+        postings = ProductSearchPosting.objects.filter(term__in=document_frequency.keys())
+        scores = postings.filter(product_id=OuterRef('pk')).values('product_id').annotate(score=score).values('score')
+        return (
+            queryset.filter(pk__in=postings.values('product_id'))
+            .annotate(search_rank=Subquery(scores, output_field=FloatField()))
+            .order_by('-search_rank', '-pk')
+        )
+
+    @staticmethod
+    def search(query: str, limit: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Trả về danh sách Product ID (chưa bị xóa) khớp truy vấn, xếp theo điểm BM25 giảm dần.
+        Trả về None nếu chỉ mục chưa được xây dựng (xem lệnh rebuild_search_index).
+        """
+        ranked = ProductSearchIndex.rank(Product.objects.all(), query)
+        if ranked is None:
+            return None
+        return list(ranked.values_list('pk', flat=True)[:limit or ProductSearchIndex.MAX_RESULTS])
@@ -1,14 +1,14 @@
 from rest_framework import serializers
 from product.models import (
-    Supplier, Product, Category, ProductCategory, Size, Color, ProductVariant
+    Supplier, Product, Category, ProductCategory, Size, Color, ProductVariant, DeletionJob
 )
 from .enums import SupplierStatus # Giả sử enum này được định nghĩa trong product_app/enums.py
 from decimal import Decimal # Import Decimal nếu bạn chuyển giá sang DecimalField
+from typing import Optional
 
-# import các hàm cần thiết
-from django.db.models import Sum
 # --- Base Serializers (Không có quan hệ phức tạp) ---
-from product.utils import convert_image_to_jpeg
+from product.images import ProductImageService
+from product.services import CategoryTreeService
 class SupplierSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -72,17 +72,10 @@ class RecursiveCategorySerializer(serializers.ModelSerializer):
 
     def get_subcategories(self, obj: Category):
         """
-        Lấy và serialize các subcategories trực tiếp của category hiện tại (obj).
+        Lấy các subcategories lồng nhau của category hiện tại (obj).
+        Dữ liệu lấy từ cây danh mục đã cache (CategoryTreeService) thay vì truy vấn từng node.
         """
-        # Lấy tất cả các subcategories liên quan (nhờ related_name='subcategories')
-        # Bạn có thể thêm filter ở đây nếu cần, ví dụ: chỉ lấy active subcategories
-        # lấy subcategories bằng cách lấy những category có parent là obj
-        subcategories_queryset = Category.objects.filter(parent=obj).order_by('name')
-
-        # Serialize danh sách các subcategories này bằng chính serializer hiện tại
-        # Quan trọng: truyền context để đảm bảo các thông tin như request (nếu cần cho ImageField URL) được giữ nguyên
-        serializer = RecursiveCategorySerializer(subcategories_queryset, many=True, context=self.context)
-        return serializer.data
+        return CategoryTreeService.get_subcategories(obj.pk, request=self.context.get('request'))
 
 # alias for RecursiveCategorySerializer
 CategorySerializer = RecursiveCategorySerializer
@@ -98,7 +91,10 @@ class ProductSerializer(serializers.ModelSerializer):
         write_only=True # Chỉ dùng cho input, không hiển thị trong output
     )
     category_id = serializers.IntegerField(write_only=True, required=False)
-    stock = serializers.SerializerMethodField(read_only=True)
+    # Tổng tồn kho đã được denormalize vào Product.total_stock, không cần aggregate theo từng sản phẩm
+    stock = serializers.IntegerField(source='total_stock', read_only=True)
+    # Ảnh responsive {original, ready, src, srcset}, fallback về ảnh gốc khi chưa sinh xong
+    images = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Product
@@ -112,9 +108,11 @@ class ProductSerializer(serializers.ModelSerializer):
             'cost_price',
             'price',
             'sale_price',
+            'effective_price',  # Read-only: giá khách thực trả (cột do database tính)
             'is_published',
             'publish_at',
             'image_url',        # Đảm bảo URL đầy đủ được tạo (cần 'request' trong context)
+            'images',           # Read-only: renditions WebP/JPEG + srcset
             'category_id',      # ID của category (để tạo mới hoặc cập nhật)
             'stock',            # Read-only field for total stock
             # Loại bỏ 'variants', 'categories', 'category_details'
@@ -127,13 +125,9 @@ class ProductSerializer(serializers.ModelSerializer):
             'stock',            # Mark stock as read-only
         )
         # Không cần write_only_fields vì đã đặt write_only=True trên field 'supplier'
-    def validate_image_url(self, value):
-        return convert_image_to_jpeg(value)
-    def get_stock(self, obj):
-        """
-        Calculate the total stock by summing up the stock of all related ProductVariant instances.
-        """
-        return obj.variants.aggregate(total_stock=Sum('stock'))['total_stock'] or 0
+    def get_images(self, obj: Product):
+        # Ảnh upload được lưu nguyên bản; renditions được sinh bất đồng bộ (product.tasks.generate_image_renditions)
+        return ProductImageService.build_image_set(obj.image_url, obj.image_renditions, self.context.get('request'))
 
 class ProductVariantSerializer(serializers.ModelSerializer):
     # --- Xử lý Product (Nested Read, ID Write) ---
@@ -144,6 +138,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
     # --- Xử lý Size (Nested Read, ID Write) ---
     size_details = SizeSerializer(source='size', read_only=True, allow_null=True)
     product_details = ProductSerializer(source='product', read_only=True)
+    images = serializers.SerializerMethodField(read_only=True)
     class Meta:
         model = ProductVariant
         fields = [
@@ -157,6 +152,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             'sku',
             'stock',            # Số lượng tồn kho thực tế
             'image_url',        # Đảm bảo URL đầy đủ (cần context request)
+            'images',           # Read-only: renditions WebP/JPEG + srcset
             'weight_grams',
             'is_active',
             'created_at',
@@ -179,3 +175,89 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             )
         ]
 
+    def get_images(self, obj: ProductVariant):
+        return ProductImageService.build_image_set(obj.image_url, obj.image_renditions, self.context.get('request'))
+
+
+
+class VariantMatrixSerializer(serializers.BaseSerializer):
+    """
+    Ma trận biến thể của một Product (chỉ đọc):
+    thông tin sản phẩm một lần, trục 'sizes', trục 'colors' và lưới grid[color][size]
+    gồm {variant_id, sku, stock, image, is_active}, None nếu không có biến thể tương ứng.
+    Toàn bộ dựng từ một truy vấn select_related('size', 'color').
+    context['include_product'] = False để bỏ phần product (ví dụ trong giỏ hàng).
+    context['variants_by_product'] = {product_id: [variant, ...]} để dùng biến thể đã nạp sẵn
+    (đã select_related size, color) thay vì truy vấn theo từng sản phẩm.
+    """
+
+    def to_representation(self, product: Product):
+        request = self.context.get('request')
+        preloaded = self.context.get('variants_by_product')
+        if preloaded is not None:
+            variants = sorted(preloaded.get(product.pk, []), key=lambda v: (v.color_id or 0, v.size_id or 0, v.pk))
+        else:
+            variants = product.variants.select_related('size', 'color').order_by('color_id', 'size_id', 'pk')
+
+        sizes, colors, cells = {}, {}, {}
+        for variant in variants:
+            sizes.setdefault(variant.size_id, variant.size)
+            colors.setdefault(variant.color_id, variant.color)
+            # Trùng (color, size) thì giữ biến thể đầu tiên
+            cells.setdefault((variant.color_id, variant.size_id), variant)
+
+        size_ids = sorted(sizes, key=lambda pk: (pk is None, pk or 0))
+        color_ids = sorted(colors, key=lambda pk: (pk is None, pk or 0))
+
+        def image(variant: ProductVariant):
+            if not variant.image_url:
+                return None
+            url = variant.image_url.url
+            return request.build_absolute_uri(url) if request is not None else url
+
+        def cell(variant: Optional[ProductVariant]):
+            if variant is None:
+                return None
+            return {
+                'variant_id': variant.id,
+                'sku': variant.sku,
+                'stock': variant.stock,
+                'image': image(variant),
+                'is_active': variant.is_active,
+            }
+
+        data = {}
+        if self.context.get('include_product', True):
+            data['product'] = ProductSerializer(product, context=self.context).data
+        data['sizes'] = [
+            SizeSerializer(sizes[pk]).data if pk is not None else {'id': None, 'name': None, 'description': None}
+            for pk in size_ids
+        ]
+        data['colors'] = [
+            ColorSerializer(colors[pk]).data if pk is not None else {'id': None, 'name': None, 'hex_code': None, 'description': None}
+            for pk in color_ids
+        ]
+        data['grid'] = [
+            [cell(cells.get((color_id, size_id))) for size_id in size_ids]
+            for color_id in color_ids
+        ]
+        return data
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Tiến trình xóa nền (chỉ đọc)."""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeletionJob
+        fields = [
+            'id', 'kind', 'object_id', 'object_repr', 'status',
+            'total_products', 'deleted_products', 'released_files', 'progress',
+            'error', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, obj: DeletionJob) -> float:
+        if not obj.total_products:
+            return 1.0 if obj.status == 'completed' else 0.0
+        return round(min(obj.deleted_products / obj.total_products, 1.0), 4)
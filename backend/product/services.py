@@ -1,42 +1,143 @@
 import logging
 import re  # Import for hex code validation
-from typing import List, Dict, Any, Optional, Union
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from typing import List, Dict, Any, Iterable, Optional, Union
 
 from django.db import transaction, IntegrityError
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.utils.text import slugify
 from django.utils import timezone
-from django.db.models import QuerySet, Q, Model
+from django.db.models import QuerySet, Q, F, Model, OuterRef, Subquery, Sum, Count
+from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from core.caching import get_version, bump_version_on_commit
 from decimal import Decimal
-from product.enums import SupplierStatus
+from product.enums import DeletionJobKind, DeletionJobStatus, SupplierStatus
 from product.models import (
-    Supplier, Product, Category, ProductCategory, Size, Color, ProductVariant
+    Supplier, Product, Category, ProductCategory, Size, Color, ProductVariant, DeletionJob
 )
+from product.caching import ProductDetailCache
+from product.images import ProductImageService
+from product.lookups import colors as color_lookup, sizes as size_lookup
+from product.search import ProductSearchIndex, fold_diacritics
+from product.signals import muted_product_signals
+from product.storage import ContentAddressedStorage, product_media_storage
+from product.tasks import run_deletion_job
 
 logger = logging.getLogger(__name__)
 
-def _generate_unique_slug(model_class: type[Model], base_name: str, instance_pk: Optional[int] = None) -> str:
+
+def _parse_price(value: Any, name: str) -> int:
+    try:
+        price = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name} value. Must be an integer.")
+    if price < 0:
+        raise ValueError(f"{name} must not be negative.")
+    return price
+
+SLUG_MAX_ATTEMPTS = 3
+# Số slug gốc gộp trong một truy vấn khi cấp phát hàng loạt
+SLUG_PREFIX_BATCH_SIZE = 100
+
+
+def _base_slug(model_class: type[Model], base_name: str) -> str:
+    """Slug gốc từ base_name, bỏ dấu tiếng Việt trước ('Đồ' -> 'do' thay vì 'o')."""
+    slug = slugify(fold_diacritics(base_name or ''))
+    if not slug: # Xử lý trường hợp tên rỗng hoặc slugify trả về chuỗi rỗng
+        slug = model_class.__name__.lower()
+    # Chừa chỗ cho hậu tố '-<số>'
+    max_length = model_class._meta.get_field('slug').max_length
+    return slug[:max_length - 11].rstrip('-') or model_class.__name__.lower()
+
+
+def allocate_unique_slugs(model_class: type[Model], base_names: List[str], instance_pk: Optional[int] = None) -> List[str]:
     """
-    Tạo slug duy nhất cho một model dựa trên base_name.
+    Cấp phát slug duy nhất cho nhiều tên cùng lúc, theo đúng thứ tự base_names.
+    Các slug đã tồn tại dạng base hoặc base-<số> được nạp bằng một truy vấn (gộp theo lô),
+    hậu tố trống tiếp theo được chọn trong bộ nhớ; các tên trùng nhau trong lô nhận hậu tố khác nhau.
     Loại trừ instance_pk nếu được cung cấp (dùng khi update).
     """
-    if not base_name: # Xử lý trường hợp tên rỗng
-        base_name = model_class.__name__.lower()
-
-    slug = slugify(base_name)
-    if not slug: # Xử lý trường hợp slugify trả về chuỗi rỗng
-        slug = model_class.__name__.lower()
+    bases = [_base_slug(model_class, name) for name in base_names]
+    unique_bases = list(dict.fromkeys(bases))
 
-    original_slug = slug
-    counter = 1
-    queryset = model_class.objects.all()
+    # _base_manager: gồm cả bản ghi đã xóa mềm nhưng chưa bị xóa thật (slug vẫn còn trong database)
+    queryset = model_class._base_manager.all()
     if instance_pk:
         queryset = queryset.exclude(pk=instance_pk)
 
-    while queryset.filter(slug=slug).exists():
-        slug = f'{original_slug}-{counter}'
-        counter += 1
-    return slug
+    taken = set()
+    for start in range(0, len(unique_bases), SLUG_PREFIX_BATCH_SIZE):
+        condition = Q()
+        for base in unique_bases[start:start + SLUG_PREFIX_BATCH_SIZE]:
+            # startswith dùng được index của slug; regex chỉ giữ base và base-<số>, không nạp các slug
+            # chỉ trùng tiền tố ('ao' không nạp cả 'ao-thun-...')
+            condition |= Q(slug__startswith=base, slug__regex=rf'^{re.escape(base)}(-[0-9]+)?$')
+        taken.update(queryset.filter(condition).values_list('slug', flat=True))
+
+    next_counter: Dict[str, int] = {}
+    slugs = []
+    for base in bases:
+        slug = base
+        if slug in taken:
+            counter = next_counter.get(base, 1)
+            while f'{base}-{counter}' in taken:
+                counter += 1
+            slug = f'{base}-{counter}'
+            next_counter[base] = counter + 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def _generate_unique_slug(model_class: type[Model], base_name: str, instance_pk: Optional[int] = None) -> str:
+    """
+    Tạo slug duy nhất cho một model dựa trên base_name.
+    Loại trừ instance_pk nếu được cung cấp (dùng khi update).
+    """
+    return allocate_unique_slugs(model_class, [base_name], instance_pk)[0]
+
+
+def create_with_unique_slug(model_class: type[Model], data: Dict[str, Any], base_name: str) -> Model:
+    """
+    Tạo bản ghi với slug duy nhất, cấp phát lại slug nếu request khác chiếm slug trước (unique constraint).
+    Mỗi lần thử chạy trong savepoint để transaction bên ngoài vẫn dùng được sau IntegrityError.
+    """
+    for attempt in range(1, SLUG_MAX_ATTEMPTS + 1):
+        data['slug'] = _generate_unique_slug(model_class, base_name)
+        try:
+            with transaction.atomic():
+                return model_class.objects.create(**data)
+        except IntegrityError:
+            slug_taken = model_class._base_manager.filter(slug=data['slug']).exists()
+            if not slug_taken or attempt == SLUG_MAX_ATTEMPTS:
+                raise
+            logger.warning(f"Slug '{data['slug']}' was taken concurrently for {model_class.__name__}, retrying ({attempt}/{SLUG_MAX_ATTEMPTS}).")
+
+def refresh_product_total_stock(product_ids: Iterable[int]) -> int:
+    """
+    Tính lại Product.total_stock từ tổng stock của các biến thể.
+    Chạy một câu UPDATE duy nhất cho toàn bộ product_ids, trả về số sản phẩm được cập nhật.
+    """
+    product_ids = {pk for pk in product_ids if pk}
+    if not product_ids:
+        return 0
+    variant_stock = (
+        ProductVariant.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('stock'))
+        .values('total')
+    )
+    updated_count = Product.objects.filter(pk__in=product_ids).update(
+        total_stock=Coalesce(Subquery(variant_stock), 0)
+    )
+    # update() không phát signal, tự vô hiệu hóa cache chi tiết (stock hiển thị trên trang sản phẩm)
+    ProductDetailCache.invalidate(product_ids)
+    return updated_count
 
 def generate_sku(product_name, size_name, color_name):
     """
@@ -46,142 +147,6 @@ def generate_sku(product_name, size_name, color_name):
     size_slug = slugify(size_name)[:5].upper() if size_name else "NOSIZE"
     color_slug = slugify(color_name)[:5].upper() if color_name else "NOCOLOR"
     return f"{product_slug}-{size_slug}-{color_slug}"
-class ProductVariantService:
-
-    @staticmethod
-    @transaction.atomic
-    def create_product_variant_with_attributes(data: Dict[str, Any]) -> List[ProductVariant]:
-        """
-        Service to create product variants with attributes.
-        - size_names: Comma-separated string of sizes.
-        - color_name: Uppercase string for color name.
-        - hex_code: String in the format "#RRGGBB".
-        - stock: Positive integer for stock.
-        - weight_grams: Decimal value for weight in grams.
-        """
-        # Validate hex code format
-        hex_code = data.get('hex_code')
-        color_name = data.get('color_name')
-        size_names = data.get('size_names')
-        stock = data.get('stock')
-        weight_grams = data.get('weight_grams')
-        image_url = data.get('image_url')
-        product = data.get('product')
-
-        if not re.match(r"^#[0-9A-Fa-f]{6}$", hex_code):
-            raise ValueError("Invalid hex code format. Must be in the format '#RRGGBB'.")
-
-        # Ensure color exists or create it
-        color = None
-        if color_name:
-            color_name = color_name.upper()
-            color, _ = Color.objects.get_or_create(name=color_name, hex_code=hex_code)
-
-        # Process size names
-        if not size_names:
-            raise ValueError("At least one valid size must be provided.")
-        size_names = [name.upper() for name in size_names]
-        created_variants = []
-
-        if product:
-            product = Product.objects.get(pk=product)  # Ensure product exists
-        for size_name in size_names:
-            # Ensure size exists or create it
-            size, _ = Size.objects.get_or_create(name=size_name)
-
-            # Generate SKU
-            sku = generate_sku(product.name, size.name, color.name if color else None)
-
-            # Create the product variant
-            variant = ProductVariant.objects.create(
-                product=product,
-                size=size,
-                color=color,
-                sku=sku,
-                stock=stock,
-                weight_grams=weight_grams,
-                image_url=image_url,
-            )
-            created_variants.append(variant)
-
-        return created_variants
-
-# --- Size Services ---
-
-    @staticmethod
-    @transaction.atomic
-    def get_or_create_size(name: str) -> Size:
-        """Tìm hoặc tạo mới Size dựa trên tên (case-insensitive)."""
-        if not name:
-            raise ValueError("Size name cannot be empty.")
-        normalized_name = name.strip().upper()  # Normalize and uppercase
-        if not normalized_name:
-            raise ValueError("Size name cannot be empty after stripping whitespace.")
-
-        try:
-            size, created = Size.objects.get_or_create(
-                name__iexact=normalized_name,
-                defaults={'name': normalized_name}
-            )
-            if created:
-                logger.info(f"Created new Size: '{normalized_name}' with ID: {size.pk}")
-                size.updated_at = timezone.now()
-                size.save(update_fields=['updated_at'])
-            return size
-        except Exception as e:
-            logger.error(f"Error in get_or_create_size: {e}", exc_info=True)
-            raise RuntimeError("An unexpected error occurred while processing the size.") from e
-
-# --- Color Services ---
-
-    @staticmethod
-    @transaction.atomic
-    def get_or_create_color(name: str, hex_code: Optional[str] = None) -> Color:
-        """Tìm hoặc tạo mới Color dựa trên tên (case-insensitive) và mã hex."""
-        if not name:
-            raise ValueError("Color name cannot be empty.")
-        normalized_name = name.strip().upper()
-        if not normalized_name:
-            raise ValueError("Color name cannot be empty after stripping whitespace.")
-
-        normalized_hex = None
-        if hex_code:
-            h = str(hex_code).strip().lstrip('#')
-            if len(h) in (3, 6):
-                try:
-                    int(h, 16)
-                    normalized_hex = f"#{h.upper()}"
-                except ValueError:
-                    logger.warning(f"Invalid hex code format provided: '{hex_code}'. Ignoring.")
-            else:
-                logger.warning(f"Invalid hex code length provided: '{hex_code}'. Ignoring.")
-
-        try:
-            color, created = Color.objects.get_or_create(
-                name__iexact=normalized_name,
-                defaults={
-                    'name': normalized_name,
-                    'hex_code': normalized_hex or '#FFFFFF'
-                }
-            )
-            updated_fields = []
-            if not created and normalized_hex and color.hex_code != normalized_hex:
-                color.hex_code = normalized_hex
-                updated_fields.append('hex_code')
-                logger.info(f"Updated hex code for Color '{normalized_name}' to {normalized_hex}")
-
-            if created:
-                logger.info(f"Created new Color: '{normalized_name}' with ID: {color.pk}")
-                updated_fields.append('updated_at')
-
-            if updated_fields or created:
-                color.updated_at = timezone.now()
-                color.save(update_fields=updated_fields)
-
-            return color
-        except Exception as e:
-            logger.error(f"Error in get_or_create_color: {e}", exc_info=True)
-            raise RuntimeError("An unexpected error occurred while processing the color.") from e
 
 # --- Supplier Services ---
 
@@ -240,16 +205,13 @@ class SupplierService:
 
     @staticmethod
     @transaction.atomic
-    def delete_supplier(supplier_id: int) -> bool:
-        """Delete a Supplier."""
+    def delete_supplier(supplier_id: int) -> Optional[DeletionJob]:
+        """
+        Xóa mềm Supplier cùng các Product của nó; việc xóa thật chạy nền theo lô.
+        Trả về DeletionJob để theo dõi tiến trình, None nếu không tìm thấy.
+        """
         try:
-            supplier = Supplier.objects.get(pk=supplier_id)
-            supplier.delete()
-            logger.info(f"Supplier '{supplier.company_name}' deleted.")
-            return True
-        except ObjectDoesNotExist:
-            logger.warning(f"Supplier with ID {supplier_id} not found.")
-            return False
+            return DeletionService.soft_delete_supplier(supplier_id)
         except Exception as e:
             logger.error(f"Error deleting supplier {supplier_id}: {e}", exc_info=True)
             raise RuntimeError("Could not delete supplier.") from e
@@ -270,19 +232,16 @@ class CategoryService:
             # Mặc dù serializer đã validate, kiểm tra lại ở service là không thừa
             raise ValueError("Category name is required.")
 
-        # Tạo slug duy nhất
-        slug = _generate_unique_slug(Category, name) # Giả sử hàm này tồn tại và đúng
-        validated_data['slug'] = slug # Gán slug vào validated_data
-
         try:
-            # Tạo category trực tiếp từ validated_data
-            category = Category.objects.create(**validated_data)
+            # Tạo category trực tiếp từ validated_data, slug duy nhất được cấp phát khi tạo
+            category = create_with_unique_slug(Category, validated_data, name)
+            CategoryTreeService.invalidate()
             logger.info(f"Category '{category.name}' created with ID: {category.pk}, Slug: {category.slug}")
             return category
         except IntegrityError as e:
             logger.error(f"Integrity error creating category '{name}': {e}. Data: {validated_data}", exc_info=True)
             if 'slug' in str(e).lower():
-                raise ValueError(f"Category slug '{slug}' might already exist.")
+                raise ValueError(f"Category slug '{validated_data.get('slug')}' might already exist.")
             raise ValueError(f"Could not create category due to a database constraint: {e}")
         except Exception as e:
             logger.error(f"Error creating category '{name}': {e}. Data: {validated_data}", exc_info=True)
@@ -335,6 +294,7 @@ class CategoryService:
             category.updated_at = timezone.now()
             try:
                 category.save()
+                CategoryTreeService.invalidate()
                 logger.info(f"Category {category_id} updated.")
             except Exception as e:
                 logger.error(f"Error updating category {category_id}: {e}", exc_info=True)
@@ -350,7 +310,7 @@ class CategoryService:
     def get_category_by_id(category_id: int) -> Optional[Category]:
         """Lấy Category theo ID."""
         try:
-            return Category.objects.select_related('parent').prefetch_related('subcategories').get(pk=category_id)
+            return Category.objects.select_related('parent').get(pk=category_id)
         except ObjectDoesNotExist:
             return None
 
@@ -358,7 +318,7 @@ class CategoryService:
     @transaction.atomic
     def list_categories(filters: Optional[Dict[str, Any]] = None) -> QuerySet[Category]:
         """Liệt kê Categories với bộ lọc."""
-        queryset = Category.objects.select_related('parent').prefetch_related('subcategories').all()
+        queryset = Category.objects.select_related('parent').all()
         if filters:
             parent_id = filters.get('parent_id')
             search = filters.get('search')
@@ -394,6 +354,7 @@ class CategoryService:
             category = Category.objects.get(pk=category_id)
             category_name = category.name
             category.delete()
+            CategoryTreeService.invalidate()
             logger.info(f"Category '{category_name}' (ID: {category_id}) deleted.")
             return True
         except ObjectDoesNotExist:
@@ -456,10 +417,223 @@ class CategoryService:
             try:
                 ProductCategory.objects.bulk_create(categories_to_assign, ignore_conflicts=True)
                 logger.info(f"Assigned {len(categories_to_assign)} categories to Product ID {product.pk}.")
+                # bulk_create không phát signal post_save
+                ProductSearchIndex.schedule_reindex([product.pk])
+                ProductDetailCache.invalidate([product.pk])
             except Exception as e:
                 logger.error(f"Error bulk creating ProductCategory for Product ID {product.pk}: {e}", exc_info=True)
                 raise RuntimeError("Could not assign categories to product.") from e
 
+# --- Category Tree Cache ---
+class CategoryTreeService:
+    """
+    Cây danh mục được nạp từ bảng category bằng MỘT truy vấn và cache theo phiên bản:
+    - Tầng 1: bộ nhớ của process, hợp lệ khi phiên bản khớp với phiên bản trong Redis.
+    - Tầng 2: Redis (django cache), dùng chung giữa các worker.
+    CategoryService.create/update/delete_category tăng phiên bản sau khi commit.
+    """
+    VERSION_KEY = 'category_tree:version'
+    CACHE_TIMEOUT = 60 * 60  # giây
+    # (version, loaded_at, index) của process hiện tại
+    _local = (None, 0.0, None)
+
+    @staticmethod
+    def _cache_key(version: int) -> str:
+        return f'category_tree:{version}'
+
+    @staticmethod
+    def _build_index() -> Dict[str, Any]:
+        """Nạp toàn bộ category và dựng chỉ mục parent -> children."""
+        rows = Category.objects.order_by('name', 'pk').values(
+            'id', 'name', 'slug', 'description', 'image_url', 'parent_id'
+        )
+        nodes: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            nodes[row['id']] = {
+                'id': row['id'],
+                'name': row['name'],
+                'slug': row['slug'],
+                'description': row['description'],
+                'image_url': default_storage.url(row['image_url']) if row['image_url'] else None,
+                'parent': row['parent_id'],
+                'children': [],
+            }
+        roots = []
+        for node in nodes.values():  # Giữ thứ tự theo name
+            parent = nodes.get(node['parent'])
+            if parent is not None:
+                parent['children'].append(node['id'])
+            else:
+                roots.append(node['id'])
+        return {'roots': roots, 'nodes': nodes}
+
+    @classmethod
+    def get_index(cls) -> Dict[str, Any]:
+        """Trả về chỉ mục cây danh mục, nạp lại khi phiên bản thay đổi."""
+        version = get_version(cls.VERSION_KEY)
+        local_version, loaded_at, index = cls._local
+        if index is not None and local_version == version and time.monotonic() - loaded_at < cls.CACHE_TIMEOUT:
+            return index
+
+        key = cls._cache_key(version)
+        index = cache.get(key)
+        if index is None:
+            index = cls._build_index()
+            cache.set(key, index, timeout=cls.CACHE_TIMEOUT)
+        cls._local = (version, time.monotonic(), index)
+        return index
+
+    @staticmethod
+    def _render(index: Dict[str, Any], node_ids: List[int], request=None, seen: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Dựng cấu trúc lồng nhau giống RecursiveCategorySerializer."""
+        if seen is None:
+            seen = set()
+        result = []
+        for node_id in node_ids:
+            if node_id in seen:  # Phòng trường hợp dữ liệu parent bị vòng
+                continue
+            seen.add(node_id)
+            node = index['nodes'][node_id]
+            image_url = node['image_url']
+            if image_url and request is not None:
+                image_url = request.build_absolute_uri(image_url)
+            result.append({
+                'id': node['id'],
+                'name': node['name'],
+                'slug': node['slug'],
+                'description': node['description'],
+                'image_url': image_url,
+                'subcategories': CategoryTreeService._render(index, node['children'], request, seen),
+                'parent': node['parent'],
+            })
+        return result
+
+    @classmethod
+    def get_tree(cls, request=None) -> List[Dict[str, Any]]:
+        """Toàn bộ cây danh mục bắt đầu từ các category gốc."""
+        index = cls.get_index()
+        return cls._render(index, index['roots'], request)
+
+    @classmethod
+    def get_subcategories(cls, category_id: int, request=None) -> List[Dict[str, Any]]:
+        """Cây con (các subcategories lồng nhau) của một category."""
+        index = cls.get_index()
+        node = index['nodes'].get(category_id)
+        if node is None:
+            return []
+        return cls._render(index, node['children'], request, seen={category_id})
+
+    @classmethod
+    def invalidate(cls) -> None:
+        bump_version_on_commit(cls.VERSION_KEY)
+
+# --- Product Category Paths (breadcrumb) ---
+class ProductCategoryPathService:
+    """
+    Đường dẫn danh mục gốc -> lá của một sản phẩm (breadcrumb).
+    Lấy các category được gán bằng MỘT truy vấn ProductCategory, tổ tiên lấy từ cây danh mục đã cache
+    (CategoryTreeService). Kết quả được cache theo sản phẩm và hợp lệ khi phiên bản cây danh mục
+    và phiên bản sản phẩm (ProductDetailCache, tăng khi assign_product_categories chạy) không đổi.
+    """
+    CACHE_TIMEOUT = 60 * 60  # giây
+
+    @staticmethod
+    def _build_paths(index: Dict[str, Any], category_ids: Iterable[int]) -> List[List[int]]:
+        nodes = index['nodes']
+        assigned = {pk for pk in category_ids if pk in nodes}
+
+        def chain(category_id: int) -> List[int]:
+            path, seen = [], set()
+            while category_id in nodes and category_id not in seen:  # Phòng dữ liệu parent bị vòng
+                seen.add(category_id)
+                path.append(category_id)
+                category_id = nodes[category_id]['parent']
+            return path[::-1]
+
+        chains = {pk: chain(pk) for pk in assigned}
+        # Bỏ các category chỉ là tổ tiên của category khác đã được gán
+        ancestors = {pk for path in chains.values() for pk in path[:-1]}
+        return sorted(path for pk, path in chains.items() if pk not in ancestors)
+
+    @staticmethod
+    def _render_node(node: Dict[str, Any], request=None) -> Dict[str, Any]:
+        image_url = node['image_url']
+        if image_url and request is not None:
+            image_url = request.build_absolute_uri(image_url)
+        return {
+            'id': node['id'],
+            'name': node['name'],
+            'slug': node['slug'],
+            'description': node['description'],
+            'image_url': image_url,
+            'parent': node['parent'],
+        }
+
+    @staticmethod
+    def get_paths(product_id: Optional[int] = None, slug: Optional[str] = None, request=None) -> Optional[Dict[str, Any]]:
+        """
+        Trả về {'product': id, 'paths': [[root, ..., leaf], ...]}.
+        None nếu sản phẩm không tồn tại hoặc chưa được gán danh mục.
+        """
+        lookup = {'product_id': product_id} if product_id is not None else {'product__slug': slug}
+        key = f'product_category_paths:id:{product_id}' if product_id is not None else f'product_category_paths:slug:{slug}'
+        tree_version = get_version(CategoryTreeService.VERSION_KEY)
+
+        entry = cache.get(key)
+        if (
+            entry is None
+            or entry['tree_version'] != tree_version
+            or entry['product_version'] != get_version(ProductDetailCache.version_key(entry['product_id']))
+        ):
+            rows = list(ProductCategory.objects.filter(**lookup).values_list('product_id', 'category_id'))
+            if not rows:
+                return None
+            found_product_id = rows[0][0]
+            index = CategoryTreeService.get_index()
+            entry = {
+                'product_id': found_product_id,
+                'tree_version': tree_version,
+                'product_version': get_version(ProductDetailCache.version_key(found_product_id)),
+                'paths': ProductCategoryPathService._build_paths(index, [category_id for _, category_id in rows]),
+            }
+            cache.set(key, entry, timeout=ProductCategoryPathService.CACHE_TIMEOUT)
+        else:
+            index = CategoryTreeService.get_index()
+
+        nodes = index['nodes']
+        return {
+            'product': entry['product_id'],
+            'paths': [
+                [ProductCategoryPathService._render_node(nodes[pk], request) for pk in path if pk in nodes]
+                for path in entry['paths']
+            ],
+        }
+
+    @staticmethod
+    def get_primary_category(product_id: Optional[int] = None, slug: Optional[str] = None, request=None) -> Optional[Dict[str, Any]]:
+        """
+        Category gốc đầu tiên của sản phẩm kèm các category con trực tiếp trên đường dẫn của nó
+        (định dạng của ProductCategoriesAPIView / ProductCategoriesBySlugAPIView).
+        """
+        data = ProductCategoryPathService.get_paths(product_id=product_id, slug=slug, request=request)
+        if not data or not data['paths']:
+            return None
+        paths = data['paths']
+        root = paths[0][0]
+        subcategories = []
+        for path in paths:
+            if path[0]['id'] == root['id'] and len(path) > 1 and path[1] not in subcategories:
+                subcategories.append(path[1])
+        return {
+            'id': root['id'],
+            'name': root['name'],
+            'slug': root['slug'],
+            'description': root['description'],
+            'image_url': root['image_url'],
+            'subcategories': subcategories,
+            'parent': root['parent'],
+        }
+
 # --- Product Services ---
 
 class ProductService:
@@ -522,6 +696,9 @@ class ProductService:
             [ProductCategory(product=product, category=category) for category in valid_categories],
             ignore_conflicts=True
         )
+        # bulk_create không phát signal post_save
+        ProductSearchIndex.schedule_reindex([product.pk])
+        ProductDetailCache.invalidate([product.pk])
 
     @staticmethod
     def get_product_by_id(product_id: int) -> Optional[Product]:
@@ -534,29 +711,62 @@ class ProductService:
     @staticmethod
     def list_products(filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> QuerySet[Product]:
         """List products with optional filters."""
-        queryset = Product.objects.all()
+        # supplier_details được serialize cho mỗi sản phẩm, tránh N+1 truy vấn
+        queryset = Product.objects.select_related('supplier')
         if filters:
             if 'is_published' in filters:
                 queryset = queryset.filter(is_published=filters['is_published'])
             else:
                 queryset = queryset.filter(is_published=True)
-            if 'category_id' in filters:
-                queryset = queryset.filter(product_categories__category_id=filters['category_id']).distinct()
+            if 'supplier_id' in filters:
+                queryset = queryset.filter(supplier_id=filters['supplier_id'])
             if 'search' in filters:
-                queryset = queryset.filter(name__icontains=filters['search'])
+                # Xếp theo điểm BM25 (search_rank), chỉ trên các sản phẩm thỏa các bộ lọc khác
+                ranked = ProductSearchIndex.rank(queryset, filters['search'])
+                if ranked is None:
+                    # Chỉ mục chưa được xây dựng (manage.py rebuild_search_index)
+                    queryset = queryset.filter(name__icontains=filters['search'])
+                else:
+                    queryset = ranked
+            queryset = ProductService.apply_facet_filters(queryset, filters)
         # Remove slicing here; it will be applied in the view
         return queryset
 
+    @staticmethod
+    def apply_facet_filters(queryset: QuerySet[Product], filters: Dict[str, Any], skip: Optional[str] = None) -> QuerySet[Product]:
+        """
+        Áp dụng các bộ lọc thuộc tính (category, size, color, price).
+        skip: bỏ qua một chiều lọc, dùng khi tính facet cho chính chiều đó (xem ProductFacetService).
+        Lọc bằng subquery thay vì JOIN nên không cần distinct().
+        """
+        if skip != 'category' and filters.get('category_id'):
+            queryset = queryset.filter(
+                pk__in=ProductCategory.objects.filter(category_id=filters['category_id']).values('product_id')
+            )
+        if skip != 'size' and filters.get('size_ids'):
+            queryset = queryset.filter(
+                pk__in=ProductVariant.objects.filter(size_id__in=filters['size_ids'], is_active=True).values('product_id')
+            )
+        if skip != 'color' and filters.get('color_ids'):
+            queryset = queryset.filter(
+                pk__in=ProductVariant.objects.filter(color_id__in=filters['color_ids'], is_active=True).values('product_id')
+            )
+        if skip != 'price':
+            # Product.effective_price là cột có index (is_published, effective_price, id)
+            if filters.get('min_price') is not None:
+                queryset = queryset.filter(effective_price__gte=_parse_price(filters['min_price'], 'min_price'))
+            if filters.get('max_price') is not None:
+                queryset = queryset.filter(effective_price__lte=_parse_price(filters['max_price'], 'max_price'))
+        return queryset
+
     @staticmethod
     @transaction.atomic
     def create_product(data: Dict[str, Any]) -> Product:
         """Tạo Product và gán categories từ category_id trong data."""
         category_id = data.pop('category_id')
 
-        slug = _generate_unique_slug(Product, data.get('name', ''))
-        data['slug'] = slug
         try:
-            product = Product.objects.create(**data)
+            product = create_with_unique_slug(Product, data, data.get('name', ''))
             logger.info(f"Product '{product.name}' created with ID: {product.pk}")
         except IntegrityError as e:
             logger.warning(f"Failed to create product. Data: {data}. Error: {e}")
@@ -583,17 +793,13 @@ class ProductService:
 
     @staticmethod
     @transaction.atomic
-    def delete_product(product_id: int) -> bool:
-        """Xóa Product."""
+    def delete_product(product_id: int) -> Optional[DeletionJob]:
+        """
+        Xóa mềm Product (ẩn ngay lập tức); biến thể, liên kết danh mục và ảnh được xóa nền.
+        Trả về DeletionJob để theo dõi tiến trình, None nếu không tìm thấy.
+        """
         try:
-            product = Product.objects.get(pk=product_id)
-            product_name = product.name
-            product.delete()
-            logger.info(f"Product '{product_name}' (ID: {product_id}) deleted.")
-            return True
-        except ObjectDoesNotExist:
-            logger.warning(f"Attempted to delete non-existent Product with ID: {product_id}")
-            return False
+            return DeletionService.soft_delete_product(product_id)
         except Exception as e:
             logger.error(f"Error deleting product {product_id}: {e}", exc_info=True)
             raise RuntimeError(f"Could not delete product {product_id}.") from e
@@ -609,6 +815,83 @@ class ProductService:
         except Exception as e:
             logger.error(f"Error retrieving product by slug '{slug}': {e}", exc_info=True)
             raise RuntimeError(f"Could not retrieve product with slug '{slug}'.") from e
+
+# --- Product Facets ---
+
+class ProductFacetService:
+    """
+    Đếm số sản phẩm theo size, color, category và khoảng giá cho bộ lọc sidebar.
+    Facet kiểu disjunctive: số đếm của một chiều áp dụng mọi bộ lọc trừ chính chiều đó,
+    nên chọn "size M" vẫn thấy số lượng của các size khác. Luôn tốn 4 truy vấn GROUP BY.
+    """
+    # Khoảng giá (VND), cận trên không bao gồm; None là không giới hạn
+    PRICE_BUCKETS = [
+        (0, 100000),
+        (100000, 200000),
+        (200000, 500000),
+        (500000, 1000000),
+        (1000000, None),
+    ]
+
+    @staticmethod
+    def get_facets(filters: Dict[str, Any]) -> Dict[str, Any]:
+        # Bộ lọc không phải facet (published, supplier, search) chỉ được tính một lần
+        base_filters = {k: v for k, v in filters.items() if k in ('is_published', 'supplier_id', 'search')}
+        base_filters.setdefault('is_published', True)
+        base = ProductService.list_products(filters=base_filters).order_by()
+
+        def product_ids(skip: str):
+            return ProductService.apply_facet_filters(base, filters, skip=skip).values('pk')
+
+        sizes = (
+            ProductVariant.objects.filter(product_id__in=product_ids('size'), is_active=True, size__isnull=False)
+            .values('size_id', 'size__name')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by('size_id')
+        )
+        colors = (
+            ProductVariant.objects.filter(product_id__in=product_ids('color'), is_active=True, color__isnull=False)
+            .values('color_id', 'color__name', 'color__hex_code')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by('color_id')
+        )
+        categories = (
+            ProductCategory.objects.filter(product_id__in=product_ids('category'))
+            .values('category_id', 'category__name', 'category__parent_id')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by('category_id')
+        )
+
+        price_aggregates = {}
+        for index, (low, high) in enumerate(ProductFacetService.PRICE_BUCKETS):
+            condition = Q(effective_price__gte=low)
+            if high is not None:
+                condition &= Q(effective_price__lt=high)
+            price_aggregates[f'bucket_{index}'] = Count('pk', filter=condition)
+        price_counts = (
+            ProductService.apply_facet_filters(base, filters, skip='price')
+            .aggregate(**price_aggregates)
+        )
+
+        return {
+            'sizes': [
+                {'id': row['size_id'], 'name': row['size__name'], 'count': row['count']}
+                for row in sizes
+            ],
+            'colors': [
+                {'id': row['color_id'], 'name': row['color__name'], 'hex_code': row['color__hex_code'], 'count': row['count']}
+                for row in colors
+            ],
+            'categories': [
+                {'id': row['category_id'], 'name': row['category__name'], 'parent': row['category__parent_id'], 'count': row['count']}
+                for row in categories
+            ],
+            'price_ranges': [
+                {'min': low, 'max': high, 'count': price_counts[f'bucket_{index}']}
+                for index, (low, high) in enumerate(ProductFacetService.PRICE_BUCKETS)
+            ],
+        }
+
 # --- Product Variant Services ---
 
 class ProductVariantService:
@@ -622,9 +905,9 @@ class ProductVariantService:
             product = data.get('product')
 
             if size and isinstance(size, str):
-                size = Size.objects.get_or_create(name=size.upper())[0]
+                size = size_lookup.get(name=size) or Size.objects.get_or_create(name=size.upper())[0]
             if color and isinstance(color, str):
-                color = Color.objects.get_or_create(name=color.upper())[0]
+                color = color_lookup.get(name=color) or Color.objects.get_or_create(name=color.upper())[0]
 
             variant = ProductVariant.objects.create(
                 product=product,
@@ -636,6 +919,7 @@ class ProductVariantService:
                 weight_grams=data.get('weight_grams', 0),
                 is_active=data.get('is_active', True),
             )
+            refresh_product_total_stock([variant.product_id])
             logger.info(f"Created ProductVariant with SKU: {variant.sku}")
             return variant
         except Exception as e:
@@ -648,6 +932,7 @@ class ProductVariantService:
         """Update a ProductVariant."""
         try:
             variant = ProductVariant.objects.get(pk=variant_id)
+            old_product_id = variant.product_id
             has_changes = False
             for field, value in data.items():
                 if hasattr(variant, field) and getattr(variant, field) != value:
@@ -655,6 +940,7 @@ class ProductVariantService:
                     has_changes = True
             if has_changes:
                 variant.save()
+                refresh_product_total_stock([old_product_id, variant.product_id])
                 logger.info(f"Updated ProductVariant with ID: {variant_id}")
             return variant
         except ObjectDoesNotExist:
@@ -688,7 +974,9 @@ class ProductVariantService:
         """Delete a ProductVariant."""
         try:
             variant = ProductVariant.objects.get(pk=variant_id)
+            product_id = variant.product_id
             variant.delete()
+            refresh_product_total_stock([product_id])
             logger.info(f"Deleted ProductVariant with ID: {variant_id}")
             return True
         except ObjectDoesNotExist:
@@ -711,63 +999,251 @@ class ProductVariantService:
             logger.error(f"Error retrieving variants for product {product_id}: {e}", exc_info=True)
             raise RuntimeError(f"Could not retrieve variants for product {product_id}.") from e
 
+    # --- Size Services ---
+
     @staticmethod
     @transaction.atomic
-    def create_product_variant_with_attributes(data: Dict[str, Any]) -> List[ProductVariant]:
+    def get_or_create_size(name: str) -> Size:
+        """Tìm hoặc tạo mới Size dựa trên tên (case-insensitive)."""
+        if not name:
+            raise ValueError("Size name cannot be empty.")
+        normalized_name = name.strip().upper()  # Normalize and uppercase
+        if not normalized_name:
+            raise ValueError("Size name cannot be empty after stripping whitespace.")
+
+        # Bảng tra cứu cache trong bộ nhớ (product/lookups.py): size đã có không cần truy vấn
+        size = size_lookup.get(name=normalized_name)
+        if size is not None:
+            return size
+
+        try:
+            size, created = Size.objects.get_or_create(
+                name__iexact=normalized_name,
+                defaults={'name': normalized_name}
+            )
+            if created:
+                logger.info(f"Created new Size: '{normalized_name}' with ID: {size.pk}")
+                size.updated_at = timezone.now()
+                size.save(update_fields=['updated_at'])
+            return size
+        except Exception as e:
+            logger.error(f"Error in get_or_create_size: {e}", exc_info=True)
+            raise RuntimeError("An unexpected error occurred while processing the size.") from e
+
+    # --- Color Services ---
+
+    @staticmethod
+    @transaction.atomic
+    def get_or_create_color(name: str, hex_code: Optional[str] = None) -> Color:
+        """Tìm hoặc tạo mới Color dựa trên tên (case-insensitive) và mã hex."""
+        if not name:
+            raise ValueError("Color name cannot be empty.")
+        normalized_name = name.strip().upper()
+        if not normalized_name:
+            raise ValueError("Color name cannot be empty after stripping whitespace.")
+
+        normalized_hex = None
+        if hex_code:
+            h = str(hex_code).strip().lstrip('#')
+            if len(h) in (3, 6):
+                try:
+                    int(h, 16)
+                    normalized_hex = f"#{h.upper()}"
+                except ValueError:
+                    logger.warning(f"Invalid hex code format provided: '{hex_code}'. Ignoring.")
+            else:
+                logger.warning(f"Invalid hex code length provided: '{hex_code}'. Ignoring.")
+
+        try:
+            color = color_lookup.get(name=normalized_name)
+            created = False
+            if color is None:
+                color, created = Color.objects.get_or_create(
+                    name__iexact=normalized_name,
+                    defaults={
+                        'name': normalized_name,
+                        'hex_code': normalized_hex or '#FFFFFF'
+                    }
+                )
+            updated_fields = []
+            if not created and normalized_hex and color.hex_code != normalized_hex:
+                color.hex_code = normalized_hex
+                updated_fields.append('hex_code')
+                logger.info(f"Updated hex code for Color '{normalized_name}' to {normalized_hex}")
+
+            if created:
+                logger.info(f"Created new Color: '{normalized_name}' with ID: {color.pk}")
+                updated_fields.append('updated_at')
+
+            if updated_fields or created:
+                color.updated_at = timezone.now()
+                color.save(update_fields=updated_fields)
+
+            return color
+        except Exception as e:
+            logger.error(f"Error in get_or_create_color: {e}", exc_info=True)
+            raise RuntimeError("An unexpected error occurred while processing the color.") from e
+
+    @staticmethod
+    def _resolve_sizes(size_names: List[str]) -> Dict[str, Size]:
+        """Size theo tên (đã viết hoa): một truy vấn name__in, tạo các size chưa có bằng một bulk_create."""
+        # Size đã có lấy từ bảng tra cứu cache; chỉ truy vấn khi có tên chưa thấy (cache có thể cũ)
+        sizes = {name: size for name in size_names if (size := size_lookup.get(name=name)) is not None}
+        unknown = [name for name in size_names if name not in sizes]
+        if unknown:
+            for size in Size.objects.filter(name__in=unknown).order_by('pk'):
+                sizes.setdefault(size.name.upper(), size)
+        missing = [name for name in size_names if name not in sizes]
+        if missing:
+            Size.objects.bulk_create([Size(name=name) for name in missing])
+            # bulk_create không phát signal post_save
+            size_lookup.invalidate()
+            # MySQL không trả về PK sau bulk_create, nạp lại theo tên
+            for size in Size.objects.filter(name__in=missing).order_by('pk'):
+                sizes.setdefault(size.name.upper(), size)
+        return sizes
+
+    @staticmethod
+    def _resolve_colors(colors: List[tuple]) -> Dict[tuple, Color]:
+        """Color theo cặp (tên đã viết hoa, hex_code), giống get_or_create(name=..., hex_code=...) nhưng theo lô."""
+        def load(names):
+            found = {}
+            for color in Color.objects.filter(name__in=names).order_by('pk'):
+                found.setdefault((color.name.upper(), color.hex_code.upper()), color)
+            return found
+
+        resolved = {}
+        for name, hex_code in colors:
+            color = color_lookup.get(name=name, hex_code=hex_code)
+            if color is not None:
+                resolved[(name, hex_code.upper())] = color
+        unknown = {name for name, hex_code in colors if (name, hex_code.upper()) not in resolved}
+        if unknown:
+            resolved.update(load(unknown))
+        missing = [(name, hex_code) for name, hex_code in colors if (name, hex_code.upper()) not in resolved]
+        if missing:
+            Color.objects.bulk_create([Color(name=name, hex_code=hex_code) for name, hex_code in missing])
+            # bulk_create không phát signal post_save
+            color_lookup.invalidate()
+            resolved.update(load({name for name, _ in missing}))
+        return {(name, hex_code): resolved[(name, hex_code.upper())] for name, hex_code in colors}
+
+    @staticmethod
+    @transaction.atomic
+    def create_product_variant_grid(
+        product_id: int,
+        size_names: List[str],
+        colors: List[Optional[tuple]],
+        stock: int = 0,
+        weight_grams: Any = None,
+        image_url: Any = None,
+    ) -> List[ProductVariant]:
         """
-        Service to create product variants with attributes.
-        - size_names: Comma-separated string of sizes.
-        - color_name: Uppercase string for color name.
-        - hex_code: String in the format "#RRGGBB".
-        - stock: Positive integer for stock.
-        - weight_grams: Decimal value for weight in grams.
+        Tạo toàn bộ lưới biến thể size x color của một sản phẩm với số truy vấn cố định:
+        size / color được tra bằng name__in và tạo bù bằng bulk_create, SKU sinh trong bộ nhớ,
+        các biến thể được tạo bằng một bulk_create.
+        - colors: danh sách (color_name, hex_code); None nghĩa là biến thể không có màu.
+        - image_url: ảnh dùng chung cho mọi biến thể, chỉ được lưu một lần.
         """
-        # Validate hex code format
-        hex_code = data.get('hex_code')
-        color_name = data.get('color_name')
-        size_names = data.get('size_names')
-        stock = data.get('stock')
-        weight_grams = data.get('weight_grams')
-        image_url = data.get('image_url')
-        product = data.get('product')
-
-        if not re.match(r"^#[0-9A-Fa-f]{6}$", hex_code):
-            raise ValueError("Invalid hex code format. Must be in the format '#RRGGBB'.")
-
-        # Ensure color exists or create it
-        color = None
-        if color_name:
-            color_name = color_name.upper()
-            color, _ = Color.objects.get_or_create(name=color_name, hex_code=hex_code)
-
-        # Process size names
         if not size_names:
             raise ValueError("At least one valid size must be provided.")
-        size_names = [name.upper() for name in size_names]
-        created_variants = []
+        if not colors:
+            raise ValueError("At least one color must be provided.")
+        # Bỏ tên trùng, giữ thứ tự
+        size_names = list(dict.fromkeys(name.strip().upper() for name in size_names if name and name.strip()))
+        if not size_names:
+            raise ValueError("At least one valid size must be provided.")
 
-        if product:
-            product = Product.objects.get(pk=product)  # Ensure product exists
-        for size_name in size_names:
-            # Ensure size exists or create it
-            size, _ = Size.objects.get_or_create(name=size_name)
+        color_keys = []
+        for color in colors:
+            if color is None:
+                color_keys.append(None)
+                continue
+            color_name, hex_code = color
+            if not hex_code or not re.match(r"^#[0-9A-Fa-f]{6}$", hex_code):
+                raise ValueError("Invalid hex code format. Must be in the format '#RRGGBB'.")
+            color_keys.append((color_name.strip().upper(), hex_code))
+        color_keys = list(dict.fromkeys(color_keys))
+
+        product = Product.objects.filter(pk=product_id).only('pk', 'name').first()
+        if product is None:
+            raise ValueError(f"Product with ID {product_id} not found.")
 
-            # Generate SKU
-            sku = generate_sku(product.name, size.name, color.name if color else None)
+        sizes = ProductVariantService._resolve_sizes(size_names)
+        named_colors = [key for key in color_keys if key is not None]
+        resolved_colors = ProductVariantService._resolve_colors(named_colors) if named_colors else {}
+
+        image_name = None
+        if image_url:
+            # Lưu ảnh một lần rồi gán tên cho mọi biến thể, mỗi biến thể là một tham chiếu tới blob
+            field = ProductVariant._meta.get_field('image_url')
+            image_name = field.storage.save(field.generate_filename(None, image_url.name), image_url)
+
+        variants = []
+        for color_key in color_keys:
+            color = resolved_colors.get(color_key) if color_key is not None else None
+            for size_name in size_names:
+                size = sizes[size_name]
+                variants.append(ProductVariant(
+                    product=product,
+                    size=size,
+                    color=color,
+                    sku=generate_sku(product.name, size.name, color.name if color else None),
+                    stock=stock,
+                    weight_grams=weight_grams if weight_grams is not None else 0,
+                    image_url=image_name,
+                ))
+        ProductVariant.objects.bulk_create(variants)
+        if image_name:
+            product_media_storage.retain(image_name, count=len(variants) - 1)
+
+        if any(variant.pk is None for variant in variants):
+            # MySQL không trả về PK sau bulk_create: biến thể mới nhất của mỗi cặp (size, color)
+            latest = {}
+            created = ProductVariant.objects.filter(
+                product=product, size__in=sizes.values()
+            ).select_related('size', 'color').order_by('pk')
+            for variant in created:
+                latest[(variant.size_id, variant.color_id)] = variant
+            variants = [latest[(variant.size_id, variant.color_id)] for variant in variants]
+
+        # bulk_create không phát signal post_save: tồn kho (kèm cache chi tiết), chỉ mục tìm kiếm, renditions
+        refresh_product_total_stock([product.pk])
+        ProductSearchIndex.schedule_reindex([product.pk])
+        if image_name:
+            for variant in variants:
+                ProductImageService.schedule_renditions(variant)
+        logger.info(f"Created {len(variants)} variants for product {product.pk} ({len(size_names)} sizes x {len(color_keys)} colors).")
+        return variants
 
-            # Create the product variant
-            variant = ProductVariant.objects.create(
-                product=product,
-                size=size,
-                color=color,
-                sku=sku,
-                stock=stock,
-                weight_grams=weight_grams,
-                image_url=image_url,
-            )
-            created_variants.append(variant)
-
-        return created_variants
+    @staticmethod
+    def create_product_variant_with_attributes(data: Dict[str, Any]) -> List[ProductVariant]:
+        """
+        Service to create product variants with attributes.
+        - size_names: List of size names.
+        - color_name / hex_code: một màu ("#RRGGBB"), hoặc
+        - colors: danh sách {'color_name', 'hex_code'} để tạo cả lưới size x color.
+        - stock: Positive integer for stock.
+        - weight_grams: Decimal value for weight in grams.
+        """
+        colors = data.get('colors')
+        if colors:
+            colors = [(color.get('color_name') or color.get('name'), color.get('hex_code')) for color in colors]
+            if any(not name for name, _ in colors):
+                raise ValueError("Each color must have a color_name.")
+        elif data.get('color_name'):
+            colors = [(data['color_name'], data.get('hex_code'))]
+        else:
+            colors = [None]
+
+        return ProductVariantService.create_product_variant_grid(
+            product_id=data.get('product'),
+            size_names=data.get('size_names') or [],
+            colors=colors,
+            stock=data.get('stock') or 0,
+            weight_grams=data.get('weight_grams'),
+            image_url=data.get('image_url'),
+        )
 
     @staticmethod
     @transaction.atomic
@@ -775,6 +1251,7 @@ class ProductVariantService:
         """Update a ProductVariant with attributes."""
         try:
             variant = ProductVariant.objects.get(pk=variant_id)
+            old_product_id = variant.product_id
             has_changes = False
             for field, value in data.items():
                 if hasattr(variant, field) and getattr(variant, field) != value:
@@ -782,6 +1259,7 @@ class ProductVariantService:
                     has_changes = True
             if has_changes:
                 variant.save()
+                refresh_product_total_stock([old_product_id, variant.product_id])
                 logger.info(f"Updated ProductVariant with ID: {variant_id}")
             return variant
         except ObjectDoesNotExist:
@@ -798,4 +1276,184 @@ class ProductVariantService:
             product = Product.objects.get(slug=slug)
             return product.variants.select_related('size', 'color').all()
         except ObjectDoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+
+# --- Deletion Services ---
+
+class DeletionService:
+    """
+    Xóa Product / Supplier theo hai bước:
+    1. Xóa mềm trong request: đặt deleted_at (một câu UPDATE), bản ghi bị ẩn ngay bởi SoftDeleteManager.
+    2. Job nền (product.tasks.run_deletion_job) xóa thật theo lô BATCH_SIZE sản phẩm,
+       mỗi lô một transaction ngắn, sau đó mới bỏ tham chiếu / xóa file ảnh.
+    Tiến trình được ghi vào DeletionJob.
+    """
+    BATCH_SIZE = 100
+    # Worker không gia hạn lease (sau mỗi lô) quá thời gian này được coi là đã chết, job được nhận lại
+    LEASE_TIMEOUT = timedelta(minutes=10)
+
+    @staticmethod
+    def _schedule(job: DeletionJob) -> None:
+        job_id = job.pk
+
+        def _enqueue():
+            try:
+                run_deletion_job.delay(job_id)
+            except Exception as e:
+                # Broker không khả dụng: job vẫn ở trạng thái pending và được resume_deletion_jobs chạy lại
+                logger.error(f"Error enqueueing deletion job {job_id}: {e}", exc_info=True)
+
+        transaction.on_commit(_enqueue)
+
+    @staticmethod
+    @transaction.atomic
+    def soft_delete_product(product_id: int) -> Optional[DeletionJob]:
+        product = Product.objects.filter(pk=product_id).only('pk', 'name').first()
+        if product is None:
+            logger.warning(f"Attempted to delete non-existent Product with ID: {product_id}")
+            return None
+
+        Product.all_objects.filter(pk=product_id).update(deleted_at=timezone.now())
+        job = DeletionJob.objects.create(
+            kind=DeletionJobKind.PRODUCT.value,
+            object_id=product_id,
+            object_repr=product.name,
+            total_products=1,
+        )
+        # update() không phát signal
+        ProductDetailCache.invalidate([product_id])
+        DeletionService._schedule(job)
+        logger.info(f"Product '{product.name}' (ID: {product_id}) soft-deleted, deletion job {job.pk} queued.")
+        return job
+
+    @staticmethod
+    @transaction.atomic
+    def soft_delete_supplier(supplier_id: int) -> Optional[DeletionJob]:
+        supplier = Supplier.objects.filter(pk=supplier_id).first()
+        if supplier is None:
+            logger.warning(f"Supplier with ID {supplier_id} not found.")
+            return None
+
+        now = timezone.now()
+        product_ids = list(Product.objects.filter(supplier_id=supplier_id).values_list('pk', flat=True))
+        Supplier.all_objects.filter(pk=supplier_id).update(deleted_at=now)
+        Product.all_objects.filter(supplier_id=supplier_id, deleted_at__isnull=True).update(deleted_at=now)
+        job = DeletionJob.objects.create(
+            kind=DeletionJobKind.SUPPLIER.value,
+            object_id=supplier_id,
+            object_repr=supplier.company_name,
+            total_products=Product.all_objects.filter(supplier_id=supplier_id).count(),
+        )
+        ProductDetailCache.invalidate(product_ids)
+        DeletionService._schedule(job)
+        logger.info(f"Supplier '{supplier.company_name}' soft-deleted with {len(product_ids)} products, deletion job {job.pk} queued.")
+        return job
+
+    @staticmethod
+    def _collect_media(product_ids: List[int]) -> Counter:
+        """Số tham chiếu tới từng file ảnh mà các sản phẩm (và biến thể) sẽ bỏ khi bị xóa."""
+        media = Counter()
+        rows = Product.all_objects.filter(pk__in=product_ids).values_list('image_url', 'image_renditions')
+        for image_name, renditions in rows:
+            if image_name:
+                media[image_name] += 1
+            media.update(ProductImageService.rendition_paths(renditions))
+        rows = ProductVariant.all_objects.filter(product_id__in=product_ids).values_list('image_url', 'image_renditions')
+        for image_name, renditions in rows:
+            # Giống release_variant_image: ảnh biến thể cũ (không phải blob) có thể dùng chung, không xóa
+            if ContentAddressedStorage.is_blob_name(image_name):
+                media[image_name] += 1
+            media.update(ProductImageService.rendition_paths(renditions))
+        return media
+
+    @staticmethod
+    def _purge_batch(scope: QuerySet) -> tuple:
+        """
+        Xóa thật một lô sản phẩm (cascade biến thể, danh mục, chỉ mục tìm kiếm...).
+        Các dòng được khóa (select_for_update) trước khi đọc ảnh, nên chỉ worker thực sự xóa dòng mới bỏ tham chiếu ảnh của nó.
+        Trả về (số sản phẩm đã xóa, số file được bỏ tham chiếu).
+        """
+        # Receiver cache / index / media chạy theo từng dòng; cả lô được xử lý một lần bên dưới
+        with transaction.atomic(), muted_product_signals():
+            product_ids = list(
+                scope.select_for_update().order_by('pk').values_list('pk', flat=True)[:DeletionService.BATCH_SIZE]
+            )
+            if not product_ids:
+                return 0, 0
+            media = DeletionService._collect_media(product_ids)
+            Product.all_objects.filter(pk__in=product_ids).delete()
+
+        ProductDetailCache.invalidate(product_ids)
+        for name, count in media.items():
+            try:
+                product_media_storage.release(name, count)
+            except Exception as e:
+                logger.warning(f"Error releasing media file '{name}': {e}")
+        return len(product_ids), len(media)
+
+    @staticmethod
+    def _claim(job_id: int) -> Optional[str]:
+        """
+        Nhận job bằng một câu UPDATE có điều kiện: job chưa có ai chạy, đã lỗi, hoặc worker trước không gia hạn lease quá LEASE_TIMEOUT.
+        Trả về lease token, hoặc None nếu job đã hoàn tất / đang được worker khác chạy.
+        """
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        claimed = DeletionJob.objects.filter(pk=job_id).filter(
+            Q(status__in=[DeletionJobStatus.PENDING.value, DeletionJobStatus.FAILED.value])
+            | Q(status=DeletionJobStatus.RUNNING.value, heartbeat_at__isnull=True)
+            | Q(status=DeletionJobStatus.RUNNING.value, heartbeat_at__lt=now - DeletionService.LEASE_TIMEOUT)
+        ).update(
+            status=DeletionJobStatus.RUNNING.value,
+            started_at=Coalesce(F('started_at'), now),
+            lease_token=token,
+            heartbeat_at=now,
+            error='',
+        )
+        return token if claimed else None
+
+    @staticmethod
+    def run_job(job_id: int) -> Optional[DeletionJob]:
+        """Chạy (hoặc chạy tiếp) một DeletionJob. An toàn khi chạy lại: chỉ xử lý các sản phẩm còn lại."""
+        token = DeletionService._claim(job_id)
+        job = DeletionJob.objects.filter(pk=job_id).first()
+        if job is None or token is None:
+            if job is not None and job.status == DeletionJobStatus.RUNNING.value:
+                logger.info(f"Deletion job {job_id} is held by another worker, skipping.")
+            return job
+
+        # Mọi cập nhật tiến trình chỉ áp dụng khi worker này còn giữ lease
+        leased = DeletionJob.objects.filter(pk=job.pk, lease_token=token)
+        scope = Product.all_objects.filter(deleted_at__isnull=False)
+        if job.kind == DeletionJobKind.SUPPLIER.value:
+            scope = scope.filter(supplier_id=job.object_id)
+        else:
+            scope = scope.filter(pk=job.object_id)
+
+        try:
+            while True:
+                deleted, released = DeletionService._purge_batch(scope)
+                if not deleted:
+                    break
+                if not leased.update(
+                    deleted_products=F('deleted_products') + deleted,
+                    released_files=F('released_files') + released,
+                    heartbeat_at=timezone.now(),
+                ):
+                    # Lease đã hết hạn và job được worker khác nhận: dừng, worker đó xử lý tiếp phần còn lại
+                    logger.warning(f"Deletion job {job.pk} lease lost, stopping.")
+                    job.refresh_from_db()
+                    return job
+                logger.info(f"Deletion job {job.pk}: purged {deleted} products.")
+
+            if job.kind == DeletionJobKind.SUPPLIER.value:
+                Supplier.all_objects.filter(pk=job.object_id, deleted_at__isnull=False).delete()
+        except Exception as e:
+            logger.error(f"Deletion job {job.pk} failed: {e}", exc_info=True)
+            leased.update(status=DeletionJobStatus.FAILED.value, error=str(e))
+            raise
+
+        leased.update(status=DeletionJobStatus.COMPLETED.value, finished_at=timezone.now())
+        job.refresh_from_db()
+        return job
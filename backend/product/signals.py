@@ -0,0 +1,143 @@
+# product/signals.py
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import ProductDetailCache
+from .images import ProductImageService
+from .models import Category, Color, Product, ProductCategory, ProductVariant, Size, Supplier
+from .publishing import ProductPublishService
+from .search import ProductSearchIndex
+from .storage import ContentAddressedStorage
+
+_muted = ContextVar('product_signals_muted', default=False)
+
+
+@contextmanager
+def muted_product_signals():
+    """
+    Tắt các receiver bên dưới trong khối lệnh, dùng khi xử lý hàng loạt
+    (ví dụ job xóa nền) và tự cập nhật cache / index / media một lần cho cả lô.
+    """
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def _unless_muted(handler):
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if _muted.get():
+            return None
+        return handler(*args, **kwargs)
+    return wrapper
+
+
+# --- Giữ chỉ mục tìm kiếm đồng bộ (xem product/search.py) ---
+@receiver(post_save, sender=Product)
+@_unless_muted
+def reindex_product(sender, instance, **kwargs):
+    ProductSearchIndex.schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@_unless_muted
+def reindex_related_product(sender, instance, **kwargs):
+    ProductSearchIndex.schedule_reindex([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@_unless_muted
+def reindex_category_products(sender, instance, created, **kwargs):
+    # Category mới chưa có sản phẩm; khi đổi tên cần index lại các sản phẩm thuộc danh mục
+    if created:
+        return
+    product_ids = ProductCategory.objects.filter(category=instance).values_list('product_id', flat=True)
+    ProductSearchIndex.schedule_reindex(list(product_ids))
+
+
+# --- Vô hiệu hóa cache chi tiết sản phẩm (xem product/caching.py) ---
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@_unless_muted
+def invalidate_product_detail(sender, instance, **kwargs):
+    ProductDetailCache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@_unless_muted
+def invalidate_related_product_detail(sender, instance, **kwargs):
+    ProductDetailCache.invalidate([instance.product_id])
+
+
+@receiver(post_save, sender=Supplier)
+@_unless_muted
+def invalidate_supplier_product_detail(sender, instance, created, **kwargs):
+    # supplier_details được nhúng trong dữ liệu chi tiết sản phẩm
+    if created:
+        return
+    ProductDetailCache.invalidate(Product.objects.filter(supplier=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Size)
+@receiver(post_save, sender=Color)
+@_unless_muted
+def invalidate_attribute_product_detail(sender, instance, created, **kwargs):
+    # size_details / color_details được nhúng trong dữ liệu biến thể
+    if created:
+        return
+    lookup = 'size' if sender is Size else 'color'
+    product_ids = ProductVariant.objects.filter(**{lookup: instance}).values_list('product_id', flat=True).distinct()
+    ProductDetailCache.invalidate(product_ids)
+
+
+# --- Đăng sản phẩm hẹn giờ (xem product/publishing.py) ---
+@receiver(post_save, sender=Product)
+@_unless_muted
+def schedule_product_publish(sender, instance, created, **kwargs):
+    # Chỉ khi lịch được đặt / đổi: bỏ đăng sản phẩm có publish_at cũ không làm nó được đăng lại
+    dirty = instance.get_dirty_fields()
+    if created or dirty is None or 'publish_at' in dirty:
+        ProductPublishService.schedule(instance)
+
+
+# --- Sinh ảnh responsive (xem product/images.py) ---
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@_unless_muted
+def schedule_image_renditions(sender, instance, **kwargs):
+    ProductImageService.schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+@_unless_muted
+def delete_image_renditions(sender, instance, **kwargs):
+    ProductImageService.delete_renditions(instance.image_renditions)
+
+
+@receiver(post_delete, sender=ProductVariant)
+@_unless_muted
+def release_variant_image(sender, instance, **kwargs):
+    # Product.delete tự xóa ảnh; ảnh biến thể dùng chung blob nên chỉ bỏ tham chiếu
+    if instance.image_url and ContentAddressedStorage.is_blob_name(instance.image_url.name):
+        instance.image_url.delete(save=False)
+
+
+@receiver(post_delete, sender=Category)
+@_unless_muted
+def release_category_image(sender, instance, **kwargs):
+    # Ảnh danh mục được upload riêng cho từng danh mục (ảnh thay thế được ImageOwnerMixin xử lý khi save)
+    if instance.image_url:
+        instance.image_url.delete(save=False)
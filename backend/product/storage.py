@@ -0,0 +1,110 @@
+# product/storage.py
+"""
+Storage định danh theo nội dung cho ảnh sản phẩm / biến thể / danh mục và renditions.
+
+File được lưu tại blobs/<ab>/<cd>/<sha256>.<ext>: cùng một ảnh upload nhiều lần
+(ví dụ một ảnh cho mọi size của biến thể) chỉ được ghi một lần. Mỗi lần save là
+một tham chiếu (MediaBlob.ref_count); delete chỉ giảm tham chiếu và file được xóa
+khi không còn ai dùng. Tên file chứa hash nên có thể cache immutable (xem core/media.py).
+
+Lưu ý: gán lại tên file đã lưu cho một bản ghi khác (không qua save) phải gọi retain(name).
+"""
+import hashlib
+import logging
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME_PATTERN = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def is_blob_name(name: str) -> bool:
+        return bool(name) and bool(BLOB_NAME_PATTERN.match(name.replace('\\', '/')))
+
+    @staticmethod
+    def blob_name(digest: str, original_name: str) -> str:
+        extension = os.path.splitext(original_name)[1].lower()
+        if extension == '.jpeg':
+            extension = '.jpg'
+        return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    @staticmethod
+    def _digest(content) -> str:
+        sha256 = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return sha256.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        # Tên blob là hash nội dung: trùng tên nghĩa là trùng nội dung, không cần tìm tên khác.
+        # Raise để dừng vòng lặp thử tên mới của FileSystemStorage._save (xem _save)
+        if self.is_blob_name(name) and self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def _save(self, name, content):
+        name = self.blob_name(self._digest(content), name)
+        if not self.exists(name):
+            # Hai request ghi cùng blob: FileSystemStorage mở file với O_EXCL,
+            # FileExistsError nghĩa là request kia đã ghi cùng nội dung
+            try:
+                name = super()._save(name, content)
+            except FileExistsError:
+                pass
+        else:
+            logger.debug(f"Blob '{name}' already exists, skipping write.")
+        self.retain(name, size=content.size)
+        return name
+
+    def retain(self, name: str, size: int = 0, count: int = 1) -> None:
+        """Thêm count tham chiếu tới blob name (ví dụ một ảnh gán cho nhiều bản ghi tạo bằng bulk_create)."""
+        if not self.is_blob_name(name) or count <= 0:
+            return
+        from product.models import MediaBlob
+
+        MediaBlob.objects.get_or_create(name=name, defaults={'ref_count': 0, 'size': size or 0})
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+    def delete(self, name):
+        """Bỏ một tham chiếu; file chỉ bị xóa khi không còn tham chiếu (sau khi transaction commit)."""
+        self.release(name)
+
+    def release(self, name: str, count: int = 1) -> None:
+        """Bỏ count tham chiếu tới name cùng lúc (ví dụ khi xóa hàng loạt bản ghi dùng chung ảnh)."""
+        if not name:
+            return
+        if not self.is_blob_name(name):
+            # File cũ (trước khi dùng blob): giữ hành vi xóa trực tiếp
+            super().delete(name)
+            return
+        from product.models import MediaBlob
+
+        if MediaBlob.objects.filter(name=name, ref_count__gt=count).update(ref_count=F('ref_count') - count):
+            return
+        MediaBlob.objects.filter(name=name).delete()
+
+        def _delete_file():
+            # Có thể đã được upload lại giữa chừng
+            if not MediaBlob.objects.filter(name=name).exists():
+                super(ContentAddressedStorage, self).delete(name)
+
+        transaction.on_commit(_delete_file)
+
+
+product_media_storage = ContentAddressedStorage()
@@ -1,19 +1,108 @@
+import logging
+from datetime import datetime, timedelta
+
 from celery import shared_task
+from django.apps import apps
+from django.db.models import Q
 from django.utils import timezone
-from .models import Product
+from .caching import ProductDetailCache
+from .enums import DeletionJobStatus
+from .images import ProductImageService
+from .models import DeletionJob, Product
+from .publishing import ProductPublishService
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def publish_product(product_id, publish_at):
+    """
+    Đăng một sản phẩm tại publish_at (gửi với eta, xem product/publishing.py).
+    publish_at là lịch lúc gửi task: không làm gì nếu lịch đã bị đổi hoặc sản phẩm đã được đăng.
+    Task chạy sớm (lệch đồng hồ giữa các máy) cũng không đăng; publish_scheduled_products sẽ đăng bù.
+    """
+    return ProductPublishService.publish(product_id, datetime.fromisoformat(publish_at))
+
 
 @shared_task
 def publish_scheduled_products():
+    """
+    Lưới an toàn cho publish_product: đăng các sản phẩm quá hạn (task ETA bị mất)
+    và gửi task ETA cho các lịch vừa vào khoảng PRODUCT_PUBLISH_ETA_HORIZON.
+    """
+    now = timezone.now()
+    published_ids = ProductPublishService.publish_due(now)
+    if published_ids:
+        logger.warning(f"Published {len(published_ids)} overdue scheduled products: {published_ids}")
+    ProductPublishService.schedule_upcoming(now)
+    return len(published_ids)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_image_renditions(self, model_label, pk, image_name):
+    """
+    Sinh renditions cho ảnh image_name của Product / ProductVariant (xem product/images.py).
+    Bỏ qua nếu ảnh đã bị thay thế trong lúc chờ; ghi kết quả bằng update() có điều kiện
+    để không ghi đè renditions của ảnh mới hơn.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or instance.image_url.name != image_name:
+        return None
+    if ProductImageService.is_ready(instance.image_renditions, image_name):
+        return image_name
+
+    try:
+        renditions = ProductImageService.generate_renditions(image_name)
+    except ValueError as e:
+        logger.error(f"Error generating renditions for {model_label} {pk}: {e}")
+        return None
+    except Exception as e:
+        raise self.retry(exc=e)
+
+    updated = model.objects.filter(pk=pk, image_url=image_name).update(image_renditions=renditions)
+    if not updated:
+        # Ảnh đã đổi trong lúc xử lý
+        ProductImageService.delete_renditions(renditions)
+        return None
+
+    old_renditions = instance.image_renditions or {}
+    if old_renditions.get('source') != image_name:
+        ProductImageService.delete_renditions(old_renditions)
+
+    # update() không phát signal
+    ProductDetailCache.invalidate([instance.pk if model is Product else instance.product_id])
+    return image_name
+
+
+@shared_task
+def run_deletion_job(job_id):
+    """Xóa thật các sản phẩm / nhà cung cấp đã bị xóa mềm theo lô (xem DeletionService)."""
+    # Import tại chỗ: product.services import module này
+    from .services import DeletionService
+
+    job = DeletionService.run_job(job_id)
+    return job.status if job is not None else None
+
+
+# Job pending quá lâu (broker lỗi khi enqueue) hoặc running mà lease hết hạn (worker chết giữa chừng).
+# Chạy lại job thừa là vô hại: DeletionService.run_job chỉ chạy khi nhận được lease.
+DELETION_JOB_PENDING_GRACE = timedelta(minutes=5)
+
+
+@shared_task
+def resume_deletion_jobs():
+    from .services import DeletionService
+
     now = timezone.now()
-    products_to_publish = Product.objects.filter(
-        is_published=False,
-        publish_at__isnull=False,
-        publish_at__lte=now
+    job_ids = list(
+        DeletionJob.objects.filter(
+            status=DeletionJobStatus.PENDING.value, created_at__lte=now - DELETION_JOB_PENDING_GRACE
+        ).values_list('pk', flat=True)
+    ) + list(
+        DeletionJob.objects.filter(status=DeletionJobStatus.RUNNING.value).filter(
+            Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=now - DeletionService.LEASE_TIMEOUT)
+        ).values_list('pk', flat=True)
     )
-    # Update hiệu quả hơn cho nhiều bản ghi
-    updated_count = products_to_publish.update(is_published=True)
-    # Optional: Clear publish_at after publishing
-    # products_to_publish.update(is_published=True, publish_at=None)
-    if updated_count > 0:
-        print(f"Published {updated_count} scheduled products.")
-    return updated_count
+    for job_id in job_ids:
+        run_deletion_job.delay(job_id)
+    return len(job_ids)
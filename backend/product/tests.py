@@ -1,3 +1,737 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_save, pre_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.caching import bump_version
+from core.lookups import LookupTable
+from product.enums import DeletionJobStatus
+from product.importer import CatalogImporter, iter_rows
+from product.lookups import colors as color_lookup, sizes as size_lookup
+from product.models import (
+    Category, Color, DeletionJob, MediaBlob, Product, ProductCategory, ProductSearchDocument, ProductVariant, Size,
+    Supplier,
+)
+from product.pagination import ProductKeysetPagination
+from product.publishing import ProductPublishService
+from product.search import ProductSearchIndex, fold_diacritics, tokenize
+from product.services import CategoryService, DeletionService, ProductService, ProductVariantService, allocate_unique_slugs
+from product.storage import product_media_storage
+from product.tasks import publish_product, publish_scheduled_products
+from user.models import User
+
+
+class ProductKeysetPaginationTests(TestCase):
+    # (price, sale_price): nhiều sản phẩm cùng effective_price để kiểm tra phá thế hòa theo id
+    PRICES = [(300, 0), (200, 0), (500, 200), (100, 0), (200, 0), (400, 0), (900, 300), (200, 0), (100, 0), (700, 0), (300, 0)]
+
+    @classmethod
+    def setUpTestData(cls):
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        # bulk_create: không chạy save() / signal (cache, search index), effective_price do database tính
+        Product.objects.bulk_create([
+            Product(name=f'Product {index}', slug=f'product-{index}', supplier=supplier, price=price, sale_price=sale_price, is_published=True)
+            for index, (price, sale_price) in enumerate(cls.PRICES)
+        ])
+
+    def _page(self, ordering, cursor=None, page_size=4):
+        params = {'page_size': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        paginator = ProductKeysetPagination(ordering=ordering)
+        request = Request(APIRequestFactory().get('/api/v1/products/', params))
+        rows = paginator.paginate_queryset(Product.objects.filter(is_published=True), request)
+        return [product.pk for product in rows], paginator.next_cursor, paginator.previous_cursor
+
+    def _expected(self, descending):
+        rows = Product.objects.values_list('effective_price', 'id')
+        return [pk for _, pk in sorted(rows, reverse=descending)]
+
+    def _assert_round_trip(self, ordering, expected):
+        # Đi tới hết bằng next, ghi lại cursor previous của từng trang
+        pages, cursors, cursor = [], [], None
+        while True:
+            ids, next_cursor, previous_cursor = self._page(ordering, cursor)
+            pages.append(ids)
+            cursors.append(previous_cursor)
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+        self.assertEqual([pk for ids in pages for pk in ids], expected)
+        self.assertIsNone(cursors[0])
+
+        # Đi lùi bằng previous phải trả lại đúng các trang trước đó
+        for index in range(len(pages) - 1, 0, -1):
+            ids, next_cursor, _ = self._page(ordering, cursors[index])
+            self.assertEqual(ids, pages[index - 1])
+            self.assertIsNotNone(next_cursor)
+
+    def test_price_asc_round_trip(self):
+        self._assert_round_trip('price_asc', self._expected(descending=False))
+
+    def test_price_desc_round_trip(self):
+        self._assert_round_trip('price_desc', self._expected(descending=True))
+
+    def test_created_round_trip_with_ties(self):
+        # Nhiều sản phẩm cùng created_at: thứ tự do id quyết định
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        created_at = timezone.now()
+        for index, pk in enumerate(ids):
+            Product.objects.filter(pk=pk).update(created_at=created_at - timedelta(minutes=index // 3))
+        rows = Product.objects.values_list('created_at', 'id')
+        self._assert_round_trip('created', [pk for _, pk in sorted(rows, reverse=True)])
+
+    def test_latest_round_trip_with_ties_and_null_publish_at(self):
+        # publish_at: NULL (chưa hẹn giờ) nằm cuối khi giảm dần, các giá trị trùng nhau phá thế hòa theo id
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        publish_at = timezone.now()
+        for index, pk in enumerate(ids):
+            value = None if index % 4 == 0 else publish_at - timedelta(hours=index % 3)
+            Product.objects.filter(pk=pk).update(publish_at=value)
+        rows = Product.objects.values_list('publish_at', 'id')
+        expected = [pk for _, _, pk in sorted(((value is not None, value, pk) for value, pk in rows), reverse=True)]
+        self.assertIsNone(Product.objects.get(pk=expected[-1]).publish_at)
+        self._assert_round_trip('latest', expected)
+
+    def test_cursor_with_search_is_rejected(self):
+        response = APIClient().get('/api/v1/products/', {'search': 'product', 'page_size': 4})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.json()['error'])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            self._page('price_asc', cursor='not-a-cursor')
+
+
+@mock.patch('product.tasks.run_deletion_job.delay')
+class DeletionJobLeaseTests(TestCase):
+
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        Product.objects.bulk_create([
+            Product(name=f'Product {index}', slug=f'product-{index}', supplier=self.supplier, price=100)
+            for index in range(5)
+        ])
+        with self.captureOnCommitCallbacks(execute=False):
+            self.job = DeletionService.soft_delete_supplier(self.supplier.pk)
+
+    def _remaining(self) -> int:
+        return Product.all_objects.filter(supplier=self.supplier).count()
+
+    def test_job_held_by_live_worker_is_not_run_again(self, delay):
+        DeletionJob.objects.filter(pk=self.job.pk).update(
+            status=DeletionJobStatus.RUNNING.value, lease_token='other', heartbeat_at=timezone.now()
+        )
+        job = DeletionService.run_job(self.job.pk)
+        self.assertEqual(job.status, DeletionJobStatus.RUNNING.value)
+        self.assertEqual(self._remaining(), 5)
+
+    def test_expired_lease_is_reclaimed(self, delay):
+        DeletionJob.objects.filter(pk=self.job.pk).update(
+            status=DeletionJobStatus.RUNNING.value, lease_token='other',
+            heartbeat_at=timezone.now() - DeletionService.LEASE_TIMEOUT - timedelta(minutes=1),
+        )
+        with mock.patch.object(DeletionService, 'BATCH_SIZE', 2):
+            job = DeletionService.run_job(self.job.pk)
+        self.assertEqual(job.status, DeletionJobStatus.COMPLETED.value)
+        self.assertEqual(job.deleted_products, 5)
+        self.assertNotEqual(job.lease_token, 'other')
+        self.assertEqual(self._remaining(), 0)
+        # Job đã hoàn tất không được nhận lại
+        self.assertEqual(DeletionService.run_job(self.job.pk).deleted_products, 5)
+
+    def test_worker_stops_when_lease_is_taken_over(self, delay):
+        purge_batch = DeletionService._purge_batch
+
+        def _taken_over(scope):
+            result = purge_batch(scope)
+            DeletionJob.objects.filter(pk=self.job.pk).update(lease_token='other')
+            return result
+
+        with mock.patch.object(DeletionService, 'BATCH_SIZE', 2), \
+                mock.patch.object(DeletionService, '_purge_batch', side_effect=_taken_over):
+            job = DeletionService.run_job(self.job.pk)
+        self.assertEqual(job.status, DeletionJobStatus.RUNNING.value)
+        self.assertEqual(job.deleted_products, 0)
+        self.assertEqual(self._remaining(), 3)
+
+
+class ImageReleaseTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _upload(self, content: bytes, name='image.png') -> SimpleUploadedFile:
+        return SimpleUploadedFile(name, content, content_type='image/png')
+
+    def _refs(self, name) -> int:
+        return MediaBlob.objects.filter(name=name).values_list('ref_count', flat=True).first() or 0
+
+    def test_category_image_released_on_replace_and_delete(self):
+        category = Category.objects.create(name='Shirts', slug='shirts', image_url=self._upload(b'first'))
+        first = category.image_url.name
+
+        category = CategoryService.update_category(category.pk, {'image_url': self._upload(b'second')})
+        second = category.image_url.name
+        self.assertEqual((self._refs(first), self._refs(second)), (0, 1))
+
+        category.delete()
+        self.assertEqual(self._refs(second), 0)
+
+    def test_variant_image_replace_releases_one_reference_and_renditions(self):
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        product = Product.objects.bulk_create([Product(name='Product', slug='product', supplier=supplier, price=100)])[0]
+        # Ảnh dùng chung cho hai biến thể (giống create_product_variant_grid)
+        shared = product_media_storage.save('product_variants/shared.png', self._upload(b'shared'))
+        product_media_storage.retain(shared)
+        rendition = product_media_storage.save('renditions/shared-card.webp', self._upload(b'card'))
+        renditions = {'source': shared, 'renditions': {'card': {'width': 1, 'height': 1, 'webp': rendition}}}
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku=f'SKU-{index}', image_url=shared, image_renditions=renditions)
+            for index in range(2)
+        ])
+        variant = ProductVariant.objects.filter(product=product).order_by('pk').first()
+
+        variant = ProductVariantService.update_variant(variant.pk, {'image_url': self._upload(b'own')})
+        self.assertEqual(self._refs(shared), 1)
+        self.assertEqual(self._refs(rendition), 0)
+        self.assertEqual(self._refs(variant.image_url.name), 1)
+        self.assertEqual(ProductVariant.objects.get(pk=variant.pk).image_renditions, {})
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        rows = [
+            # (name, description, is_published)
+            ('Áo thun trắng', 'Cotton', True),
+            ('Quần jean', 'Phối cùng áo thun', True),
+            ('Áo sơ mi', 'Vải lanh', True),
+            ('Áo thun nháp', 'Chưa đăng', False),
+            ('Váy đỏ', 'Đầm dự tiệc', True),
+        ]
+        Product.objects.bulk_create([
+            Product(name=name, slug=f'product-{index}', description=description, supplier=supplier, price=100, is_published=published)
+            for index, (name, description, published) in enumerate(rows)
+        ])
+        cls.products = {product.name: product.pk for product in Product.objects.all()}
+        ProductSearchIndex.index_products(cls.products.values())
+
+    def setUp(self):
+        ProductSearchIndex.invalidate_stats()
+
+    def _search(self, query, **filters):
+        return list(ProductService.list_products({'search': query, **filters}).values_list('pk', flat=True))
+
+    def test_fold_diacritics(self):
+        self.assertEqual(fold_diacritics('Áo Đỏ Phối Màu'), 'ao do phoi mau')
+        self.assertEqual(fold_diacritics('Ưu đãi'), 'uu dai')
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Áo thun, size-XL (2024)'), ['ao', 'thun', 'size', 'xl', '2024'])
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(tokenize('x' * 100), ['x' * 64])
+
+    def test_name_match_ranks_above_description_match(self):
+        results = self._search('ao thun')
+        self.assertEqual(results[:2], [self.products['Áo thun trắng'], self.products['Quần jean']])
+        self.assertEqual(set(results[2:]), {self.products['Áo sơ mi']})
+
+    def test_prefix_expansion_of_last_term(self):
+        self.assertEqual(self._search('vay do tie'), [self.products['Váy đỏ']])
+
+    def test_unpublished_and_deleted_products_are_filtered_before_ranking(self):
+        self.assertNotIn(self.products['Áo thun nháp'], self._search('thun'))
+        self.assertIn(self.products['Áo thun nháp'], self._search('thun', is_published=False))
+
+        Product.all_objects.filter(pk=self.products['Áo thun trắng']).update(deleted_at=timezone.now())
+        self.assertEqual(self._search('thun'), [self.products['Quần jean']])
+
+    def test_ranking_is_limited_to_queryset_before_truncation(self):
+        with mock.patch.object(ProductSearchIndex, 'MAX_RESULTS', 1):
+            self.assertEqual(ProductSearchIndex.search('thun'), [self.products['Áo thun trắng']])
+        # Phân trang / cắt kết quả áp dụng sau bộ lọc, sản phẩm bị ẩn không chiếm chỗ
+        ranked = ProductSearchIndex.rank(Product.objects.filter(is_published=True), 'nhap thun')
+        self.assertEqual(list(ranked.values_list('pk', flat=True)[:1]), [self.products['Áo thun trắng']])
+
+    def test_unknown_terms_and_missing_index(self):
+        self.assertEqual(self._search('xyz'), [])
+        ProductSearchDocument.objects.all().delete()
+        ProductSearchIndex.invalidate_stats()
+        # Chỉ mục chưa được xây dựng: lọc theo tên
+        self.assertEqual(self._search('Váy'), [self.products['Váy đỏ']])
+
+
+class DirtyFieldsMixinTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        self.product = Product.objects.bulk_create([
+            Product(name='Product', slug='product', description='Old', supplier=supplier, price=100)
+        ])[0]
+
+        # update_fields của từng lần save (None: ghi mọi cột)
+        self.saved = []
+
+        def _record(sender, update_fields, **kwargs):
+            self.saved.append(None if update_fields is None else set(update_fields))
+
+        pre_save.connect(_record, sender=Product, weak=False, dispatch_uid='dirty_fields_test_product')
+        pre_save.connect(_record, sender=Category, weak=False, dispatch_uid='dirty_fields_test_category')
+        self.addCleanup(pre_save.disconnect, sender=Product, dispatch_uid='dirty_fields_test_product')
+        self.addCleanup(pre_save.disconnect, sender=Category, dispatch_uid='dirty_fields_test_category')
+
+    def test_unchanged_save_is_skipped(self):
+        product = Product.objects.get(pk=self.product.pk)
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Product)
+        self.addCleanup(post_save.disconnect, receiver, sender=Product)
+
+        with self.assertNumQueries(0):
+            product.save()
+        # Không ghi gì nên không phát pre_save / post_save (reindex, cache, renditions không cần chạy lại)
+        self.assertEqual(self.saved, [])
+        receiver.assert_not_called()
+
+    def test_update_fields_are_dirty_fields(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = 200
+        product.save()
+        # updated_at được Product.save gán khi có thay đổi
+        self.assertEqual(self.saved, [{'price', 'updated_at'}])
+
+    def test_auto_now_fields_are_written_with_dirty_fields(self):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        category = Category.objects.get(pk=category.pk)
+        self.saved.clear()
+        with mock.patch.object(Category._meta.get_field('updated_at'), 'auto_now', True):
+            category.save()
+            category.name = 'T-Shirts'
+            category.save()
+        self.assertEqual(self.saved, [{'name', 'updated_at'}])
+        self.assertIsNotNone(Category.objects.get(pk=category.pk).updated_at)
+
+    def test_deferred_field_assigned_after_only_is_written(self):
+        product = Product.objects.only('id', 'name').get(pk=self.product.pk)
+        product.description = 'New'
+        product.save()
+        self.assertIn('description', self.saved[0])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).description, 'New')
+
+    def test_generated_field_is_reloaded_after_save(self):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.effective_price, 100)
+        product.sale_price = 80
+        product.save()
+        self.assertEqual(product.effective_price, 80)
+
+    def test_old_image_is_released_without_select(self):
+        Product.objects.filter(pk=self.product.pk).update(
+            image_url=product_media_storage.save('products/old.png', SimpleUploadedFile('old.png', b'old'))
+        )
+        product = Product.objects.get(pk=self.product.pk)
+        old_image = product.image_url.name
+        product.image_url = SimpleUploadedFile('new.png', b'new')
+
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        # Giá trị cũ lấy từ lúc load: không SELECT lại bản ghi sản phẩm
+        product_table = connection.ops.quote_name(Product._meta.db_table)
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('SELECT') and f'FROM {product_table}' in query['sql']])
+        self.assertFalse(MediaBlob.objects.filter(name=old_image).exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).image_url.name, product.image_url.name)
+
+
+class AllocateUniqueSlugsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+
+    def _create(self, *slugs, deleted=False):
+        Product.objects.bulk_create([
+            Product(name=slug, slug=slug, supplier=self.supplier, deleted_at=timezone.now() if deleted else None)
+            for slug in slugs
+        ])
+
+    def test_duplicates_in_batch(self):
+        self.assertEqual(
+            allocate_unique_slugs(Product, ['Áo thun', 'Ao Thun', 'Quần', 'áo thun']),
+            ['ao-thun', 'ao-thun-1', 'quan', 'ao-thun-2'],
+        )
+
+    def test_existing_suffixes(self):
+        self._create('ao-thun', 'ao-thun-1', 'ao-thun-3')
+        self.assertEqual(allocate_unique_slugs(Product, ['Áo thun', 'Áo thun', 'Áo thun']), ['ao-thun-2', 'ao-thun-4', 'ao-thun-5'])
+
+    def test_prefix_only_matches_are_ignored(self):
+        # Chỉ trùng tiền tố, không phải base hay base-<số>
+        self._create('ao-thun-trang', 'ao-thun-1a', 'ao-thunx')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(allocate_unique_slugs(Product, ['Áo thun']), ['ao-thun'])
+        self.assertEqual(len(queries), 1)
+
+    def test_soft_deleted_slugs_are_taken(self):
+        # Bản ghi đã xóa mềm vẫn giữ slug cho tới khi bị xóa thật
+        self._create('vay', deleted=True)
+        self.assertEqual(allocate_unique_slugs(Product, ['Váy']), ['vay-1'])
+
+    def test_update_excludes_own_slug(self):
+        self._create('vay')
+        product = Product.objects.get(slug='vay')
+        self.assertEqual(allocate_unique_slugs(Product, ['Váy'], instance_pk=product.pk), ['vay'])
+
+
+# Bảng dạng viberstore_product_data.xlsx: tiêu đề ở dòng 3, dòng mục nhóm / danh mục, mỗi màu một cột
+CATALOG_CSV = r"""Viberstore catalog,,,,,,,,
+,,,,,,,,
+STT,name,original_price,selling_price,description,sizes,image,BLACK,WHITE
+Men's clothing,Shirt,,,,,,,
+1,T-shirt,,,,,,,
+1,Loose Fit,449,498,Cotton tee,S - M,\Pictures\OOP\1.jpg,\Pictures\OOP\2.jpg,\Pictures\OOP\3.jpg
+2,Oversized Fit,499,548,Baggy tee,L,\Pictures\OOP\4.jpg,,\Pictures\OOP\5.jpg
+2,Polo,,,,,,,
+1,Linen polo,899,948,Linen,S-M,\Pictures\OOP\6.jpg,\Pictures\OOP\7.jpg,
+"""
+
+
+class CatalogImporterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        men = Category.objects.create(name='MEN', slug='men')
+        cls.tshirt = Category.objects.create(name='T-shirt', slug='t-shirt', parent=men)
+        cls.polo = Category.objects.create(name='Polo', slug='polo', parent=men)
+        cls.men = men
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'catalog.csv')
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(CATALOG_CSV)
+
+    def _import(self, **kwargs):
+        run_kwargs = {key: kwargs.pop(key) for key in ('start_row', 'on_chunk') if key in kwargs}
+        with self.captureOnCommitCallbacks(execute=False):
+            return CatalogImporter(price_unit=1000, **kwargs).run(self.path, **run_kwargs)
+
+    def _variants(self, name):
+        return sorted(
+            ProductVariant.objects.filter(product__name=name).values_list('size__name', 'color__name')
+        )
+
+    def test_sectioned_rows(self):
+        rows = list(iter_rows(self.path))
+        # Tiêu đề ở dòng 3, dòng mục không sinh biến thể; size x màu được tách theo từng dòng
+        self.assertEqual([number for number, _ in rows], [6, 6, 6, 6, 7, 9, 9])
+        number, first = rows[0]
+        self.assertEqual(
+            (first['product_name'], first['category'], first['image_url'], first['size'], first['color']),
+            ('Loose Fit', 'MEN > T-shirt', 'products/1.jpg', 'S', 'BLACK'),
+        )
+        self.assertEqual(rows[-1][1]['category'], 'MEN > Polo')
+        self.assertEqual([(row['size'], row['color']) for _, row in rows[-2:]], [('S', 'BLACK'), ('M', 'BLACK')])
+
+    def test_import(self):
+        stats = self._import()
+        self.assertEqual((stats.rows, stats.products_created, stats.variants_created, stats.errors), (7, 3, 7, []))
+
+        product = Product.objects.get(name='Loose Fit')
+        self.assertEqual((product.price, product.cost_price, product.supplier_id), (498000, 449000, self.supplier.pk))
+        self.assertFalse(product.is_published)
+        self.assertEqual(self._variants('Loose Fit'), [('M', 'BLACK'), ('M', 'WHITE'), ('S', 'BLACK'), ('S', 'WHITE')])
+        self.assertEqual(self._variants('Oversized Fit'), [('L', 'WHITE')])
+        self.assertEqual(
+            set(ProductCategory.objects.filter(product__name='Linen polo').values_list('category_id', flat=True)),
+            {self.men.pk, self.polo.pk},
+        )
+        self.assertEqual(Product.objects.get(name='Linen polo').total_stock, 0)
+
+    def test_new_sizes_and_colors_invalidate_lookup_tables(self):
+        # bulk_create không phát signal: importer phải tự vô hiệu hóa bảng tra cứu Size / Color
+        with mock.patch.object(LookupTable, 'invalidate', autospec=True) as invalidate:
+            self._import()
+        self.assertEqual(
+            sorted(table.model.__name__ for (table,), _ in invalidate.call_args_list), ['Color', 'Size'],
+        )
+
+        # Lần nhập lại không tạo size / màu mới
+        with mock.patch.object(LookupTable, 'invalidate', autospec=True) as invalidate:
+            self._import()
+        invalidate.assert_not_called()
+
+    def test_reimport_skips_existing_variants(self):
+        self._import()
+        stats = self._import()
+        self.assertEqual((stats.products_created, stats.variants_created, stats.variants_skipped), (0, 0, 7))
+        self.assertEqual(ProductVariant.objects.count(), 7)
+        self.assertEqual(ProductCategory.objects.count(), 6)
+
+    def test_failed_chunk_is_retried_product_by_product(self):
+        write_chunk = CatalogImporter._write_chunk
+
+        def _fail_oversized(importer, rows):
+            if any(row.product_name == 'Oversized Fit' for row in rows):
+                raise DatabaseError("Simulated failure.")
+            return write_chunk(importer, rows)
+
+        with mock.patch.object(CatalogImporter, '_write_chunk', _fail_oversized):
+            stats = self._import()
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'Loose Fit', 'Linen polo'})
+        self.assertEqual(stats.errors, [(7, "Database error: Simulated failure.")])
+        self.assertEqual(stats.variants_created, 6)
+
+    def test_checkpoints_and_resume(self):
+        checkpoints = []
+        self._import(chunk_size=1, on_chunk=lambda row_number, stats: checkpoints.append(row_number))
+        # Lô chỉ bị ngắt giữa hai dòng của file: 4 biến thể của dòng 6 nằm chung một lô
+        self.assertEqual(checkpoints, [6, 7, 9])
+
+        Product.objects.all().delete()
+        stats = self._import(start_row=7)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Linen polo'])
+        self.assertEqual(stats.variants_created, 2)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'publishing-tests'}},
+    PRODUCT_PUBLISH_ETA_HORIZON=3600,
+)
+@mock.patch('product.tasks.publish_product.apply_async')
+class ProductPublishTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def _create(self, name, publish_at, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(name=name, slug=name.lower(), supplier=self.supplier, publish_at=publish_at, **fields)
+
+    @staticmethod
+    def _enqueued(apply_async):
+        return [(call.kwargs['args'][0], call.kwargs['eta']) for call in apply_async.call_args_list]
+
+    def test_schedule_only_within_horizon(self, apply_async):
+        soon = timezone.now() + timedelta(minutes=10)
+        product = self._create('Soon', soon)
+        self._create('Later', timezone.now() + timedelta(hours=2))
+        self._create('Published', soon, is_published=True)
+        self.assertEqual(self._enqueued(apply_async), [(product.pk, soon)])
+
+    def test_enqueue_is_deduplicated_until_broker_error(self, apply_async):
+        product = self._create('Soon', timezone.now() + timedelta(minutes=10))
+        self.assertEqual(apply_async.call_count, 1)
+
+        # Task định kỳ xét lại cùng lịch: không gửi lặp
+        self.assertEqual(ProductPublishService.schedule_upcoming(), 1)
+        self.assertEqual(apply_async.call_count, 1)
+
+        # Gửi lỗi thì bỏ khóa chống lặp để lần sau gửi lại
+        apply_async.side_effect = RuntimeError("Broker down.")
+        ProductPublishService._enqueue(product.pk, product.publish_at + timedelta(minutes=1))
+        apply_async.side_effect = None
+        ProductPublishService._enqueue(product.pk, product.publish_at + timedelta(minutes=1))
+        self.assertEqual(apply_async.call_count, 3)
+
+    def test_publish_is_conditional(self, apply_async):
+        past = timezone.now() - timedelta(minutes=1)
+        product = self._create('Due', past)
+        future = self._create('Future', timezone.now() + timedelta(minutes=10))
+
+        # Lịch đã bị đổi so với lúc gửi task
+        self.assertFalse(ProductPublishService.publish(product.pk, past - timedelta(minutes=1)))
+        # Task chạy sớm
+        self.assertFalse(publish_product(future.pk, future.publish_at.isoformat()))
+        self.assertTrue(publish_product(product.pk, past.isoformat()))
+        # Task lặp
+        self.assertFalse(ProductPublishService.publish(product.pk, past))
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'is_published')), {'Due': True, 'Future': False}
+        )
+
+    @override_settings(PRODUCT_PUBLISH_SWEEP_BATCH_SIZE=2)
+    def test_overdue_sweep_publishes_in_batches(self, apply_async):
+        now = timezone.now()
+        # bulk_create: không phát signal hẹn giờ
+        Product.objects.bulk_create([
+            Product(name=f'Overdue {index}', slug=f'overdue-{index}', supplier=self.supplier, publish_at=now - timedelta(days=index * 30))
+            for index in range(5)
+        ] + [
+            Product(name='Upcoming', slug='upcoming', supplier=self.supplier, publish_at=now + timedelta(minutes=30)),
+            Product(name='Far', slug='far', supplier=self.supplier, publish_at=now + timedelta(days=2)),
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(publish_scheduled_products(), 5)
+        # 3 lô (2, 2, 1); lô thiếu là lô cuối
+        batches = [query for query in queries.captured_queries if 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(Product.objects.filter(is_published=True).count(), 5)
+        self.assertEqual([product_id for product_id, _ in self._enqueued(apply_async)], [Product.objects.get(name='Upcoming').pk])
+
+    def test_signal_schedules_only_when_publish_at_changes(self, apply_async):
+        with mock.patch.object(ProductPublishService, 'schedule') as schedule:
+            product = self._create('Soon', timezone.now() - timedelta(days=1), is_published=True)
+            self.assertEqual(schedule.call_count, 1)
+
+            # Bỏ đăng sản phẩm có lịch cũ: không được đăng lại
+            product.is_published = False
+            product.save()
+            self.assertEqual(schedule.call_count, 1)
+
+            product.publish_at = timezone.now() + timedelta(minutes=5)
+            product.save()
+            self.assertEqual(schedule.call_count, 2)
+
+            # Instance không được load từ database: không biết giá trị cũ, luôn lên lịch
+            Product(
+                pk=product.pk, name=product.name, slug=product.slug, supplier=self.supplier,
+                publish_at=product.publish_at, created_at=product.created_at,
+            ).save()
+            self.assertEqual(schedule.call_count, 3)
+
+
+class ProductVariantGridTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(
+            company_name='Test Supplier', slug='test-supplier', contact_person='Test', email='supplier@example.com',
+            phone_number='0900000000', address='Test', tax_id='TAX', website='https://example.com',
+        )
+        cls.small, cls.large = Product.objects.bulk_create([
+            Product(name='Small Grid', slug='small-grid', supplier=cls.supplier, price=100),
+            Product(name='Large Grid', slug='large-grid', supplier=cls.supplier, price=100),
+        ])
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self._reset_lookups()
+
+    @staticmethod
+    def _reset_lookups():
+        # Bảng tra cứu là biến module: bỏ size / màu đã nạp (kể cả của test trước đã rollback)
+        bump_version(size_lookup.version_key)
+        bump_version(color_lookup.version_key)
+
+    def _create_grid(self, product, size_names, colors, **kwargs):
+        # Nạp lại mỗi lần để số truy vấn không phụ thuộc lần gọi trước
+        self._reset_lookups()
+        with self.captureOnCommitCallbacks(execute=False):
+            return ProductVariantService.create_product_variant_grid(product.pk, size_names, colors, **kwargs)
+
+    def test_query_count_does_not_depend_on_grid_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._create_grid(self.small, ['S', 'M'], [('Red', '#FF0000'), ('Blue', '#0000FF')])
+
+        sizes = ['XS', 'L', 'XL', 'XXL']
+        colors = [('Green', '#00FF00'), ('Black', '#000000'), ('White', '#FFFFFF')]
+        with self.assertNumQueries(len(queries)):
+            variants = self._create_grid(self.large, sizes, colors, stock=5)
+        self.assertEqual(len(variants), 12)
+        self.assertEqual(
+            [(variant.color.name, variant.size.name) for variant in variants[:5]],
+            [('GREEN', 'XS'), ('GREEN', 'L'), ('GREEN', 'XL'), ('GREEN', 'XXL'), ('BLACK', 'XS')],
+        )
+
+        # Size / màu đã có: không tạo lại
+        counts = (Size.objects.count(), Color.objects.count())
+        self._create_grid(self.small, ['XL', 'S'], [('white', '#ffffff')])
+        self.assertEqual((Size.objects.count(), Color.objects.count()), counts)
+
+    def test_duplicate_sizes_and_colors_are_collapsed(self):
+        variants = self._create_grid(self.small, ['s', ' S ', 'm', ''], [('Red', '#FF0000'), ('red ', '#FF0000'), None])
+        self.assertEqual(
+            [(variant.size.name, variant.color.name if variant.color else None) for variant in variants],
+            [('S', 'RED'), ('M', 'RED'), ('S', None), ('M', None)],
+        )
+        self.assertEqual(Size.objects.filter(name='S').count(), 1)
+        self.assertEqual(len({variant.sku for variant in variants}), 4)
+
+        with self.assertRaises(ValueError):
+            self._create_grid(self.small, [' ', ''], [None])
+
+    def test_shared_image_is_referenced_by_every_variant(self):
+        image = SimpleUploadedFile('grid.png', b'grid', content_type='image/png')
+        variants = self._create_grid(self.small, ['S', 'M', 'L'], [('Red', '#FF0000'), ('Blue', '#0000FF')], image_url=image)
+
+        names = {variant.image_url.name for variant in variants}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(MediaBlob.objects.get(name=names.pop()).ref_count, len(variants))
+
+    def test_colors_json_from_multipart_form(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='secret'))
+        url = f'/api/v1/products/{self.small.pk}/variants/'
+
+        with self.captureOnCommitCallbacks(execute=False):
+            response = client.post(url, {
+                'size_names': 'S, M',
+                'colors': json.dumps([{'color_name': 'Red', 'hex_code': '#FF0000'}, {'color_name': 'Blue', 'hex_code': '#0000FF'}]),
+                'stock': 3,
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProductVariant.objects.filter(product=self.small, stock=3).count(), 4)
+
+        for colors in ('not json', json.dumps({'color_name': 'Red'}), json.dumps([{'hex_code': '#FF0000'}])):
+            response = client.post(url, {'size_names': 'L', 'colors': colors})
+            self.assertEqual(response.status_code, 400, colors)
+        self.assertEqual(ProductVariant.objects.filter(product=self.small).count(), 4)
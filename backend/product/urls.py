@@ -29,14 +29,22 @@ urlpatterns = [
     # /api/products/{product_pk}/variants/
     path('products/<int:product_pk>/variants/', views.ProductVariantListCreateAPIView.as_view(), name='product-variant-list-create'),
     path("products/<str:slug>/variants/", views.ProductVariantsBySlugAPIView.as_view(), name="product-variant-list-create-by-slug"),
+    # /api/products/{slug}/variant-matrix/
+    path("products/<str:slug>/variant-matrix/", views.ProductVariantMatrixBySlugAPIView.as_view(), name="product-variant-matrix-by-slug"),
     # /api/products/{product_pk}/categories/
     path('products/<int:product_pk>/categories/', views.ProductCategoriesAPIView.as_view(), name='product-categories'),
     # /api/products/{slug}/categories/
     path('products/<str:slug>/categories/', views.ProductCategoriesBySlugAPIView.as_view(), name='product-categories-by-slug'),
+    # /api/products/{slug}/category-paths/
+    path('products/<str:slug>/category-paths/', views.ProductCategoryPathsBySlugAPIView.as_view(), name='product-category-paths-by-slug'),
     # Detail view cho variant (dùng chung cho cả 2 cách list)
     # /api/variants/{pk}/
     path('variants/<int:pk>/', views.ProductVariantDetailAPIView.as_view(), name='variant-detail'),
 
+    # --- Deletion Job URLs (Admin Only) ---
+    # /api/deletion-jobs/{pk}/
+    path('deletion-jobs/<int:pk>/', views.DeletionJobDetailAPIView.as_view(), name='deletion-job-detail'),
+
     # --- KHÔNG CÓ URL cho Size và Color theo yêu cầu ---
     # Chúng được quản lý ngầm thông qua Product Variant API
 ]
\ No newline at end of file
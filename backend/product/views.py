@@ -1,3 +1,4 @@
+import json
 import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -9,11 +10,17 @@ from django.core.exceptions import ValidationError
 # Imports cho Swagger
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from typing import Optional
-from product.services import ProductService, SupplierService, ProductVariantService, CategoryService
-from product.models import Product, ProductVariant, Category
+from typing import List, Optional
+from product.services import (
+    ProductService, SupplierService, ProductVariantService, CategoryService, CategoryTreeService, ProductFacetService,
+    ProductCategoryPathService,
+)
+from product.models import Product, ProductVariant, Category, DeletionJob
+from product.caching import ProductDetailCache
+from product.pagination import ORDERINGS, PRICE_SORTS, ProductKeysetPagination
 from product.serializers import (
-    SupplierSerializer, ProductSerializer, CategorySerializer, ProductVariantSerializer, BaseCategorySerializer
+    SupplierSerializer, ProductSerializer, CategorySerializer, ProductVariantSerializer, BaseCategorySerializer,
+    DeletionJobSerializer,
 )
 
 from rest_framework import permissions
@@ -34,6 +41,15 @@ def _parse_query_param_bool(param_value: Optional[str], default: Optional[bool]
     else:
         raise ValueError(f"Invalid boolean value: {param_value}")
 
+def _parse_query_param_id_list(param_value: Optional[str]) -> Optional[List[int]]:
+    """Chuyển chuỗi ID phân tách bằng dấu phẩy ('1,2,3') thành danh sách số nguyên."""
+    if param_value is None:
+        return None
+    try:
+        return [int(value) for value in param_value.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid ID list: {param_value}")
+
 # --- Supplier API Views ---
 
 class SupplierListCreateAPIView(APIView):
@@ -200,9 +216,10 @@ class SupplierDetailAPIView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Delete Supplier",
-        operation_description="Deletes a specific supplier by its ID. Associated products might be deleted based on `on_delete` policy.",
+        operation_description="Soft-deletes a supplier and all of its products (hidden immediately). "
+                              "Rows and media are purged in the background; track progress via /deletion-jobs/{id}/.",
         responses={
-            204: openapi.Response('No Content'),
+            202: DeletionJobSerializer,
             404: openapi.Response('Not Found'),
             500: openapi.Response('Internal Server Error'),
         },
@@ -210,9 +227,9 @@ class SupplierDetailAPIView(APIView):
     )
     def delete(self, request, pk, format=None):
         try:
-            success = SupplierService.delete_supplier(pk)
-            if success:
-                return Response(status=status.HTTP_204_NO_CONTENT)
+            job = SupplierService.delete_supplier(pk)
+            if job is not None:
+                return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
             else:
                 return Response({"error": "Supplier not found."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -266,6 +283,9 @@ class CategoryListCreateAPIView(APIView):
                 'product_id': request.query_params.get('product_id'),
             }
             filters = {k: v for k, v in filters.items() if v is not None}
+            if not filters:
+                # Menu danh mục: phục vụ trực tiếp từ cây đã cache, không truy vấn database
+                return Response(CategoryTreeService.get_tree(request))
             categories = CategoryService.list_categories(filters=filters)
             if request.query_params.get('product_id'):
                 serializer =  BaseCategorySerializer(categories, many=True, context={'request': request})
@@ -510,11 +530,17 @@ class ProductListCreateAPIView(APIView):
             openapi.Parameter('published', openapi.IN_QUERY, description="Filter by published status ('true' or 'false')", type=openapi.TYPE_BOOLEAN, required=False),
             openapi.Parameter('min_price', openapi.IN_QUERY, description="Filter by minimum price", type=openapi.TYPE_NUMBER, required=False),
             openapi.Parameter('max_price', openapi.IN_QUERY, description="Filter by maximum price", type=openapi.TYPE_NUMBER, required=False),
-            openapi.Parameter('search', openapi.IN_QUERY, description="Search term for product name, description, or variant SKU", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('search', openapi.IN_QUERY, description="Search term for product name, description, or variant SKU. Results are ordered by relevance unless 'sort' or 'latest' is given; cannot be combined with 'cursor'/'page_size'", type=openapi.TYPE_STRING, required=False),
             openapi.Parameter('limit', openapi.IN_QUERY, description="Limit the number of products returned", type=openapi.TYPE_INTEGER, required=False),
             openapi.Parameter('latest', openapi.IN_QUERY, description="Sort by publish_at if true (only published products)", type=openapi.TYPE_BOOLEAN, required=False),
+            openapi.Parameter('sort', openapi.IN_QUERY, description="Sort by effective price (sale price if on sale, otherwise price)", type=openapi.TYPE_STRING, enum=['price_asc', 'price_desc'], required=False),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from a previous page's 'next'/'previous' link", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Page size for cursor pagination (max 100). Sending 'cursor' or 'page_size' returns {next, previous, results}", type=openapi.TYPE_INTEGER, required=False),
+            openapi.Parameter('size', openapi.IN_QUERY, description="Filter by Size IDs (comma-separated)", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('color', openapi.IN_QUERY, description="Filter by Color IDs (comma-separated)", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('facets', openapi.IN_QUERY, description="Include product counts per size, color, category and price range in a 'facets' key", type=openapi.TYPE_BOOLEAN, required=False),
         ],
-        responses={200: ProductSerializer(many=True), 500: "Internal server error"},
+        responses={200: ProductSerializer(many=True), 400: "Invalid cursor or page size, or cursor combined with search", 500: "Internal server error"},
         tags=['Products']
     )
     def get(self, request, format=None):
@@ -526,8 +552,11 @@ class ProductListCreateAPIView(APIView):
                 'min_price': request.query_params.get('min_price'),
                 'max_price': request.query_params.get('max_price'),
                 'search': request.query_params.get('search'),
+                'size_ids': _parse_query_param_id_list(request.query_params.get('size')),
+                'color_ids': _parse_query_param_id_list(request.query_params.get('color')),
             }
             filters = {k: v for k, v in filters.items() if v is not None}
+            with_facets = _parse_query_param_bool(request.query_params.get('facets'), default=False)
 
             limit = request.query_params.get('limit', None)
             if limit is not None:
@@ -539,7 +568,28 @@ class ProductListCreateAPIView(APIView):
             products = ProductService.list_products(filters=filters)
             # Apply 'latest' sorting if specified
             latest = _parse_query_param_bool(request.query_params.get('latest'), default=False)
-            if latest:
+            sort = request.query_params.get('sort')
+            if sort is not None and sort not in PRICE_SORTS:
+                return Response({"error": f"Invalid sort value. Must be one of: {', '.join(PRICE_SORTS)}."}, status=status.HTTP_400_BAD_REQUEST)
+            ordering = sort or ('latest' if latest else 'created')
+
+            # Phân trang keyset khi client gửi cursor/page_size.
+            # Không dùng được với search: thứ tự theo điểm BM25 không có khóa keyset ổn định
+            if ProductKeysetPagination.is_requested(request):
+                if 'search' in filters:
+                    return Response({"error": "Cursor pagination cannot be combined with search. Use 'limit' instead."}, status=status.HTTP_400_BAD_REQUEST)
+                paginator = ProductKeysetPagination(ordering=ordering)
+                page = paginator.paginate_queryset(products, request)
+                serializer = ProductSerializer(page, many=True, context={'request': request})
+                if with_facets:
+                    return paginator.get_paginated_response(serializer.data, facets=ProductFacetService.get_facets(filters))
+                return paginator.get_paginated_response(serializer.data)
+
+            # Có search: mặc định xếp theo điểm BM25; sort / latest được gửi kèm sẽ thay thứ tự đó
+            if sort is not None:
+                # Dùng index (is_published, effective_price, id)
+                products = products.order_by(*[f'-{field}' if descending else field for field, descending in ORDERINGS[sort]])
+            elif latest:
                 products = products.order_by('-publish_at')
 
             # Apply slicing (limit) after filtering and ordering
@@ -547,7 +597,11 @@ class ProductListCreateAPIView(APIView):
                 products = products[:limit]
 
             serializer = ProductSerializer(products, many=True, context={'request': request})
+            if with_facets:
+                return Response({'facets': ProductFacetService.get_facets(filters), 'results': serializer.data})
             return Response(serializer.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error listing products: {e}", exc_info=True)
             return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -736,15 +790,16 @@ class ProductDetailAPIView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Delete Product",
-        operation_description="Deletes a specific product and potentially its variants and category links.",
-        responses={204: 'No Content', 404: "Internal server erroe", 500: "Internal server erroe"},
+        operation_description="Soft-deletes a product (hidden immediately). Its variants, category links and images "
+                              "are purged in the background; track progress via /deletion-jobs/{id}/.",
+        responses={202: DeletionJobSerializer, 404: "Not Found", 500: "Internal server erroe"},
         tags=['Products']
     )
     def delete(self, request, pk, format=None):
         try:
-            success = ProductService.delete_product(pk)
-            if success:
-                return Response(status=status.HTTP_204_NO_CONTENT)
+            job = ProductService.delete_product(pk)
+            if job is not None:
+                return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
             else:
                  return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -771,11 +826,10 @@ class ProductDetailBySlugAPIView(APIView):
     )
     def get(self, request, slug, format=None):
         try:
-            product = ProductService.get_product_by_slug(slug)
-            if not product:
+            data = ProductDetailCache.get_detail(slug, request=request)
+            if data is None:
                 return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
-            serializer = ProductSerializer(product, context={'request': request})
-            return Response(serializer.data)
+            return Response(data)
         except Exception as e:
             logger.error(f"Error retrieving product by slug '{slug}': {e}", exc_info=True)
             return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -868,6 +922,8 @@ class ProductVariantListCreateAPIView(APIView):
         Optionally provide 'size' (ID) or 'size_name' (string).
         Optionally provide 'color' (ID) or 'color_name' (string) and 'color_hex'.
         Size/Color will be created if 'size_name'/'color_name' is provided and doesn't exist.
+        Send 'colors' (JSON list of {"color_name", "hex_code"}) instead of 'color_name'/'hex_code'
+        to create the whole size x color grid in one request.
         """,
         manual_parameters=[
              openapi.Parameter('product_pk', openapi.IN_PATH, description="(Optional) Product ID if using nested URL", type=openapi.TYPE_INTEGER, required=False)
@@ -879,6 +935,7 @@ class ProductVariantListCreateAPIView(APIView):
                 'size_names': openapi.Schema(type=openapi.TYPE_STRING, description="Comma-separated list of size names (if not using size ID)"),
                 'color_name': openapi.Schema(type=openapi.TYPE_STRING, description="Color name (if not using color ID)"),
                 'hex_code': openapi.Schema(type=openapi.TYPE_STRING, description="Hex code for the color (if not using color ID)"),
+                'colors': openapi.Schema(type=openapi.TYPE_STRING, description='JSON list of colors, e.g. [{"color_name": "RED", "hex_code": "#FF0000"}] (instead of color_name/hex_code)'),
                 'weight_grams': openapi.Schema(type=openapi.TYPE_NUMBER, format=openapi.FORMAT_DECIMAL, description="Weight in grams"),
                 'stock': openapi.Schema(type=openapi.TYPE_INTEGER, description="Available stock quantity", default=0),
                    'image_url': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_BINARY, description="Variant specific image"),}
@@ -898,6 +955,16 @@ class ProductVariantListCreateAPIView(APIView):
              return Response({"product": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
         if request.data['size_names']:
             variant_data['size_names'] = [s.strip() for s in request.data['size_names'].split(',')]  # Tách thành list và loại bỏ khoảng trắng
+        colors = request.data.get('colors')
+        if colors:
+            # Multipart form gửi colors dạng chuỗi JSON
+            try:
+                colors = json.loads(colors) if isinstance(colors, str) else colors
+            except ValueError:
+                return Response({"error": "Invalid colors value. Must be a JSON list."}, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(colors, list) or not all(isinstance(color, dict) for color in colors):
+                return Response({"error": "Invalid colors value. Must be a JSON list of objects."}, status=status.HTTP_400_BAD_REQUEST)
+            variant_data['colors'] = colors
         variant_data['color_name'] = request.data.get('color_name', None)  # Đảm bảo trường này tồn tại
         variant_data['hex_code'] = request.data.get('hex_code', None)  # Đảm bảo trường này tồn tại
         variant_data['stock'] = request.data.get('stock', 0)  # Đảm bảo trường này tồn tại
@@ -1058,40 +1125,54 @@ class ProductVariantsBySlugAPIView(APIView):
     )
     def get(self, request, slug, format=None):
         try:
-            variants = ProductVariantService.get_variants_by_product_slug(slug)
-            if variants is None:
+            data = ProductDetailCache.get_variants(slug, request=request)
+            if data is None:
                 return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
-            serializer = ProductVariantSerializer(variants, many=True, context={'request': request})
-            return Response(serializer.data)
+            return Response(data)
         except Exception as e:
             logger.error(f"Error retrieving variants for product slug '{slug}': {e}", exc_info=True)
             return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ProductVariantMatrixBySlugAPIView(APIView):
+    """
+    Retrieve the variant matrix of a product by slug:
+    the product once, a size axis, a color axis and a grid[color][size] of variants.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve Product Variant Matrix by Slug",
+        operation_description="Returns {product, sizes, colors, grid}; grid[i][j] is the variant for colors[i] and sizes[j] "
+                              "as {variant_id, sku, stock, image, is_active}, or null if that combination does not exist.",
+        responses={
+            200: openapi.Response('OK'),
+            404: openapi.Response('Not Found'),
+            500: openapi.Response('Internal Server Error'),
+        },
+        tags=['Product Variants']
+    )
+    def get(self, request, slug, format=None):
+        try:
+            data = ProductDetailCache.get_variant_matrix(slug, request=request)
+            if data is None:
+                return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(data)
+        except Exception as e:
+            logger.error(f"Error retrieving variant matrix for product slug '{slug}': {e}", exc_info=True)
+            return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class ProductCategoriesAPIView(APIView):
     """
     API view to retrieve categories of a specific product.
     """
     def get(self, request, product_pk, format=None):
         try:
-            # Get top-level categories for the product
-            categories = Category.objects.filter(
-                productcategory__product_id=product_pk, parent__isnull=True
-            ).distinct()
-
-            if not categories.exists():
+            # Category gốc đầu tiên kèm các category con của sản phẩm, dựng từ đường dẫn danh mục đã cache
+            category = ProductCategoryPathService.get_primary_category(product_id=product_pk, request=request)
+            if category is None:
                 return Response({"error": "No categories found for this product."}, status=status.HTTP_404_NOT_FOUND)
-
-            # Serialize the top-level categories
-            serializer = CategorySerializer(categories, many=True, context={'request': request})
-
-            # Add subcategories (categories directly associated with the product)
-            for category in serializer.data:
-                subcategories = Category.objects.filter(
-                    productcategory__product_id=product_pk, parent_id=category['id']
-                ).distinct()
-                category['subcategories'] = BaseCategorySerializer(subcategories, many=True, context={'request': request}).data
-
-            return Response(serializer.data[0])  # Return the first category with its subcategories
+            return Response(category)
         except Exception as e:
             logger.error(f"Error retrieving categories for product {product_pk}: {e}", exc_info=True)
             return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1102,25 +1183,61 @@ class ProductCategoriesBySlugAPIView(APIView):
     """
     def get(self, request, slug, format=None):
         try:
-            # Get top-level categories for the product
-            categories = Category.objects.filter(
-                productcategory__product__slug=slug, parent__isnull=True
-            ).distinct()
-
-            if not categories.exists():
+            # Category gốc đầu tiên kèm các category con của sản phẩm, dựng từ đường dẫn danh mục đã cache
+            category = ProductCategoryPathService.get_primary_category(slug=slug, request=request)
+            if category is None:
                 return Response({"error": "No categories found for this product."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(category)
+        except Exception as e:
+            logger.error(f"Error retrieving categories for product slug '{slug}': {e}", exc_info=True)
+            return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            # Serialize the top-level categories
-            serializer = CategorySerializer(categories, many=True, context={'request': request})
+class ProductCategoryPathsBySlugAPIView(APIView):
+    """
+    Retrieve the category paths (breadcrumbs) of a product by slug.
+    """
 
-            # Add subcategories (categories directly associated with the product)
-            for category in serializer.data:
-                subcategories = Category.objects.filter(
-                    productcategory__product__slug=slug, parent_id=category['id']
-                ).distinct()
-                category['subcategories'] = BaseCategorySerializer(subcategories, many=True, context={'request': request}).data
+    permission_classes = [permissions.AllowAny]
 
-            return Response(serializer.data[0])  # Return the first category with its subcategories
+    @swagger_auto_schema(
+        operation_summary="Retrieve Product Category Paths by Slug",
+        operation_description="Returns {product, paths}; each path is the list of categories from a root category "
+                              "down to a category assigned to the product.",
+        responses={
+            200: openapi.Response('OK'),
+            404: openapi.Response('Not Found'),
+            500: openapi.Response('Internal Server Error'),
+        },
+        tags=['Products']
+    )
+    def get(self, request, slug, format=None):
+        try:
+            data = ProductCategoryPathService.get_paths(slug=slug, request=request)
+            if data is None:
+                return Response({"error": "No categories found for this product."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(data)
         except Exception as e:
-            logger.error(f"Error retrieving categories for product slug '{slug}': {e}", exc_info=True)
-            return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            logger.error(f"Error retrieving category paths for product slug '{slug}': {e}", exc_info=True)
+            return Response({"error": "An internal server error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DeletionJobDetailAPIView(APIView):
+    """
+    Theo dõi tiến trình xóa nền Product / Supplier (Admin Only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve Deletion Job",
+        operation_description="Returns the status and progress of a background product/supplier deletion.",
+        responses={
+            200: DeletionJobSerializer,
+            404: openapi.Response('Not Found'),
+        },
+        tags=['Deletion Jobs']
+    )
+    def get(self, request, pk, format=None):
+        job = DeletionJob.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"error": "Deletion job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DeletionJobSerializer(job).data)
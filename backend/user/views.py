@@ -20,6 +20,7 @@ from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from rest_framework_simplejwt.views import TokenRefreshView
 from user.email_conf import send_html_email, hash_email
 from django.core.cache import cache
+from cart.guest import GuestCartService
 
 # logging info
 import logging
@@ -81,10 +82,27 @@ class RegisterView(APIView):
 class LoginView(TokenObtainPairView):
 
     serializer_class = CustomTokenObtainPairSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        # Giữ serializer để lấy user đã xác thực (gộp giỏ khách)
+        self.token_serializer = super().get_serializer(*args, **kwargs)
+        return self.token_serializer
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         data = response.data
 
+        # Gộp giỏ hàng của khách (cookie đã ký) vào giỏ của user trong một lần ghi
+        guest_token = GuestCartService.get_token(request)
+        if guest_token:
+            try:
+                GuestCartService.merge_into_user(guest_token, self.token_serializer.user)
+            except Exception as e:
+                # Không chặn đăng nhập vì lỗi gộp giỏ; giỏ khách còn nguyên trong Redis tới khi hết hạn
+                logger.error(f"Error merging guest cart on login: {e}", exc_info=True)
+            else:
+                GuestCartService.delete_cookie(response)
+
         # Set cookies
         access_token = data.get('access')
         refresh_token = data.get('refresh')
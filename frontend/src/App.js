@@ -86,11 +86,8 @@ function App() {
       setIsUserLogin(loginStatus);
     };
     checkLoginStatus();
-    if (isUserLogin) {
-      getShoppingCart();
-      return;
-    }
-    setShoppingCart([]);
+    // Guests have a server-side cart too (guest cart cookie); it is merged into the user's cart on login
+    getShoppingCart();
   }, [isUserLogin]);
 
   const listHideHeaderFooter = ["/signup", "/login", "/recover-password"];
@@ -1,6 +1,7 @@
 import React, { useState, useContext, useEffect, useCallback } from "react";
 import "./CartItem.scss";
 import formatCurrencyVN from "../../utils/formatCurrencyVN";
+import flattenVariantMatrix from "../../utils/flattenVariantMatrix";
 import cartSurvice from "../../services/cartSurvice";
 import AcceptancePopup from "../AcceptancePopup/AcceptancePopup";
 import WaitingOverlay from "../WaitingOverlay/WaitingOverlay";
@@ -66,7 +67,9 @@ const CartItem = ({
 
   const changeSelectedVariant = () => {
     if (selectedColor && selectedSize) {
-      const matchingVariant = cartItem.available_variants.find(
+      const matchingVariant = flattenVariantMatrix(
+        cartItem.available_variants
+      ).find(
         (variant) =>
           variant.color === selectedColor.id && variant.size === selectedSize.id
       );
@@ -86,7 +89,7 @@ const CartItem = ({
     if (cartItem.available_variants) {
       const updatedVariantGroup = { colors: [], sizes: {}, images: {} };
 
-      cartItem.available_variants.forEach((variant) => {
+      flattenVariantMatrix(cartItem.available_variants).forEach((variant) => {
         const { color_details, size_details, image_url } = variant;
 
         // Add color details if not already added
@@ -5,6 +5,7 @@ import { useParams, useNavigate } from "react-router-dom";
 
 import productService from "../../services/productService";
 import formatCurrencyVN from "../../utils/formatCurrencyVN";
+import flattenVariantMatrix from "../../utils/flattenVariantMatrix";
 import ModalLogin from "../../components/ModalLogin/ModalLogin";
 import { AppContext } from "../../App";
 import cartSurvice from "../../services/cartSurvice";
@@ -14,7 +15,7 @@ import ProductContainer from "../../components/ProductContainer/ProductContainer
 const ProductDetailPage = () => {
   const { slug } = useParams();
   const navigate = useNavigate();
-  const { setOnLoading, isUserLogin } = useContext(AppContext);
+  const { setOnLoading } = useContext(AppContext);
   const [product, setProduct] = useState({});
   const [isOpenModalLogin, setIsOpenModalLogin] = useState(false);
   const [productVariantGroup, setProductVariantGroup] = useState({
@@ -66,11 +67,7 @@ const ProductDetailPage = () => {
 
     const variantId = selectedVariant.id; // Get variant_id
 
-    if (!isUserLogin) {
-      handleToggleModalLogin();
-      return;
-    }
-
+    // Guests can add to cart too: the server keeps a guest cart and merges it on login
     setOnLoading(true);
     try {
       const response = await cartSurvice.addProductToCart(quantity, variantId);
@@ -150,9 +147,10 @@ const ProductDetailPage = () => {
 
   const fetchProductVariantsBySlug = async (slug) => {
     try {
-      const fetchedVariants = await productService.getProductVariantsBySlug(
+      const variantMatrix = await productService.getProductVariantMatrixBySlug(
         slug
-      ); // Fetch variants by slug
+      ); // Fetch variant matrix by slug
+      const fetchedVariants = flattenVariantMatrix(variantMatrix);
       setVariants(fetchedVariants); // Store fetched variants in state
 
       const updatedVariantGroup = { colors: [], sizes: {}, images: {} };
@@ -1,10 +1,25 @@
 import apiClient from "./apiClient";
 
+// Each product is returned once in `products`; items reference it by variant_details.product
+const denormalizeCart = ({ items = [], products = [] }) => {
+  const productsById = Object.fromEntries(
+    products.map((product) => [product.id, product])
+  );
+  return items.map((item) => {
+    const product = productsById[item.variant_details.product];
+    return {
+      ...item,
+      variant_details: { ...item.variant_details, product_details: product },
+      available_variants: product ? product.available_variants : null,
+    };
+  });
+};
+
 const cartSurvice = {
   getShoppingCart: async () => {
     try {
       const response = await apiClient.get("/cart/");
-      return response.data;
+      return denormalizeCart(response.data);
     } catch (error) {
       console.error("Error while fetching categories", error);
       return;
@@ -24,6 +39,17 @@ const cartSurvice = {
     }
   },
 
+  // items: [{ variant, quantity }]; mode "set" (final quantity, 0 removes) or "add"
+  bulkUpdateCart: async (items, mode = "set") => {
+    try {
+      const response = await apiClient.post("/cart/bulk/", { items, mode });
+      return denormalizeCart(response.data);
+    } catch (error) {
+      console.error("Error while updating cart items", error);
+      throw error;
+    }
+  },
+
   removeCartItem: async (cartItemId) => {
     try {
       const response = await apiClient.delete(`/cart/${cartItemId}/`);
@@ -78,6 +78,16 @@ const productService = {
     }
   },
 
+  getProductVariantMatrixBySlug: async (slug) => {
+    try {
+      const response = await apiClient.get(`/products/${slug}/variant-matrix/`);
+      return response.data;
+    } catch (error) {
+      console.error("Error while fetching product variant matrix by slug", error);
+      return;
+    }
+  },
+
   getProductCategories: async (slug) => {
     try {
       const response = await apiClient.get(`/products/${slug}/categories/`);
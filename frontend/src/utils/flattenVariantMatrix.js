@@ -0,0 +1,27 @@
+// Chuyển ma trận biến thể { sizes, colors, grid } thành danh sách biến thể
+// có cùng dạng với /products/{slug}/variants/ (id, color, size, color_details, size_details, ...)
+function flattenVariantMatrix(matrix) {
+  if (!matrix || !Array.isArray(matrix.grid)) return [];
+
+  const variants = [];
+  matrix.grid.forEach((row, colorIndex) => {
+    row.forEach((cell, sizeIndex) => {
+      if (!cell) return;
+      const color = matrix.colors[colorIndex];
+      const size = matrix.sizes[sizeIndex];
+      variants.push({
+        id: cell.variant_id,
+        sku: cell.sku,
+        stock: cell.stock,
+        image_url: cell.image,
+        is_active: cell.is_active,
+        color: color.id,
+        size: size.id,
+        color_details: color,
+        size_details: size,
+      });
+    });
+  });
+  return variants;
+}
+export default flattenVariantMatrix;